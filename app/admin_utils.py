@@ -1,21 +1,25 @@
 import csv
 import os
+from contextlib import aclosing
 from io import StringIO
-from app.db import get_db
 
 
 async def export_bookings_csv_bytes():
     """Return CSV content as bytes (utf-8)."""
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM bookings')
-        rows = await cur.fetchall()
-        cols = [col[0] for col in cur.description]
-
+    from app.repo import stream_rows
     sio = StringIO()
     writer = csv.writer(sio)
-    writer.writerow(cols)
-    for r in rows:
-        writer.writerow([r[c] for c in cols])
+    cols = None
+    async with aclosing(stream_rows('SELECT * FROM bookings')) as rows:
+        async for r in rows:
+            if cols is None:
+                cols = list(r.keys())
+                writer.writerow(cols)
+            writer.writerow([r[c] for c in cols])
+    if cols is None:
+        # no bookings: still write the header
+        async with aclosing(stream_rows("SELECT name FROM pragma_table_info('bookings') ORDER BY cid")) as rows:
+            writer.writerow([r['name'] async for r in rows])
     csv_text = sio.getvalue()
     return csv_text.encode('utf-8')
 
@@ -4,6 +4,7 @@ import logging
 from app.repo import set_booking_status, get_booking, get_service
 from app.notify import notify_admins
 from app.repo import get_user_by_id, create_review
+from app.db import unit_of_work
 
 # Grace period: delay before auto-completion (in minutes)
 GRACE_PERIOD_MINUTES = 15
@@ -66,47 +67,52 @@ async def _auto_complete(booking_id, delay):
     Logs all auto-completions and skips.
     """
     await asyncio.sleep(delay)
-    
-    # Get fresh booking status from DB
-    booking = await get_booking(booking_id)
-    if not booking:
-        logger.info(f"auto_complete: booking {booking_id} not found (already deleted?)")
-        return
-    
-    # Check if already completed or cancelled
-    if booking['status'] == 'completed':
-        logger.info(
-            f"auto_complete_skip: booking_id={booking_id}, "
-            f"reason=already_completed, timestamp={datetime.now().isoformat()}"
-        )
-        return
-    
-    if booking['status'] == 'cancelled':
+
+    formatted = None
+    # status change, review and the admin message are read/written on one connection
+    async with unit_of_work() as uow:
+        # Get fresh booking status from DB
+        booking = await get_booking(booking_id, session=uow)
+        if not booking:
+            logger.info(f"auto_complete: booking {booking_id} not found (already deleted?)")
+            return
+
+        # Check if already completed or cancelled
+        if booking['status'] == 'completed':
+            logger.info(
+                f"auto_complete_skip: booking_id={booking_id}, "
+                f"reason=already_completed, timestamp={datetime.now().isoformat()}"
+            )
+            return
+
+        if booking['status'] == 'cancelled':
+            logger.info(
+                f"auto_complete_skip: booking_id={booking_id}, "
+                f"reason=cancelled, timestamp={datetime.now().isoformat()}"
+            )
+            return
+
+        # Auto-complete the booking
+        old_status = booking['status']
+        await set_booking_status(booking_id, 'completed', session=uow)
+
+        # Log successful completion
         logger.info(
-            f"auto_complete_skip: booking_id={booking_id}, "
-            f"reason=cancelled, timestamp={datetime.now().isoformat()}"
+            f"auto_complete: booking_id={booking_id}, "
+            f"timestamp={datetime.now().isoformat()}, "
+            f"status_change={old_status}->completed"
         )
-        return
-    
-    # Auto-complete the booking
-    old_status = booking['status']
-    await set_booking_status(booking_id, 'completed')
-    
-    # Log successful completion
-    logger.info(
-        f"auto_complete: booking_id={booking_id}, "
-        f"timestamp={datetime.now().isoformat()}, "
-        f"status_change={old_status}->completed"
-    )
-    
-    # Auto-request review
-    user = await get_user_by_id(booking['user_id'])
-    if user:
-        await create_review(
-            user['id'], booking['service_id'], booking['master_id'], 
-            rating=5, text=None
-        )
-        from app.repo import format_booking_for_display
-        formatted = await format_booking_for_display(booking)
+
+        # Auto-request review
+        user = await get_user_by_id(booking['user_id'], session=uow)
+        if user:
+            await create_review(
+                user['id'], booking['service_id'], booking['master_id'],
+                rating=5, text=None, booking_id=booking_id, session=uow
+            )
+            from app.repo import format_booking_for_display
+            formatted = await format_booking_for_display(booking, session=uow)
+
+    if formatted is not None:
         msg = formatted + f"\n\n✅ Статус: Автоматически завершено и запрошен отзыв"
         await notify_admins(msg)
@@ -6,7 +6,7 @@ from app.handlers.client import router as client_router
 from app.handlers.admin import router as admin_router
 from app.handlers.booking import router as booking_router
 from app.handlers.services import router as services_router
-from app.db import init_db
+from app.db import init_db, close_db
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
@@ -37,3 +37,4 @@ async def start_bot():
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
+        await close_db()
@@ -1,20 +1,710 @@
 import aiosqlite
+import asyncio
+import contextvars
+import logging
 import os
-import glob
+import random
+import sqlite3
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 MIGRATIONS_DIR = BASE_DIR / "migrations"
 
+logger = logging.getLogger(__name__)
+
 def _db_path():
     # Read DATABASE_URL via getenv so .env.local can override in demo setups
     return os.getenv('DATABASE_URL', 'sqlite:///./bot.db').replace('sqlite:///', '')
 
+
+# Pool sizing (read at pool creation so tests and .env.local can override)
+DEFAULT_POOL_SIZE = 5
+DEFAULT_READ_POOL_SIZE = 8
+DEFAULT_POOL_TIMEOUT = 10.0
+DEFAULT_POOL_HEALTHCHECK_SECONDS = 30.0
+
+
+def _pool_settings(readonly: bool = False):
+    """Return (size, acquire_timeout, healthcheck_seconds) from environment.
+
+    The read lane is sized by DB_READ_POOL_SIZE, the general lane by DB_POOL_SIZE.
+    """
+    if readonly:
+        size = int(os.getenv('DB_READ_POOL_SIZE', DEFAULT_READ_POOL_SIZE))
+    else:
+        size = int(os.getenv('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+    timeout = float(os.getenv('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT))
+    healthcheck = float(os.getenv('DB_POOL_HEALTHCHECK_SECONDS', DEFAULT_POOL_HEALTHCHECK_SECONDS))
+    return max(1, size), timeout, healthcheck
+
+
+# Named PRAGMA profiles applied to every pooled connection (DB_PROFILE env).
+# journal_mode=WAL lets readers run alongside a writer; busy_timeout
+# makes SQLite wait for the write lock instead of failing with "locked".
+DB_PROFILES = {
+    'throughput': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,      # KiB, i.e. ~16 MB page cache
+        'mmap_size': 134217728,    # 128 MB
+        'temp_store': 'MEMORY',
+    },
+    'durable': {
+        'busy_timeout': 10000,
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+    },
+    'test': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -4000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+    },
+}
+DEFAULT_PROFILE = 'throughput'
+
+
+def _profile_name():
+    name = os.getenv('DB_PROFILE', DEFAULT_PROFILE).strip().lower()
+    if name not in DB_PROFILES:
+        raise ValueError(f"unknown DB_PROFILE {name!r}, expected one of: {', '.join(sorted(DB_PROFILES))}")
+    return name
+
+
+async def apply_profile(conn, name: str = None, readonly: bool = False):
+    """Apply the PRAGMA profile `name` (default: DB_PROFILE env) to `conn`.
+
+    Read-only connections skip journal_mode (a property of the database file,
+    set by the writable connections) and get `query_only` instead.
+    """
+    pragmas = DB_PROFILES[name or _profile_name()]
+    for key, value in pragmas.items():
+        if readonly and key == 'journal_mode':
+            continue
+        await conn.execute(f'PRAGMA {key}={value}')
+    if readonly:
+        await conn.execute('PRAGMA query_only=1')
+
+
+def record_factory():
+    """Return a row factory producing app.records tuples for one connection.
+
+    The record class is looked up once per statement: every row of a result
+    shares the cursor's description object, so an identity check against the
+    previous row's description skips the lookup.
+    """
+    from app.records import record_class
+    last = [None, None]
+
+    def factory(cursor, row):
+        desc = cursor.description
+        if desc is not last[0]:
+            last[0] = desc
+            last[1] = record_class(tuple(d[0] for d in desc))
+        return tuple.__new__(last[1], row)
+    return factory
+
+
+async def open_connection(path: str, profile: str = None, readonly: bool = False, **kwargs):
+    """Open an aiosqlite connection with the row factory and PRAGMA profile set.
+
+    `readonly=True` opens the file with a `mode=ro` URI, so the connection can
+    never take the write lock; with WAL it reads alongside the writer.
+
+    `:memory:` connections share one database through SQLite's shared cache,
+    which locks whole tables: a read while the writer holds an open
+    transaction would fail with "database table is locked". They get
+    `read_uncommitted` so reads never take table locks; the price is that
+    in-memory reads may see writes that have not committed yet.
+    """
+    if path == ':memory:':
+        # share one in-memory database between the pool and the writer
+        conn = aiosqlite.connect('file:app_memdb?mode=memory&cache=shared', uri=True, **kwargs)
+    elif readonly:
+        conn = aiosqlite.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True, **kwargs)
+    else:
+        conn = aiosqlite.connect(path, **kwargs)
+    # daemon thread: an unclosed pool must never keep the interpreter alive
+    conn.daemon = True
+    conn = await conn
+    conn.row_factory = record_factory()
+    try:
+        await apply_profile(conn, profile, readonly=readonly)
+        if path == ':memory:':
+            await conn.execute('PRAGMA read_uncommitted=1')
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived aiosqlite connections for one database file.
+
+    Connections are opened lazily up to `size`, handed out by `acquire()` and
+    returned by `release()`. A connection that sat idle longer than
+    `healthcheck_seconds` is pinged before reuse and replaced if it is broken.
+    A `readonly` pool opens its connections read-only (see `open_connection`).
+    """
+
+    def __init__(self, path: str, size: int, timeout: float, healthcheck_seconds: float, profile: str = DEFAULT_PROFILE, readonly: bool = False):
+        self.path = path
+        self.profile = profile
+        self.readonly = readonly
+        self.size = size
+        self.timeout = timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self.loop = asyncio.get_running_loop()
+        self._sem = asyncio.Semaphore(size)
+        self._idle = []  # list of (conn, last_used_monotonic)
+        self._closed = False
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0, 'waits': 0}
+
+    async def _connect(self):
+        conn = await open_connection(self.path, self.profile, readonly=self.readonly)
+        self.stats['opened'] += 1
+        return conn
+
+    async def _healthy(self, conn) -> bool:
+        try:
+            cur = await conn.execute('SELECT 1')
+            await cur.fetchone()
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, conn):
+        self.stats['discarded'] += 1
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError('connection pool is closed')
+        if self._sem.locked():
+            self.stats['waits'] += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            lane = 'read' if self.readonly else 'general'
+            raise PoolTimeout(f'no database connection available within {self.timeout}s ({lane} pool size {self.size})')
+        try:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if time.monotonic() - last_used >= self.healthcheck_seconds and not await self._healthy(conn):
+                    logger.warning('db_pool: dropping unhealthy connection to %s', self.path)
+                    await self._discard(conn)
+                    continue
+                self.stats['reused'] += 1
+                return conn
+            return await self._connect()
+        except BaseException:
+            self._sem.release()
+            raise
+
+    async def release(self, conn):
+        try:
+            discard = self._closed
+            if not discard and conn.in_transaction:
+                # never hand a half-finished transaction to the next caller
+                try:
+                    await conn.rollback()
+                except Exception:
+                    discard = True
+            if discard:
+                await self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._sem.release()
+
+    async def close(self):
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+
+# Group commit: after the first queued write the writer waits this long for
+# more jobs and commits everything it collected in one transaction.
+DEFAULT_WRITER_BATCH_WINDOW_MS = 2.0
+DEFAULT_WRITER_MAX_BATCH = 64
+# how long the writer keeps retrying BEGIN IMMEDIATE while another connection
+# (a script, a second bot process) holds the write lock
+DEFAULT_WRITER_LOCK_TIMEOUT_MS = 5000.0
+# jittered exponential backoff between those retries
+WRITER_BACKOFF_BASE = 0.005
+WRITER_BACKOFF_CAP = 0.25
+
+
+class WriteLockTimeout(Exception):
+    """The write lock stayed taken for longer than DB_WRITER_LOCK_TIMEOUT_MS.
+
+    Nothing was written; the caller may retry later. Distinct from conflicts
+    such as repo.SlotTaken, which mean the write itself was rejected.
+    """
+
+
+def _is_locked(e: Exception) -> bool:
+    code = getattr(e, 'sqlite_errorcode', None)
+    return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) or 'locked' in str(e)
+
+
+def _writer_settings():
+    """Return (batch_window_seconds, max_batch, lock_timeout_seconds) from environment."""
+    window_ms = float(os.getenv('DB_WRITER_BATCH_WINDOW_MS', DEFAULT_WRITER_BATCH_WINDOW_MS))
+    max_batch = int(os.getenv('DB_WRITER_MAX_BATCH', DEFAULT_WRITER_MAX_BATCH))
+    lock_timeout_ms = float(os.getenv('DB_WRITER_LOCK_TIMEOUT_MS', DEFAULT_WRITER_LOCK_TIMEOUT_MS))
+    return max(0.0, window_ms) / 1000.0, max(1, max_batch), max(0.0, lock_timeout_ms) / 1000.0
+
+
+class Writer:
+    """Single writer task that owns the only connection allowed to write.
+
+    Callers hand in `job(conn)` coroutines via `submit()`. The writer takes the
+    first job from its queue, waits `batch_window` for more, and runs the whole
+    batch in one BEGIN IMMEDIATE ... COMMIT. Every job runs inside its own
+    SAVEPOINT, so a failing job is rolled back alone and its caller gets the
+    exception while the rest of the batch still commits. Futures are resolved
+    only after COMMIT, so a caller never observes a write that could still be
+    lost. Jobs must not call commit()/rollback() themselves.
+
+    The write lock is taken upfront by BEGIN IMMEDIATE. While another
+    connection holds it, the writer retries with jittered backoff on the event
+    loop (its connection has busy_timeout=0, so SQLite never sleeps in the
+    worker thread) and fails the batch with WriteLockTimeout after
+    `lock_timeout` seconds.
+    """
+
+    def __init__(self, path: str, profile: str, batch_window: float, max_batch: int,
+                 lock_timeout: float = DEFAULT_WRITER_LOCK_TIMEOUT_MS / 1000.0):
+        self.path = path
+        self.profile = profile
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.lock_timeout = lock_timeout
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._conn = None
+        self._task = None
+        self._closed = False
+        self.stats = {'jobs': 0, 'failed_jobs': 0, 'batches': 0, 'failed_batches': 0, 'max_batch': 0,
+                      'lock_waits': 0, 'lock_retries': 0, 'lock_timeouts': 0, 'lock_wait_ms': 0.0,
+                      'max_lock_wait_ms': 0.0}
+
+    async def submit(self, job):
+        if self._closed:
+            raise RuntimeError('database writer is closed')
+        fut = self.loop.create_future()
+        self._queue.put_nowait((job, fut))
+        if self._task is None or self._task.done():
+            # the writer task only lives while there is work queued
+            self._task = self.loop.create_task(self._run())
+        return await fut
+
+    async def _connection(self):
+        if self._conn is None:
+            # explicit BEGIN/SAVEPOINT/COMMIT only, no implicit transactions
+            self._conn = await open_connection(self.path, self.profile, isolation_level=None)
+            # lock waits are handled by _begin's backoff, not by SQLite
+            await self._conn.execute('PRAGMA busy_timeout=0')
+        return self._conn
+
+    async def _begin(self, conn):
+        """BEGIN IMMEDIATE, retrying with jittered backoff while the lock is taken."""
+        try:
+            await conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e):
+                raise
+        self.stats['lock_waits'] += 1
+        started = time.monotonic()
+        deadline = started + self.lock_timeout
+        delay = WRITER_BACKOFF_BASE
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['lock_timeouts'] += 1
+                    raise WriteLockTimeout(f'write lock not acquired within {self.lock_timeout:.3f}s')
+                # jitter keeps competing processes from retrying in lockstep
+                await asyncio.sleep(min(remaining, random.uniform(delay / 2, delay)))
+                delay = min(delay * 2, WRITER_BACKOFF_CAP)
+                self.stats['lock_retries'] += 1
+                try:
+                    await conn.execute('BEGIN IMMEDIATE')
+                    return
+                except sqlite3.OperationalError as e:
+                    if not _is_locked(e):
+                        raise
+        finally:
+            waited = (time.monotonic() - started) * 1000.0
+            self.stats['lock_wait_ms'] += waited
+            self.stats['max_lock_wait_ms'] = max(self.stats['max_lock_wait_ms'], waited)
+
+    async def _run(self):
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._run_batch(batch)
+
+    @staticmethod
+    def _settle(fut, ok, value):
+        if fut.done():
+            return
+        if ok:
+            fut.set_result(value)
+        else:
+            fut.set_exception(value)
+
+    async def _run_batch(self, batch):
+        self.stats['batches'] += 1
+        self.stats['jobs'] += len(batch)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        outcomes = []
+        try:
+            conn = await self._connection()
+            await self._begin(conn)
+        except Exception as e:
+            self.stats['failed_batches'] += 1
+            for _, fut in batch:
+                self._settle(fut, False, e)
+            return
+        try:
+            for job, fut in batch:
+                if fut.done():
+                    # caller went away before its turn (e.g. cancelled)
+                    outcomes.append((fut, True, None))
+                    continue
+                await conn.execute('SAVEPOINT write_job')
+                try:
+                    result = await job(conn)
+                except Exception as e:
+                    await conn.execute('ROLLBACK TO write_job')
+                    await conn.execute('RELEASE write_job')
+                    self.stats['failed_jobs'] += 1
+                    outcomes.append((fut, False, e))
+                else:
+                    await conn.execute('RELEASE write_job')
+                    outcomes.append((fut, True, result))
+            await conn.execute('COMMIT')
+        except BaseException as e:
+            self.stats['failed_batches'] += 1
+            try:
+                await conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            err = e if isinstance(e, Exception) else RuntimeError('database writer stopped')
+            for _, fut in batch:
+                self._settle(fut, False, err)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for fut, ok, value in outcomes:
+            self._settle(fut, ok, value)
+
+    async def close(self):
+        self._closed = True
+        task = self._task
+        if task is not None and not task.done():
+            if task.get_loop() is asyncio.get_running_loop():
+                # let queued jobs finish
+                await task
+            elif not task.get_loop().is_closed():
+                task.cancel()
+        if self._conn is not None:
+            try:
+                await self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+_pool = None
+_read_pool = None
+_writer = None
+# (pool, conn, task) held by the current task, so nested get_db() calls reuse it
+_task_conn = contextvars.ContextVar('db_task_conn', default=None)
+
+
+async def _current_pool(pool, readonly: bool):
+    path = _db_path()
+    loop = asyncio.get_running_loop()
+    if pool is not None and (pool.path != path or pool.loop is not loop or pool._closed):
+        await pool.close()
+        pool = None
+    if pool is None:
+        size, timeout, healthcheck = _pool_settings(readonly)
+        pool = ConnectionPool(path, size, timeout, healthcheck, _profile_name(), readonly=readonly)
+    return pool
+
+
+async def get_pool() -> ConnectionPool:
+    """Return the pool for the current DATABASE_URL and event loop.
+
+    The pool is rebuilt when the database path changes (tests point every case
+    at a fresh file) or when it was created on a different event loop.
+    """
+    global _pool
+    _pool = await _current_pool(_pool, readonly=False)
+    return _pool
+
+
+async def get_read_pool() -> ConnectionPool:
+    """Return the read-only pool (query lane) for the current database and loop."""
+    global _read_pool
+    _read_pool = await _current_pool(_read_pool, readonly=True)
+    return _read_pool
+
+
+async def get_writer() -> Writer:
+    """Return the single writer for the current DATABASE_URL and event loop."""
+    global _writer
+    path = _db_path()
+    loop = asyncio.get_running_loop()
+    if _writer is not None and (_writer.path != path or _writer.loop is not loop or _writer._closed):
+        old, _writer = _writer, None
+        await old.close()
+    if _writer is None:
+        window, max_batch, lock_timeout = _writer_settings()
+        _writer = Writer(path, _profile_name(), window, max_batch, lock_timeout)
+    return _writer
+
+
+async def run_write(job, session=None):
+    """Run `job(conn)` as a write and return its result.
+
+    Without a session the job joins the writer's next group commit; its
+    exception (if any) is re-raised here after its savepoint was rolled back.
+    Inside a write unit of work (explicit `session` or the one opened by the
+    current task) the job runs immediately on the unit's connection, in its
+    own savepoint, and commits together with the rest of the unit.
+    """
+    session = active_session(session)
+    if session is not None and not session.readonly:
+        conn = session.conn
+        await conn.execute('SAVEPOINT uow_job')
+        try:
+            result = await job(conn)
+        except BaseException:
+            await conn.execute('ROLLBACK TO uow_job')
+            await conn.execute('RELEASE uow_job')
+            raise
+        await conn.execute('RELEASE uow_job')
+        return result
+    _check_no_foreign_write_unit()
+    writer = await get_writer()
+    return await writer.submit(job)
+
+
+def after_commit(callback, session=None):
+    """Call `callback()` when the caller's write is committed.
+
+    Inside a write unit of work that is when the unit commits; otherwise the
+    write (run through `run_write`) has already committed and `callback` runs
+    right away. Used to invalidate in-process caches.
+    """
+    session = active_session(session)
+    if session is not None and not session.readonly:
+        session.after_commit(callback)
+    else:
+        callback()
+
+
+class UnitOfWork:
+    """A connection shared by several repo calls; see `unit_of_work()`."""
+
+    def __init__(self, conn, readonly: bool):
+        self.conn = conn
+        self.readonly = readonly
+        self.task = asyncio.current_task()
+        self.closed = False
+        self._after_commit = []
+
+    def after_commit(self, callback):
+        """Call `callback()` once this unit has committed (never on rollback)."""
+        self._after_commit.append(callback)
+
+    def _run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception:
+                logger.exception('db: after-commit callback failed')
+
+
+_current_uow = contextvars.ContextVar('db_unit_of_work', default=None)
+
+
+def active_session(session=None):
+    """Return the explicit session, else the unit of work opened by this task (or None)."""
+    if session is not None:
+        return None if session.closed else session
+    uow = _current_uow.get()
+    if uow is not None and not uow.closed and uow.task is asyncio.current_task():
+        return uow
+    return None
+
+
+def _check_no_foreign_write_unit():
+    """Refuse a writer job from a task spawned inside another task's open write unit.
+
+    The unit holds the writer until its block exits, so the job would queue
+    behind it; if the unit awaits the task (gather, create_task + await) both
+    wait forever and every other write in the process stalls with them.
+    """
+    uow = _current_uow.get()
+    if uow is not None and not uow.closed and not uow.readonly and uow.task is not asyncio.current_task():
+        raise RuntimeError('cannot write from another task while a write unit of work is open: '
+                           'run the call in the unit\'s task or after the unit exits')
+
+
+@asynccontextmanager
+async def unit_of_work(readonly: bool = False):
+    """Run many repo calls on one connection.
+
+        async with unit_of_work() as uow:
+            user = await get_or_create_user(tg_id, session=uow)
+            await create_booking(user['id'], ..., session=uow)
+
+    A write unit borrows the writer connection as a single writer job, so all
+    its reads and writes share one transaction that commits when the block
+    exits and rolls back if it raises. Keep network I/O (Telegram calls) out
+    of the block: the writer waits for it. A `readonly` unit pins one pooled
+    connection inside a read transaction, giving every call the same snapshot.
+
+    Repo calls made by the same task inside the block use the unit even when
+    `session` is not passed, so nested helpers never wait on the writer.
+    A nested unit_of_work() joins the active unit the same way: a nested
+    write unit runs in a savepoint of the outer one (its error rolls back
+    only its own statements and after-commit callbacks), a nested read-only
+    unit reads on the outer connection, and a write unit inside a read-only
+    one raises RuntimeError. Writes from other tasks while a write unit is
+    open raise RuntimeError too (see _check_no_foreign_write_unit).
+    """
+    outer = active_session()
+    if outer is not None:
+        if outer.readonly and not readonly:
+            raise RuntimeError('cannot open a write unit of work inside a read-only one')
+        if readonly or outer.readonly:
+            yield outer
+            return
+        pending = len(outer._after_commit)
+        await outer.conn.execute('SAVEPOINT uow_nested')
+        try:
+            yield outer
+        except BaseException:
+            await outer.conn.execute('ROLLBACK TO uow_nested')
+            await outer.conn.execute('RELEASE uow_nested')
+            del outer._after_commit[pending:]
+            raise
+        await outer.conn.execute('RELEASE uow_nested')
+        return
+
+    if readonly:
+        async with get_db(readonly=True) as conn:
+            await conn.execute('BEGIN')
+            uow = UnitOfWork(conn, readonly=True)
+            token = _current_uow.set(uow)
+            try:
+                yield uow
+            finally:
+                uow.closed = True
+                _current_uow.reset(token)
+                await conn.rollback()
+        return
+
+    loop = asyncio.get_running_loop()
+    _check_no_foreign_write_unit()
+    lent = loop.create_future()
+    finished = loop.create_future()
+
+    async def _lend(conn):
+        lent.set_result(conn)
+        await finished
+
+    writer = await get_writer()
+    job = asyncio.ensure_future(writer.submit(_lend))
+    await asyncio.wait({lent, job}, return_when=asyncio.FIRST_COMPLETED)
+    if not lent.done():
+        # the writer failed before handing over its connection
+        await job
+    uow = UnitOfWork(lent.result(), readonly=False)
+    token = _current_uow.set(uow)
+    try:
+        yield uow
+    except BaseException as e:
+        uow.closed = True
+        finished.set_exception(e if isinstance(e, Exception) else RuntimeError('unit of work aborted'))
+        try:
+            await job
+        except Exception:
+            pass
+        raise
+    else:
+        uow.closed = True
+        finished.set_result(None)
+        # resolves after COMMIT
+        await job
+        uow._run_after_commit()
+    finally:
+        uow.closed = True
+        _current_uow.reset(token)
+
+
+async def close_db():
+    """Close the writer and all pooled connections. Called on bot shutdown."""
+    global _pool, _read_pool, _writer
+    old_writer, _writer = _writer, None
+    if old_writer is not None:
+        await old_writer.close()
+    for old in (_pool, _read_pool):
+        if old is not None:
+            await old.close()
+    _pool = _read_pool = None
+
+
+def pool_stats() -> dict:
+    return dict(_pool.stats) if _pool is not None else {}
+
+
+def read_pool_stats() -> dict:
+    return dict(_read_pool.stats) if _read_pool is not None else {}
+
+
+def writer_stats() -> dict:
+    return dict(_writer.stats) if _writer is not None else {}
+
+
 async def init_db():
-    files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    """Create or upgrade the schema. A warm start costs one ledger query."""
+    from app import migrations
+
+    files = migrations.discover(MIGRATIONS_DIR)
 
-    async with aiosqlite.connect(_db_path()) as db:
+    async with get_db() as db:
 
         if not files:
             # fallback for CI/tests
@@ -31,24 +721,41 @@ async def init_db():
                 status TEXT DEFAULT 'active'
             );
             """)
-        else:
-            for p in files:
-                sql = p.read_text(encoding="utf-8")
-                try:
-                    await db.executescript(sql)
-                except Exception as e:
-                    msg = str(e).lower()
-                    if 'duplicate column' in msg or 'already exists' in msg:
-                        continue
-                    raise
+            await db.commit()
+            return
 
-        await db.commit()
+        for m in await migrations.migrate(db, files):
+            logger.info('migration applied: %s', m.path.name)
 
 @asynccontextmanager
-async def get_db():
-    conn = await aiosqlite.connect(_db_path())
-    conn.row_factory = aiosqlite.Row
+async def get_db(session=None, readonly: bool = False):
+    """Yield a connection: the unit of work's if one is active, else a pooled one.
+
+    `readonly=True` takes the connection from the read lane, a separate pool
+    of `mode=ro` connections that never wait on the writer; repo functions
+    that only query use it. The general lane serves everything else
+    (migrations, ad-hoc scripts).
+    """
+    session = active_session(session)
+    if session is not None:
+        yield session.conn
+        return
+    held = _task_conn.get()
+    if (held is not None and held[2] is asyncio.current_task() and not held[0]._closed
+            and (readonly or not held[0].readonly)):
+        # nested call inside a task that already holds a suitable pooled connection
+        yield held[1]
+        return
+    pool = await (get_read_pool() if readonly else get_pool())
+    conn = await pool.acquire()
+    token = _task_conn.set((pool, conn, asyncio.current_task()))
     try:
         yield conn
     finally:
-        await conn.close()
+        try:
+            _task_conn.reset(token)
+        except ValueError:
+            # an abandoned async generator is finalised by the event loop in
+            # another context; the connection must still go back to the pool
+            pass
+        await pool.release(conn)
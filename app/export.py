@@ -1,30 +1,82 @@
 import csv
+import json
 from io import StringIO
-from app.repo import get_bookings_for_export, get_reviews_for_export
+from app.repo import stream_bookings_for_export, stream_reviews_for_export, export_catalog
 
 
 async def export_bookings_csv_bytes():
-    rows = await get_bookings_for_export()
     # cur.description not available here; build header explicitly
     cols = ['id', 'date', 'time', 'service', 'master', 'client_name', 'phone', 'status']
     sio = StringIO()
     writer = csv.writer(sio)
     writer.writerow(cols)
-    for r in rows:
+    # rows are written as they arrive so only one fetch batch is held at a time
+    async for r in stream_bookings_for_export():
         writer.writerow([r[c] for c in cols])
     return sio.getvalue().encode('utf-8')
 
 
 async def export_reviews_csv_bytes():
-    rows = await get_reviews_for_export()
     cols = ['booking_id', 'rating', 'comment', 'created_at']
     sio = StringIO()
     writer = csv.writer(sio)
     writer.writerow(cols)
-    for r in rows:
+    async for r in stream_reviews_for_export():
         # r['booking_id'] may be None
         writer.writerow([r['booking_id'], r['rating'], r['comment'] or '', r['created_at']])
     return sio.getvalue().encode('utf-8')
 
 
 #kiek isviso siame projekte parasyta kodo eiliu?
+
+
+# Catalog bundles (see repo.import_catalog / repo.export_catalog). The CSV form
+# is one sheet: a `kind` column says which section a row belongs to and the
+# columns that do not apply to that kind stay empty.
+CATALOG_CSV_KINDS = {'service': 'services', 'master': 'masters', 'schedule': 'schedules', 'exception': 'exceptions'}
+CATALOG_CSV_COLUMNS = ['kind', 'name', 'description', 'price', 'duration_minutes', 'bio', 'contact', 'master',
+                       'master_id', 'weekday', 'date', 'start_time', 'end_time', 'slot_interval_minutes',
+                       'available', 'note']
+
+
+def catalog_bundle_csv_bytes(bundle: dict) -> bytes:
+    sio = StringIO()
+    writer = csv.DictWriter(sio, fieldnames=CATALOG_CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for kind, section in CATALOG_CSV_KINDS.items():
+        for row in bundle.get(section) or []:
+            writer.writerow({**{k: ('' if v is None else v) for k, v in row.items()}, 'kind': kind})
+    return sio.getvalue().encode('utf-8')
+
+
+def catalog_bundle_json_bytes(bundle: dict) -> bytes:
+    return json.dumps(bundle, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def parse_catalog_bundle(data: bytes, filename: str = '') -> dict:
+    """Decode an uploaded bundle: JSON (`.json`, or content starting with `{`) or CSV.
+
+    Raises ValueError when the file cannot be read; row-level checks happen
+    in repo.import_catalog.
+    """
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or text.lstrip().startswith('{'):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'invalid JSON: {e}') from None
+    reader = csv.DictReader(StringIO(text))
+    if not reader.fieldnames or 'kind' not in reader.fieldnames:
+        raise ValueError('CSV needs a header row with a "kind" column')
+    bundle = {section: [] for section in CATALOG_CSV_KINDS.values()}
+    for line, row in enumerate(reader, start=2):
+        kind = (row.pop('kind') or '').strip().lower()
+        if kind not in CATALOG_CSV_KINDS:
+            raise ValueError(f'line {line}: unknown kind {kind!r}')
+        bundle[CATALOG_CSV_KINDS[kind]].append({k: v for k, v in row.items() if k and v not in (None, '')})
+    return bundle
+
+
+async def export_catalog_bytes(fmt: str = 'json') -> bytes:
+    bundle = await export_catalog()
+    return catalog_bundle_csv_bytes(bundle) if fmt == 'csv' else catalog_bundle_json_bytes(bundle)
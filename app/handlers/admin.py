@@ -1,8 +1,9 @@
 from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
+from datetime import datetime
 import os
-from app.repo import create_master, create_service, list_bookings, set_master_schedule, delete_master, delete_service, update_master, update_service, get_master, get_service, set_booking_status, get_booking, get_user_by_id, list_masters, list_services
+from app.repo import create_master, create_service, set_master_schedule, delete_master, delete_service, update_master, update_service, get_master, get_service, set_booking_status, get_booking, get_user_by_id, list_masters, list_services
 from app.utils import get_args_from_message as get_args
 from app.scheduler import add_exception, list_exceptions
 from app.keyboards import admin_menu_kb, settings_kb, main_menu_kb
@@ -249,44 +250,161 @@ async def cmd_list_exceptions(message: Message):
         text += f"{r['date']} available={r['available']} {r['start_time'] or ''}-{r['end_time'] or ''} {r['note'] or ''}\n"
     await message.answer(text)
 
+BOOKINGS_PAGE_SIZE = 10
+# one-letter status codes keep pagination callback data under Telegram's 64 bytes
+_STATUS_CODES = {'scheduled': 's', 'completed': 'c', 'cancelled': 'x', 'active': 'a'}
+_STATUS_BY_CODE = {v: k for k, v in _STATUS_CODES.items()}
+
+
+def _pack_bookings_cursor(direction: str, row, flt: dict) -> str:
+    """callback data: bk:<n|p>:<YYYYMMDDHHMM>:<id>:<start>:<end>:<status>:<master>"""
+    key = row['date'].replace('-', '') + row['time'].replace(':', '')
+    return ':'.join([
+        'bk', direction, key, str(row['id']),
+        (flt.get('start') or '').replace('-', ''),
+        (flt.get('end') or '').replace('-', ''),
+        _STATUS_CODES.get(flt.get('status'), ''),
+        str(flt.get('master_id') or ''),
+    ])
+
+
+def _unpack_bookings_cursor(data: str):
+    _, direction, key, bid, start, end, status, master = data.split(':')
+    def iso(d):
+        return f'{d[:4]}-{d[4:6]}-{d[6:8]}' if d else None
+    cursor = (iso(key[:8]), f'{key[8:10]}:{key[10:12]}', int(bid))
+    flt = {
+        'start': iso(start),
+        'end': iso(end),
+        'status': _STATUS_BY_CODE.get(status),
+        'master_id': int(master) if master else None,
+    }
+    return direction, cursor, flt
+
+
+async def _build_bookings_page(flt: dict, cursor=None, backward=False):
+    """Fetch one page of bookings and build its text and navigation keyboard."""
+    from app.repo import list_bookings_page
+    rows, has_more = await list_bookings_page(cursor=cursor, backward=backward, limit=BOOKINGS_PAGE_SIZE, **flt)
+    if not rows:
+        return None, None
+    has_next = has_more if not backward else True
+    has_prev = has_more if backward else cursor is not None
+    text = ''
+    for r in rows:
+        text += f"ID: {r['id']}\n"
+        text += f"Клиент: {r['user_name'] or 'неизвестный'}\n"
+        if r['user_phone']:
+            text += f"Телефон: {r['user_phone']}\n"
+        text += f"Услуга: {r['service_name'] or 'неизвестная'}\n"
+        text += f"Мастер: {r['master_name'] or 'без выбора'}\n"
+        text += f"Дата: {r['date']}\n"
+        text += f"Время: {r['time']}\n"
+        text += f"Статус: {r['status']}\n\n"
+    nav_row = []
+    if has_prev:
+        nav_row.append(InlineKeyboardButton(text='⬅️ Назад', callback_data=_pack_bookings_cursor('p', rows[0], flt)))
+    if has_next:
+        nav_row.append(InlineKeyboardButton(text='➡️ Далее', callback_data=_pack_bookings_cursor('n', rows[-1], flt)))
+    kb = InlineKeyboardMarkup(inline_keyboard=[nav_row]) if nav_row else None
+    return text, kb
+
+
 @router.message(Command('list_bookings'))
 async def cmd_list_bookings(message: Message):
     if not is_admin(message.from_user.id):
         await message.answer('Доступ запрещён')
         return
     args = get_args(message)
-    # optional args: start|end (YYYY-MM-DD)
+    # optional args: start|end[|status[|master_id]] (dates YYYY-MM-DD, empty parts are skipped)
+    flt = {'start': None, 'end': None, 'status': None, 'master_id': None}
     if args and '|' in args:
-        start, end = [x.strip() for x in args.split('|',1)]
-        rows = await list_bookings()
-        rows = [r for r in rows if (r['date'] >= start and r['date'] <= end)]
-    else:
-        rows = await list_bookings()
-    if not rows:
+        parts = [x.strip() for x in args.split('|', 3)]
+        for key, value in (('start', parts[0]), ('end', parts[1])):
+            if not value:
+                continue
+            try:
+                # normalized, so the date survives the YYYYMMDD round trip through the page cursor
+                flt[key] = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                await message.answer('Неверная дата. Формат: /list_bookings YYYY-MM-DD|YYYY-MM-DD[|статус[|master_id]]')
+                return
+        if len(parts) > 2 and parts[2]:
+            if parts[2] not in _STATUS_CODES:
+                await message.answer(f"Неизвестный статус. Допустимо: {', '.join(_STATUS_CODES)}")
+                return
+            flt['status'] = parts[2]
+        if len(parts) > 3 and parts[3]:
+            try:
+                flt['master_id'] = int(parts[3])
+            except ValueError:
+                await message.answer('Неверный master_id. Укажите число.')
+                return
+    text, kb = await _build_bookings_page(flt)
+    if not text:
         await message.answer('Записей нет')
         return
-    from app.repo import get_user_by_id, get_service, get_master
-    text = ''
-    for r in rows[:200]:
-        user = await get_user_by_id(r['user_id']) if r['user_id'] else None
-        service = await get_service(r['service_id']) if r['service_id'] else None
-        master = await get_master(r['master_id']) if r['master_id'] else None
-        
-        user_name = user['name'] if user else "неизвестный"
-        user_phone = user['phone'] if user else ""
-        service_name = service['name'] if service else "неизвестная"
-        master_name = master['name'] if master else "без выбора"
-        
-        text += f"ID: {r['id']}\n"
-        text += f"Клиент: {user_name}\n"
-        if user_phone:
-            text += f"Телефон: {user_phone}\n"
-        text += f"Услуга: {service_name}\n"
-        text += f"Мастер: {master_name}\n"
-        text += f"Дата: {r['date']}\n"
-        text += f"Время: {r['time']}\n"
-        text += f"Статус: {r['status']}\n\n"
-    await message.answer(text)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith('bk:'))
+async def cb_list_bookings_page(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer('Доступ запрещён', show_alert=True)
+        return
+    try:
+        direction, cursor, flt = _unpack_bookings_cursor(callback.data)
+    except Exception:
+        await callback.answer('Неверная страница', show_alert=True)
+        return
+    text, kb = await _build_bookings_page(flt, cursor=cursor, backward=direction == 'p')
+    if not text:
+        await callback.answer('Больше записей нет', show_alert=True)
+        return
+    await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
+
+@router.message(Command('rebuild_ratings'))
+async def cmd_rebuild_ratings(message: Message):
+    """Recompute cached service/master ratings from the reviews table."""
+    if not is_admin(message.from_user.id):
+        await message.answer('Доступ запрещён')
+        return
+    from app.repo import rebuild_rating_stats
+    count = await rebuild_rating_stats()
+    await message.answer(f'Рейтинги пересчитаны ({count} записей).')
+
+
+@router.message(Command('db_stats'))
+async def cmd_db_stats(message: Message):
+    """Show writer contention, booking outcome and slot cache counters."""
+    if not is_admin(message.from_user.id):
+        await message.answer('Доступ запрещён')
+        return
+    from app.db import writer_stats
+    from app.repo import booking_stats
+    from app.scheduler import slot_cache_stats, occupancy_stats
+    w = writer_stats()
+    b = booking_stats()
+    c = slot_cache_stats()
+    o = occupancy_stats()
+    lines = [
+        '📊 База данных',
+        f"Записи: попыток {b['attempts']}, создано {b['created']}, слот занят {b['slot_taken']}, "
+        f"повторная запись {b['double_booking']}, таймаут блокировки {b['lock_timeouts']}",
+        f"Кэш слотов: попаданий {c['hits']}, промахов {c['misses']} ({c['hit_ratio']:.0%}), "
+        f"записей {c['size']}, сбросов {c['invalidations']}",
+        f"Занятость мастеров: попаданий {o['hits']}, промахов {o['misses']} ({o['hit_ratio']:.0%}), "
+        f"дней в памяти {o['size']}, обновлений {o['updates']}",
+    ]
+    if w:
+        lines.append(
+            f"Writer: транзакций {w['batches']}, задач {w['jobs']} (ошибок {w['failed_jobs']}), "
+            f"ожиданий блокировки {w['lock_waits']}, повторов {w['lock_retries']}, таймаутов {w['lock_timeouts']}, "
+            f"макс. ожидание {w['max_lock_wait_ms']:.0f} мс"
+        )
+    await message.answer('\n'.join(lines))
 
 
 @router.message(Command('complete_booking'))
@@ -362,6 +480,63 @@ async def cmd_export_reviews(message: Message):
     except Exception as e:
         await message.answer('Ошибка экспорта: ' + str(e))
 
+# uploaded catalog bundles larger than this are refused before download
+MAX_CATALOG_UPLOAD_BYTES = 5 * 1024 * 1024
+
+
+@router.message(Command('import_catalog'))
+async def cmd_import_catalog(message: Message):
+    """Apply a services/masters/schedules/exceptions bundle sent as a document with this caption."""
+    if not is_admin(message.from_user.id):
+        await message.answer('Доступ запрещён')
+        return
+    document = getattr(message, 'document', None)
+    if document is None:
+        await message.answer(
+            'Отправьте файл .json или .csv с подписью /import_catalog.\n'
+            'Формат — как у /export_catalog json|csv: услуги, мастера, расписание и исключения.')
+        return
+    if document.file_size and document.file_size > MAX_CATALOG_UPLOAD_BYTES:
+        await message.answer('Файл слишком большой (максимум 5 МБ).')
+        return
+    from io import BytesIO
+    from app.export import parse_catalog_bundle
+    from app.repo import import_catalog, CatalogImportError
+    buf = BytesIO()
+    await message.bot.download(document, destination=buf)
+    try:
+        bundle = parse_catalog_bundle(buf.getvalue(), document.file_name or '')
+        counts = await import_catalog(bundle)
+    except CatalogImportError as e:
+        shown = '\n'.join(e.errors[:20])
+        more = f'\n…и ещё {len(e.errors) - 20}' if len(e.errors) > 20 else ''
+        await message.answer(f'Импорт отменён, ничего не изменено. Ошибки:\n{shown}{more}')
+        return
+    except ValueError as e:
+        await message.answer(f'Не удалось прочитать файл: {e}')
+        return
+    await message.answer(
+        f"Импорт выполнен: услуг {counts['services']}, мастеров {counts['masters']}, "
+        f"строк расписания {counts['schedules']}, исключений {counts['exceptions']}.")
+
+
+@router.message(Command('export_catalog'))
+async def cmd_export_catalog(message: Message):
+    """Send services, masters, schedules and exceptions as a bundle for /import_catalog."""
+    if not is_admin(message.from_user.id):
+        await message.answer('Доступ запрещён')
+        return
+    fmt = (get_args(message) or 'json').strip().lower()
+    if fmt not in ('json', 'csv'):
+        await message.answer('Использование: /export_catalog [json|csv]')
+        return
+    from app.export import export_catalog_bytes
+    from io import BytesIO
+    bio = BytesIO(await export_catalog_bytes(fmt))
+    bio.seek(0)
+    await message.bot.send_document(message.chat.id, bio, filename=f'catalog.{fmt}', caption='Каталог и расписание', disable_notification=True)
+
+
 @router.callback_query(lambda c: c.data and c.data.startswith('admin:delete_master:choose:'))
 async def cb_delete_master_choose(callback: CallbackQuery):
     user_id = callback.from_user.id
@@ -3,8 +3,9 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.filters import StateFilter
-from app.repo import get_master, get_or_create_user, create_booking, list_masters, SlotTaken, DoubleBooking, get_service, average_rating_for_master
+from app.repo import get_master, get_or_create_user, create_booking, list_masters, SlotTaken, DoubleBooking, get_service, ratings_for_masters
 from app.utils import valid_phone, format_rating
+from app.db import unit_of_work, WriteLockTimeout
 
 # Для автозавершения
 from app.auto_complete import schedule_auto_complete
@@ -22,6 +23,35 @@ class BookingStates(StatesGroup):
     CONFIRM = State()
 
 
+# "next available" one-tap buttons: how many, and how far ahead to look
+NEXT_AVAILABLE_COUNT = 5
+NEXT_AVAILABLE_DAYS = 60
+WEEKDAY_SHORT = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+
+async def _next_available_rows(service_id, master_id, start_date=None):
+    """Inline keyboard rows with the earliest free slots of the service (any master when master_id is 0)."""
+    from aiogram.types import InlineKeyboardButton
+    from app.scheduler import find_next_available
+    import datetime as _dt
+    svc = await get_service(service_id) if service_id else None
+    if not svc:
+        return []
+    found = await find_next_available(svc['duration_minutes'], limit=NEXT_AVAILABLE_COUNT, days=NEXT_AVAILABLE_DAYS,
+                                      master_id=master_id or None, start_date=start_date)
+    rows = []
+    for date_s, time_s, mid in found:
+        d = _dt.date.fromisoformat(date_s)
+        label = f"⚡ {WEEKDAY_SHORT[d.weekday()]} {d:%d.%m} {time_s}"
+        if not master_id:
+            m = await get_master(mid)
+            if m:
+                label += f" · {m['name']}"
+        rows.append([InlineKeyboardButton(
+            text=label, callback_data=f"book:next:{date_s.replace('-', '')}:{time_s.replace(':', '')}:{mid}")])
+    return rows
+
+
 async def _set_state(ctx: FSMContext, state_obj: State):
     """Set FSM state in a way compatible with real FSMContext and the test FakeState.
 
@@ -127,8 +157,9 @@ async def cb_select_service(query: CallbackQuery, state: FSMContext):
     text = 'Выберите мастера или без выбора:'
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     buttons = []
+    ratings = await ratings_for_masters([m['id'] for m in masters])
     for m in masters:
-        avg, cnt = await average_rating_for_master(m['id'])
+        avg, cnt = ratings[m['id']]
         rating = format_rating(avg, cnt)
         label = m['name']
         if rating:
@@ -184,6 +215,17 @@ async def cb_select_master(query: CallbackQuery, state: FSMContext):
         pass
     await query.message.answer('📅 Введите дату визита в формате ГГГГ-ММ-ДД. Пример: 2026-01-15')
     await _set_state(state, BookingStates.DATE)
+    try:
+        data = await state.get_data()
+        rows = await _next_available_rows(data.get('service_id'), master_id)
+        if rows:
+            from aiogram.types import InlineKeyboardMarkup
+            await query.message.answer('Или выберите ближайшее свободное время:', reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    except Exception as e:
+        try:
+            print('next available error:', e)
+        except Exception:
+            pass
     # dump state after setting for diagnostic
     try:
         cur = await state.get_state()
@@ -394,7 +436,7 @@ async def process_date(message: Message, state: FSMContext):
     master_id = data.get('master_id')
     svc_id = data.get('service_id')
     from app.repo import list_masters, get_service
-    from app.scheduler import generate_slots
+    from app.scheduler import generate_slots, generate_slots_for_date
 
     svc = await get_service(svc_id)
     if not svc:
@@ -409,16 +451,17 @@ async def process_date(message: Message, state: FSMContext):
         # show masters who have slots on that date
         masters = await list_masters()
         masters_with = []
-        for m in masters:
+        try:
+            # one set-based pass for every master instead of a generate_slots call each
+            slots_by_master = await generate_slots_for_date(date_s, svc['duration_minutes'], [m['id'] for m in masters])
+        except Exception as e:
             try:
-                slots = await generate_slots(m['id'], date_s, svc['duration_minutes'])
-            except Exception as e:
-                try:
-                    print('generate_slots error:', e)
-                except Exception:
-                    pass
-                # skip this master on error
-                continue
+                print('generate_slots_for_date error:', e)
+            except Exception:
+                pass
+            slots_by_master = {}
+        for m in masters:
+            slots = slots_by_master.get(m['id'])
             if slots:
                 masters_with.append((m, slots))
         if not masters_with:
@@ -427,16 +470,21 @@ async def process_date(message: Message, state: FSMContext):
             except Exception:
                 pass
             from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            kb = InlineKeyboardMarkup(inline_keyboard=[[
+            next_rows = await _next_available_rows(svc_id, 0, start_date=date_s)
+            kb = InlineKeyboardMarkup(inline_keyboard=next_rows + [[
                 InlineKeyboardButton(text='Отправить ручную заявку админу', callback_data='manual:request:start'),
                 InlineKeyboardButton(text='Отмена', callback_data='manual:request:cancel')
             ]])
-            await message.answer('К сожалению, на этот день нет свободных слотов. Хотите отправить ручную заявку админу?', reply_markup=kb)
+            text = 'К сожалению, на этот день нет свободных слотов. Хотите отправить ручную заявку админу?'
+            if next_rows:
+                text = 'На этот день свободных слотов нет. Выберите ближайшее свободное время или отправьте ручную заявку админу.'
+            await message.answer(text, reply_markup=kb)
             return
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         rows = []
+        ratings = await ratings_for_masters([m['id'] for m in masters])
         for m, slots in masters_with:
-            avg, cnt = await average_rating_for_master(m['id'])
+            avg, cnt = ratings[m['id']]
             rating = format_rating(avg, cnt)
             label = f"{m['name']} ({len(slots)}), выбрать"
             if rating:
@@ -444,10 +492,9 @@ async def process_date(message: Message, state: FSMContext):
             # fixed callback_data quoting to avoid nested single-quote syntax error
             rows.append([InlineKeyboardButton(text=label, callback_data=f"book:master_choose:{m['id']}")])
         # Also show masters with zero slots as option for manual request
-        all_masters = await list_masters()
-        for m in all_masters:
+        for m in masters:
             if not any(m2['id'] == m['id'] for m2, _ in masters_with):
-                avg, cnt = await average_rating_for_master(m['id'])
+                avg, cnt = ratings[m['id']]
                 rating = format_rating(avg, cnt)
                 label = f"{m['name']} (❌ занято) — запросить"
                 if rating:
@@ -496,6 +543,12 @@ async def process_date(message: Message, state: FSMContext):
                             ranges.append(f"{rus[start]}–{rus[prev]}")
                         return ','.join(ranges)
                     days_str = format_days(days)
+                    next_rows = await _next_available_rows(svc_id, master_id, start_date=date_s)
+                    if next_rows:
+                        from aiogram.types import InlineKeyboardMarkup
+                        await message.answer(f'Этот мастер не работает в этот день недели. Доступные дни: {days_str}. Ближайшее свободное время:',
+                                             reply_markup=InlineKeyboardMarkup(inline_keyboard=next_rows))
+                        return
                     await message.answer(f'Этот мастер не работает в этот день недели. Доступные дни: {days_str}.')
                     return
             except Exception:
@@ -520,6 +573,12 @@ async def process_date(message: Message, state: FSMContext):
             print('process_date returning: no slots for specific master', master_id)
         except Exception:
             pass
+        next_rows = await _next_available_rows(svc_id, master_id, start_date=date_s)
+        if next_rows:
+            from aiogram.types import InlineKeyboardMarkup
+            await message.answer('На этот день у мастера нет слотов. Ближайшее свободное время:',
+                                 reply_markup=InlineKeyboardMarkup(inline_keyboard=next_rows))
+            return
         await message.answer('К сожалению, у выбранного мастера нет слотов на этот день. Попробуйте другую дату или мастера.')
         return
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -540,6 +599,25 @@ async def cb_select_time(query: CallbackQuery, state: FSMContext):
     await _set_state(state, BookingStates.NAME)
     await query.answer("")
 
+@router.callback_query(lambda q: q.data and q.data.startswith('book:next:'))
+async def cb_next_available(query: CallbackQuery, state: FSMContext):
+    """One-tap "next available" slot: book:next:YYYYMMDD:HHMM:<master_id> sets date, time and master."""
+    if await _get_state(state) not in (BookingStates.DATE.state, BookingStates.TIME.state):
+        await query.answer("")
+        return
+    try:
+        _, _, d, t, mid = query.data.split(':')
+        date_s = f'{d[:4]}-{d[4:6]}-{d[6:]}'
+        time_s = f'{t[:2]}:{t[2:]}'
+        master_id = int(mid)
+    except ValueError:
+        await query.answer("")
+        return
+    await state.update_data(date=date_s, time=time_s, master_id=master_id)
+    await query.message.answer(f'🕒 {date_s} {time_s}\n👤 Введите ваше имя:')
+    await _set_state(state, BookingStates.NAME)
+    await query.answer("")
+
 @router.message(StateFilter(BookingStates.TIME))
 async def process_time(message: Message, state: FSMContext):
     time_s = message.text.strip()
@@ -569,14 +647,15 @@ async def process_phone(message: Message, state: FSMContext):
     data = await state.get_data()
     
     # Get service and master names
-    service = await get_service(data['service_id'])
-    service_name = service['name'] if service else 'Услуга'
-    
-    master_id = data['master_id'] if data['master_id'] != 0 else None
-    master_name = 'без выбора'
-    if master_id:
-        master = await get_master(master_id)
-        master_name = master['name'] if master else 'Мастер'
+    async with unit_of_work(readonly=True) as uow:
+        service = await get_service(data['service_id'], session=uow)
+        service_name = service['name'] if service else 'Услуга'
+
+        master_id = data['master_id'] if data['master_id'] != 0 else None
+        master_name = 'без выбора'
+        if master_id:
+            master = await get_master(master_id, session=uow)
+            master_name = master['name'] if master else 'Мастер'
     
     # Build confirmation message with names, not IDs
     text = (
@@ -603,26 +682,11 @@ async def cb_confirm(query: CallbackQuery, state: FSMContext):
         await query.answer("")
         return
     data = await state.get_data()
-    user = await get_or_create_user(query.from_user.id, name=data.get('name'), phone=data.get('phone'))
     try:
-        await create_booking(user['id'], data['service_id'], data['master_id'] if data['master_id'] != 0 else None, data['date'], data['time'], data['name'], data['phone'])
-        # Получаем длительность услуги и id бронирования (поиск по данным)
-        service = await get_service(data['service_id'])
-        duration = service['duration_minutes'] if service and 'duration_minutes' in service else 30
-        # Получаем id только что созданной записи (по уникальным данным)
-        from app.repo import list_bookings
-        bookings = await list_bookings()
-        booking_id = None
-        for b in bookings:
-            if b['user_id'] == user['id'] and b['service_id'] == data['service_id'] and b['date'] == data['date'] and b['time'] == data['time']:
-                booking_id = b['id']
-                break
-        if booking_id:
-            schedule_auto_complete(booking_id, data['date'], data['time'], duration)
-            try:
-                schedule_reminders(booking_id, data['date'], data['time'])
-            except Exception:
-                pass
+        # user and booking are created in one transaction
+        async with unit_of_work() as uow:
+            user = await get_or_create_user(query.from_user.id, name=data.get('name'), phone=data.get('phone'), session=uow)
+            booking = await create_booking(user['id'], data['service_id'], data['master_id'] if data['master_id'] != 0 else None, data['date'], data['time'], data['name'], data['phone'], session=uow)
     except SlotTaken:
         await query.message.answer('😔 Извините, это время уже занято. Попробуйте выбрать другое.')
         await state.clear()
@@ -633,21 +697,21 @@ async def cb_confirm(query: CallbackQuery, state: FSMContext):
         await state.clear()
         await query.answer("")
         return
+    except WriteLockTimeout:
+        # nothing was written and the slot may still be free: keep the state so "confirm" can be pressed again
+        await query.message.answer('⏳ Сервис сейчас перегружен, запись не сохранена. Нажмите «Подтвердить» ещё раз через пару секунд.')
+        await query.answer("")
+        return
+    schedule_auto_complete(booking['id'], booking['date'], booking['time'], booking['duration_minutes'])
+    try:
+        schedule_reminders(booking['id'], booking['date'], booking['time'])
+    except Exception:
+        pass
     # notify admins
     try:
         from app.notify import notify_admins
         from app.repo import format_booking_for_display
-        # Create a minimal booking dict for formatting
-        user = await get_or_create_user(query.from_user.id, name=data.get('name'), phone=data.get('phone'))
-        booking_dict = {
-            'user_id': user['id'],
-            'service_id': data.get('service_id'),
-            'master_id': data.get('master_id'),
-            'date': data['date'],
-            'time': data['time']
-        }
-        formatted = await format_booking_for_display(booking_dict)
-        await notify_admins(formatted)
+        await notify_admins(await format_booking_for_display(booking))
     except Exception:
         pass
     await query.message.answer('🎉 Запись подтверждена! Админ уведомлён. Ждём вас!')
@@ -1,7 +1,7 @@
 from aiogram import Router
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import Command
-from app.repo import list_services, average_rating_for_service, list_bookings, get_or_create_user, get_service, get_master
+from app.repo import list_services, ratings_for_services, list_user_bookings, get_or_create_user
 from app.utils import format_rating
 from aiogram.types import CallbackQuery
 from app.keyboards import main_menu_kb
@@ -17,7 +17,6 @@ async def cmd_start(message: Message):
 
 @router.message(lambda message: message.text and '💇' in message.text)
 async def show_services(message: Message):
-    from app.repo import average_rating_for_service
     services = await list_services()
     if not services:
         await message.answer('😔 Пока нет доступных услуг. Администратор скоро добавит. Попробуйте позже!')
@@ -28,8 +27,9 @@ async def show_services(message: Message):
     page_items = services[:PAGE_SIZE]
     
     rows = []
+    ratings = await ratings_for_services([s['id'] for s in page_items])
     for s in page_items:
-        avg, cnt = await average_rating_for_service(s['id'])
+        avg, cnt = ratings[s['id']]
         rating_str = format_rating(avg, cnt)
         btn_text = f"{s['name']} — {s['price']}€"
         if rating_str:
@@ -50,9 +50,64 @@ async def cmd_services_button(message: Message):
     # reuse existing show_services flow
     await show_services(message)
 
+MY_BOOKINGS_PAGE_SIZE = 5
+# completed bookings offered for a review at once
+REVIEW_BOOKINGS_LIMIT = 10
+STATUS_LABELS = {'scheduled': '🕒 запланирована', 'completed': '✅ завершена', 'cancelled': '❌ отменена'}
+
+
+async def _build_my_bookings_page(user_id: int, cursor=None, backward=False):
+    """Return (text, keyboard) for one page of the user's bookings, or (None, None)."""
+    rows, has_more = await list_user_bookings(user_id, limit=MY_BOOKINGS_PAGE_SIZE, cursor=cursor, backward=backward)
+    if not rows:
+        return None, None
+    has_next = has_more if not backward else True
+    has_prev = has_more if backward else cursor is not None
+    lines = ['📅 Ваши записи:']
+    for b in rows:
+        line = f"\n{b['date']} {b['time']} — {b['service_name'] or 'Услуга'}"
+        if b['master_name']:
+            line += f" ({b['master_name']})"
+        line += f"\n{STATUS_LABELS.get(b['status'], b['status'])}"
+        lines.append(line)
+
+    def key(b):
+        return f"{b['date'].replace('-', '')}{b['time'].replace(':', '')}:{b['id']}"
+    nav_row = []
+    if has_prev:
+        nav_row.append(InlineKeyboardButton(text='⬅️ Назад', callback_data=f'my:bookings:p:{key(rows[0])}'))
+    if has_next:
+        nav_row.append(InlineKeyboardButton(text='➡️ Далее', callback_data=f'my:bookings:n:{key(rows[-1])}'))
+    kb = InlineKeyboardMarkup(inline_keyboard=[nav_row]) if nav_row else None
+    return '\n'.join(lines), kb
+
+
 @router.message(lambda message: message.text and message.text.strip() == '📅 Мои записи')
 async def cmd_my_booking(message: Message):
-    await message.answer('Функция "Мои записи" пока не реализована. Скоро будет доступна в удобном интерфейсе.')
+    user = await get_or_create_user(message.from_user.id)
+    text, kb = await _build_my_bookings_page(user['id'])
+    if not text:
+        await message.answer('У вас пока нет записей. Запишитесь через кнопку "💇 Услуги".')
+        return
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith('my:bookings:'))
+async def cb_my_bookings_page(query: CallbackQuery):
+    # format: my:bookings:<n|p>:<YYYYMMDDHHMM>:<booking_id>
+    try:
+        _, _, direction, key, bid = query.data.split(':')
+        cursor = (f'{key[:4]}-{key[4:6]}-{key[6:8]}', f'{key[8:10]}:{key[10:12]}', int(bid))
+    except Exception:
+        await query.answer('Неверная страница', show_alert=True)
+        return
+    user = await get_or_create_user(query.from_user.id)
+    text, kb = await _build_my_bookings_page(user['id'], cursor=cursor, backward=direction == 'p')
+    if not text:
+        await query.answer('Больше записей нет', show_alert=True)
+        return
+    await query.message.edit_text(text, reply_markup=kb)
+    await query.answer()
 
 
 @router.message(lambda message: message.text and message.text.strip() == '🏢 О нас')
@@ -83,8 +138,7 @@ async def cmd_reviews_button(message: Message):
 
     # Check if user has any completed bookings to allow leaving a review
     user = await get_or_create_user(message.from_user.id)
-    all_bookings = await list_bookings()
-    completed = [b for b in all_bookings if b.get('user_id') == user['id'] and b.get('status') == 'completed']
+    completed, _ = await list_user_bookings(user['id'], statuses=('completed',), limit=1)
     if completed:
         kb_rows = [[InlineKeyboardButton(text='Оставить отзыв', callback_data='start_leave_review')]]
         kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
@@ -96,30 +150,23 @@ async def cmd_reviews_button(message: Message):
 @router.callback_query(lambda c: c.data and c.data == 'start_leave_review')
 async def cb_start_leave_review(query: CallbackQuery):
     user = await get_or_create_user(query.from_user.id)
-    all_bookings = await list_bookings()
-    completed = [b for b in all_bookings if b.get('user_id') == user['id'] and b.get('status') == 'completed']
+    # rows already carry service and master names
+    completed, _ = await list_user_bookings(user['id'], statuses=('completed',), limit=REVIEW_BOOKINGS_LIMIT)
     if not completed:
         await query.answer('У вас нет завершённых записей для отзыва', show_alert=True)
         return
     # For each completed booking, send a message with rating buttons and option to add text
     for b in completed:
-        svc = None
-        mstr = None
-        try:
-            if b.get('service_id'):
-                svc = await get_service(b.get('service_id'))
-            if b.get('master_id'):
-                mstr = await get_master(b.get('master_id'))
-        except Exception:
-            pass
-        title = f"Запись {b.get('date')} {b.get('time')}"
-        if svc:
-            title += f" — {svc.get('name')}"
-        if mstr:
-            title += f" ({mstr.get('name')})"
+        title = f"Запись {b['date']} {b['time']}"
+        if b['service_name']:
+            title += f" — {b['service_name']}"
+        if b['master_name']:
+            title += f" ({b['master_name']})"
+        if b['reviewed']:
+            title += "\nОтзыв уже оставлен — новая оценка заменит его."
         # rating buttons
-        row1 = [InlineKeyboardButton(text=str(i), callback_data=f'review:rating:{i}:booking:{b.get("id")}') for i in range(1,6)]
-        row2 = [InlineKeyboardButton(text='Добавить комментарий', callback_data=f'review:text:booking:{b.get("id")}')]
+        row1 = [InlineKeyboardButton(text=str(i), callback_data=f'review:rating:{i}:booking:{b["id"]}') for i in range(1,6)]
+        row2 = [InlineKeyboardButton(text='Добавить комментарий', callback_data=f'review:text:booking:{b["id"]}')]
         kb = InlineKeyboardMarkup(inline_keyboard=[row1, row2])
         try:
             await query.message.answer(title, reply_markup=kb)
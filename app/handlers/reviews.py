@@ -1,13 +1,17 @@
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
-from app.repo import create_review, list_reviews, average_rating_for_master, average_rating_for_service, get_or_create_user
+from app.repo import create_review, average_rating_for_master, average_rating_for_service, get_or_create_user
 from app.utils import get_args_from_message as get_args
 import app.notify as notify_mod
 
 router = Router()
 
 MAX_REVIEW_TEXT = 2000
+# /list_reviews: newest reviews shown, rows hydrated per batch, chars per message (Telegram caps at 4096)
+REVIEWS_LIST_LIMIT = 200
+REVIEWS_RENDER_BATCH = 50
+REVIEWS_MESSAGE_LIMIT = 4000
 
 
 # Simple compatibility helpers for FSM state setting/getting (works with FakeState in tests)
@@ -108,24 +112,28 @@ async def cb_review_rating(query, state):
     except Exception:
         await query.answer('Неверные данные. Попробуйте снова.', show_alert=True)
         return
-    from app.repo import get_booking, get_user_by_id
-    b = await get_booking(booking_id)
-    if not b:
-        await query.answer('Бронирование не найдено. Обратитесь в поддержку.', show_alert=True)
+    from app.repo import get_booking, get_user_by_id, get_master, get_service
+    from app.db import unit_of_work
+    error = None
+    async with unit_of_work() as uow:
+        b = await get_booking(booking_id, session=uow)
+        if not b:
+            error = 'Бронирование не найдено. Обратитесь в поддержку.'
+        elif b['status'] != 'completed':
+            error = 'Отзыв можно оставить только после завершения визита. Подождите подтверждения от мастера.'
+        else:
+            # determine DB user id
+            user_db = await get_user_by_id(b['user_id'], session=uow)
+            if not user_db:
+                error = 'Пользователь не найден. Обратитесь в поддержку.'
+            else:
+                rid = await create_review(user_db['id'], b['service_id'], b['master_id'], rating, None, booking_id=booking_id, session=uow)
+                master = await get_master(b['master_id'], session=uow) if b['master_id'] else None
+                service = await get_service(b['service_id'], session=uow) if b['service_id'] else None
+    if error:
+        await query.answer(error, show_alert=True)
         return
-    if b['status'] != 'completed':
-        await query.answer('Отзыв можно оставить только после завершения визита. Подождите подтверждения от мастера.', show_alert=True)
-        return
-    # determine DB user id
-    user_db = await get_user_by_id(b['user_id'])
-    if not user_db:
-        await query.answer('Пользователь не найден. Обратитесь в поддержку.', show_alert=True)
-        return
-    rid = await create_review(user_db['id'], b['service_id'], b['master_id'], rating, None)
     try:
-        from app.repo import get_master, get_service
-        master = await get_master(b['master_id']) if b['master_id'] else None
-        service = await get_service(b['service_id']) if b['service_id'] else None
         master_name = master['name'] if master else "неизвестный"
         service_name = service['name'] if service else "неизвестная"
         msg = f"⭐ Новый отзыв\nРейтинг: {rating} звёзд\nМастер: {master_name}\nУслуга: {service_name}\n(по запросу)\nID отзыва: {rid}"
@@ -190,7 +198,7 @@ async def r_review_text(message, state):
         await message.answer('Пользователь не найден')
         await state.clear()
         return
-    rid = await create_review(user_db['id'], b['service_id'], b['master_id'], rating, text or None)
+    rid = await create_review(user_db['id'], b['service_id'], b['master_id'], rating, text or None, booking_id=b['id'])
     try:
         from app.repo import get_master, get_service
         master = await get_master(b['master_id']) if b['master_id'] else None
@@ -221,36 +229,55 @@ async def cmd_list_reviews(message: Message):
         except Exception:
             await message.answer('Неверные фильтры')
             return
-    rows = await list_reviews(service_id=service_id, master_id=master_id, limit=200)
-    if not rows:
+    from app.repo import EntityLoader, stream_reviews
+    loader = EntityLoader()
+    chunks = []
+    text = ''
+
+    async def render(batch):
+        nonlocal text
+        loader.prime_refs(batch)
+        for r in batch:
+            user = await loader.load('user', r['user_id'])
+            user_name = user['name'] if user else 'неизвестный'
+
+            service = await loader.load('service', r['service_id'])
+            master = await loader.load('master', r['master_id'])
+
+            service_name = service['name'] if service else 'неизвестная'
+            master_name = master['name'] if master else 'не указан'
+
+            rating_stars = '⭐' * r['rating']
+            entry = f"\n{rating_stars} {r['rating']} звёзд\n"
+            entry += f"Автор: {user_name}\n"
+            entry += f"Мастер: {master_name}\n"
+            entry += f"Услуга: {service_name}\n"
+            if r['text']:
+                entry += f"Комментарий: {r['text']}\n"
+            entry += f"ID: {r['id']}\n"
+            entry += "─" * 40
+            # split before Telegram's message limit instead of failing on long lists
+            if text and len(text) + len(entry) > REVIEWS_MESSAGE_LIMIT:
+                chunks.append(text)
+                text = ''
+            text += entry
+
+    batch = []
+    filters = {'service_id': service_id, 'master_id': master_id, 'limit': REVIEWS_LIST_LIMIT}
+    async for r in stream_reviews(filters, batch=REVIEWS_RENDER_BATCH):
+        batch.append(r)
+        if len(batch) >= REVIEWS_RENDER_BATCH:
+            await render(batch)
+            batch = []
+    if batch:
+        await render(batch)
+    if text:
+        chunks.append(text)
+    if not chunks:
         await message.answer('Отзывов нет')
         return
-    from app.repo import get_user_by_id, get_service, get_master
-    text = ''
-    for r in rows[:200]:
-        # Get user name by tg_id if available
-        user_name = 'неизвестный'
-        if r['user_id']:
-            user = await get_user_by_id(r['user_id'])
-            if user:
-                user_name = user['name']
-        
-        service = await get_service(r['service_id']) if r['service_id'] else None
-        master = await get_master(r['master_id']) if r['master_id'] else None
-        
-        service_name = service['name'] if service else 'неизвестная'
-        master_name = master['name'] if master else 'не указан'
-        
-        rating_stars = '⭐' * r['rating']
-        text += f"\n{rating_stars} {r['rating']} звёзд\n"
-        text += f"Автор: {user_name}\n"
-        text += f"Мастер: {master_name}\n"
-        text += f"Услуга: {service_name}\n"
-        if r['text']:
-            text += f"Комментарий: {r['text']}\n"
-        text += f"ID: {r['id']}\n"
-        text += "─" * 40
-    await message.answer(text)
+    for chunk in chunks:
+        await message.answer(chunk)
 
 @router.message(Command('avg_rating'))
 async def cmd_avg_rating(message: Message):
@@ -2,7 +2,7 @@ from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
 from app.repo import list_services
-from app.repo import average_rating_for_service
+from app.repo import ratings_for_services
 from app.utils import format_rating
 
 router = Router()
@@ -16,13 +16,14 @@ async def _build_services_page(services, page: int):
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     kb_rows = []
     text_lines = []
+    ratings = await ratings_for_services([s['id'] for s in page_items])
     for s in page_items:
-        avg, cnt = await average_rating_for_service(s['id'])
+        avg, cnt = ratings[s['id']]
         rating_str = format_rating(avg, cnt)
         text = f"{s['name']} — {s['price']}\n"
         if rating_str:
             text += f"{rating_str}\n"
-        text += s.get('description','')
+        text += s.get('description') or ''
         text_lines.append(text)
         kb_rows.append([InlineKeyboardButton(text=f'Записаться: {s["name"]}', callback_data=f'book:service:{s["id"]}')])
 
@@ -0,0 +1,154 @@
+"""Versioned SQL migrations tracked in a `schema_migrations` ledger.
+
+Files in migrations/ are named `<version>_<name>.sql`. Each pending file is
+applied in its own transaction together with its ledger row, so a migration is
+either fully applied and recorded or not applied at all. A warm start costs a
+single query against the ledger.
+"""
+import hashlib
+import re
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+
+LEDGER_DDL = '''
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  checksum TEXT NOT NULL,
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+_FILE_RE = re.compile(r'^(\d+)_(.+)\.sql$')
+# Statements the runner owns itself: transaction control, and foreign_keys
+# which SQLite ignores inside a transaction anyway.
+_SKIP_RE = re.compile(r'^(BEGIN|COMMIT|END|ROLLBACK)\b|^PRAGMA\s+foreign_keys\b', re.IGNORECASE)
+
+Migration = namedtuple('Migration', 'version name path checksum')
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory) -> list:
+    """Return migrations found in `directory`, ordered by version."""
+    found = {}
+    for p in sorted(Path(directory).glob('*.sql')):
+        m = _FILE_RE.match(p.name)
+        if not m:
+            raise MigrationError(f'bad migration file name: {p.name} (expected <version>_<name>.sql)')
+        version = int(m.group(1))
+        if version in found:
+            raise MigrationError(f'duplicate migration version {version}: {found[version].path.name}, {p.name}')
+        checksum = hashlib.sha256(p.read_bytes()).hexdigest()
+        found[version] = Migration(version, p.stem, p, checksum)
+    return [found[v] for v in sorted(found)]
+
+
+def split_statements(sql: str) -> list:
+    """Split a migration script into statements, dropping ones the runner owns."""
+    statements = []
+    buf = ''
+    for line in sql.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmt = _strip_comments(buf)
+            buf = ''
+            if stmt and not _SKIP_RE.match(stmt):
+                statements.append(stmt)
+    rest = _strip_comments(buf)
+    if rest:
+        statements.append(rest)
+    return statements
+
+
+def _strip_comments(stmt: str) -> str:
+    lines = [l for l in stmt.strip().splitlines() if not l.strip().startswith('--')]
+    return '\n'.join(lines).strip().rstrip(';').strip()
+
+
+async def _table_exists(db, name: str) -> bool:
+    cur = await db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return await cur.fetchone() is not None
+
+
+async def applied_versions(db) -> dict:
+    """Return {version: (name, checksum, applied_at)} from the ledger."""
+    if not await _table_exists(db, 'schema_migrations'):
+        return {}
+    cur = await db.execute('SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version')
+    return {r[0]: (r[1], r[2], r[3]) for r in await cur.fetchall()}
+
+
+async def is_up_to_date(db, migrations) -> bool:
+    """Warm-start check: one query comparing the ledger with the files on disk."""
+    if not migrations:
+        return True
+    try:
+        cur = await db.execute('SELECT COUNT(*), MAX(version) FROM schema_migrations')
+    except sqlite3.OperationalError:
+        return False
+    count, top = await cur.fetchone()
+    return count == len(migrations) and top == migrations[-1].version
+
+
+async def status(db, migrations) -> list:
+    """Return [(migration, state)] with state 'applied', 'pending' or 'modified'."""
+    done = await applied_versions(db)
+    out = []
+    for m in migrations:
+        if m.version not in done:
+            out.append((m, 'pending'))
+        elif done[m.version][1] != m.checksum:
+            out.append((m, 'modified'))
+        else:
+            out.append((m, 'applied'))
+    return out
+
+
+async def pending(db, migrations) -> list:
+    return [m for m, state in await status(db, migrations) if state == 'pending']
+
+
+async def migrate(db, migrations) -> list:
+    """Apply pending migrations on `db`, each in its own transaction.
+
+    Each transaction starts with BEGIN IMMEDIATE and re-reads the ledger row
+    for its version under that write lock, so when two processes start at
+    once the one that waited skips what the other has just applied. A
+    database created before the ledger existed is adopted: statements that
+    fail because their object or column already exists are skipped, the rest
+    of the file still runs, and the version is recorded. Returns the list of
+    migrations applied.
+    """
+    if await is_up_to_date(db, migrations):
+        return []
+    adopting = not await _table_exists(db, 'schema_migrations') and await _table_exists(db, 'bookings')
+    await db.execute(LEDGER_DDL)
+    await db.commit()
+    applied = []
+    for m in await pending(db, migrations):
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            cur = await db.execute('SELECT 1 FROM schema_migrations WHERE version=?', (m.version,))
+            if await cur.fetchone() is not None:
+                # applied by another process since pending() was read
+                await db.rollback()
+                continue
+            for stmt in split_statements(m.path.read_text(encoding='utf-8')):
+                try:
+                    await db.execute(stmt)
+                except sqlite3.OperationalError as e:
+                    msg = str(e).lower()
+                    if adopting and ('duplicate column' in msg or 'already exists' in msg):
+                        continue
+                    raise
+            await db.execute('INSERT INTO schema_migrations (version, name, checksum) VALUES (?,?,?)', (m.version, m.name, m.checksum))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise MigrationError(f'migration {m.path.name} failed: {e}') from e
+        applied.append(m)
+    return applied
@@ -0,0 +1,112 @@
+"""Compact row records returned by every connection (see db.record_factory).
+
+A record is a tuple of the column values. The column names live once on the
+record's class, which is built per distinct result shape and cached, so a row
+costs no more than its tuple and carries no cursor reference. Records keep
+the sqlite3.Row API the handlers rely on (`row['name']`, `row[0]`,
+`row.keys()`, `dict(row)`) and add `row.get(...)` and attribute access
+(`booking.date`).
+
+Result shapes that start with all the columns of a known table (`SELECT *`,
+`b.*, ...`) get a class derived from that table's record type, so
+`isinstance(row, Booking)` holds for the joined booking listings too.
+"""
+from operator import itemgetter
+
+
+class Record(tuple):
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+    _lower_index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                # sqlite3.Row matched column names case-insensitively
+                key = self._lower_index[key.lower()]
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, IndexError):
+            return default
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return list(zip(self._fields, self))
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        body = ', '.join(f'{k}={v!r}' for k, v in zip(self._fields, self))
+        return f'{type(self).__name__}({body})'
+
+
+class Booking(Record):
+    __slots__ = ()
+    _columns = ('id', 'user_id', 'service_id', 'master_id', 'date', 'time', 'status', 'name', 'phone',
+                'created_at')
+
+
+class Review(Record):
+    __slots__ = ()
+    _columns = ('id', 'user_id', 'service_id', 'master_id', 'rating', 'text', 'created_at')
+
+
+class User(Record):
+    __slots__ = ()
+    _columns = ('id', 'tg_id', 'name', 'phone', 'created_at')
+
+
+class Service(Record):
+    __slots__ = ()
+    _columns = ('id', 'name', 'description', 'price', 'duration_minutes')
+
+
+class Master(Record):
+    __slots__ = ()
+    _columns = ('id', 'name', 'bio', 'contact')
+
+
+class MasterException(Record):
+    """A master_exceptions row (a day off or changed hours), not an error."""
+    __slots__ = ()
+    _columns = ('id', 'master_id', 'date', 'start_time', 'end_time', 'available', 'note')
+
+
+# longest column lists first so a shape matches its most specific type
+RECORD_TYPES = sorted((Booking, Review, User, Service, Master, MasterException),
+                      key=lambda t: len(t._columns), reverse=True)
+
+_classes = {}
+
+
+def record_class(names: tuple) -> type:
+    """Return the (cached) record class for a result with these column names."""
+    cls = _classes.get(names)
+    if cls is not None:
+        return cls
+    base = next((t for t in RECORD_TYPES if names[:len(t._columns)] == t._columns), Record)
+    index = {}
+    lower_index = {}
+    for i, name in enumerate(names):
+        # duplicate names resolve to the first column, as with sqlite3.Row
+        index.setdefault(name, i)
+        lower_index.setdefault(name.lower(), i)
+    ns = {'__slots__': (), '_fields': names, '_index': index, '_lower_index': lower_index}
+    for name, i in index.items():
+        if name.isidentifier() and not hasattr(base, name):
+            ns[name] = property(itemgetter(i))
+    cls = type(base.__name__, (base,), ns)
+    _classes[names] = cls
+    return cls
@@ -1,5 +1,13 @@
-from app.db import get_db
+from app.db import get_db, run_write, active_session, after_commit, _db_path, WriteLockTimeout
+from app.scheduler import slot_cache, occupancy, hhmm_to_minutes
+from collections import OrderedDict
+from contextlib import aclosing
 from datetime import date
+import math
+import os
+import re
+import sqlite3
+import time
 import aiosqlite
 
 class SlotTaken(Exception):
@@ -8,183 +16,514 @@ class SlotTaken(Exception):
 class DoubleBooking(Exception):
     pass
 
-async def get_or_create_user(tg_id: int, name: str = None, phone: str = None):
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM users WHERE tg_id=?', (tg_id,))
-        row = await cur.fetchone()
-        if row:
-            return row
-        cur = await db.execute('INSERT INTO users (tg_id, name, phone) VALUES (?,?,?)', (tg_id, name, phone))
-        await db.commit()
-        user_id = cur.lastrowid
-        cur = await db.execute('SELECT * FROM users WHERE id=?', (user_id,))
-        row = await cur.fetchone()
+# Bounded LRU of tg_id -> users row; most handler calls are answered from it.
+DEFAULT_USER_CACHE_SIZE = 1024
+
+
+class UserCache:
+    """LRU cache of user rows keyed by (database path, tg_id).
+
+    Rows are only stored once the write that produced them has committed, so
+    a rolled-back unit of work never leaves a phantom user behind.
+    """
+
+    def __init__(self):
+        self._rows = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _size():
+        return max(0, int(os.getenv('USER_CACHE_SIZE', DEFAULT_USER_CACHE_SIZE)))
+
+    def get(self, tg_id):
+        key = (_db_path(), tg_id)
+        row = self._rows.get(key)
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self._rows.move_to_end(key)
+        self.stats['hits'] += 1
         return row
 
-async def list_services():
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM services')
-        rows = await cur.fetchall()
-        return rows
+    def put(self, row):
+        size = self._size()
+        if not size:
+            return
+        key = (_db_path(), row['tg_id'])
+        self._rows[key] = row
+        self._rows.move_to_end(key)
+        while len(self._rows) > size:
+            self._rows.popitem(last=False)
+
+    def clear(self):
+        self._rows.clear()
+
+
+user_cache = UserCache()
+
+
+async def get_or_create_user(tg_id: int, name: str = None, phone: str = None, session=None):
+    """Return the users row for `tg_id`, creating it if needed.
+
+    A non-empty `name`/`phone` that differs from the stored value updates it.
+    Known users with nothing to change are served from `user_cache` without a
+    query; everything else is a single upsert ... RETURNING statement.
+    """
+    row = user_cache.get(tg_id)
+    # None and '' leave the stored value alone, as NULLIF/COALESCE do below
+    if row is not None and (not name or name == row['name']) and (not phone or phone == row['phone']):
+        return row
+
+    async def _op(db):
+        cur = await db.execute(
+            'INSERT INTO users (tg_id, name, phone) VALUES (?,?,?) '
+            'ON CONFLICT(tg_id) DO UPDATE SET '
+            "name = COALESCE(NULLIF(excluded.name, ''), users.name), "
+            "phone = COALESCE(NULLIF(excluded.phone, ''), users.phone) "
+            'RETURNING *',
+            (tg_id, name, phone))
+        return await cur.fetchone()
+    row = await run_write(_op, session)
+    after_commit(lambda: user_cache.put(row), session)
+    return row
 
-async def create_service(name, description, price, duration_minutes=30):
-    async with get_db() as db:
+# Catalog cache: services and masters change only through the admin functions
+# below, so reads are served from memory. CATALOG_TTL_SECONDS (0 = no TTL)
+# bounds staleness from writers outside this process.
+DEFAULT_CATALOG_TTL_SECONDS = 300.0
+
+
+class _CatalogTable:
+    __slots__ = ('version', 'rows', 'by_id', 'path', 'expires_at')
+
+    def __init__(self):
+        self.version = 0
+        self.rows = None
+        self.by_id = {}
+        self.path = None
+        self.expires_at = None
+
+
+class Catalog:
+    """Versioned in-memory copy of the services and masters tables.
+
+    A table is loaded lazily with one SELECT and kept until a create/update/
+    delete function invalidates it (after its write commits), its TTL runs
+    out, or DATABASE_URL changes. Every invalidation bumps the table version;
+    a load that raced with an invalidation is returned but not kept.
+
+    Reads inside a write unit of work skip the cache so they see the unit's
+    own uncommitted changes; reads in a read-only unit use it when it is warm
+    but never fill it from their snapshot.
+    """
+
+    TABLES = ('services', 'masters')
+
+    def __init__(self):
+        self._tables = {t: _CatalogTable() for t in self.TABLES}
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _ttl():
+        return float(os.getenv('CATALOG_TTL_SECONDS', DEFAULT_CATALOG_TTL_SECONDS))
+
+    async def _load(self, table: str, session=None):
+        async with get_db(session, readonly=True) as db:
+            cur = await db.execute(f'SELECT * FROM {table}')
+            rows = await cur.fetchall()
+        self.stats['loads'] += 1
+        return rows, {r['id']: r for r in rows}
+
+    async def get(self, table: str, session=None):
+        """Return (rows, rows_by_id) for `table`."""
+        active = active_session(session)
+        if active is not None and not active.readonly:
+            return await self._load(table, active)
+        entry = self._tables[table]
+        path = _db_path()
+        if (entry.rows is not None and entry.path == path
+                and (entry.expires_at is None or time.monotonic() < entry.expires_at)):
+            self.stats['hits'] += 1
+            return entry.rows, entry.by_id
+        self.stats['misses'] += 1
+        version = entry.version
+        rows, by_id = await self._load(table, active)
+        if active is None and entry.version == version:
+            ttl = self._ttl()
+            entry.rows, entry.by_id, entry.path = rows, by_id, path
+            entry.expires_at = time.monotonic() + ttl if ttl > 0 else None
+        return rows, by_id
+
+    def invalidate(self, table: str = None, session=None):
+        """Drop `table` (default: all) now and again once the caller's write commits."""
+        def _drop():
+            for t in ((table,) if table else self.TABLES):
+                entry = self._tables[t]
+                entry.version += 1
+                entry.rows = None
+                entry.by_id = {}
+            self.stats['invalidations'] += 1
+        _drop()
+        active = active_session(session)
+        if active is not None and not active.readonly:
+            # readers outside the unit may refill from the pre-commit state meanwhile
+            after_commit(_drop, active)
+        # booked intervals depend on service durations and on which masters exist
+        slot_cache.invalidate(session=session)
+        occupancy.invalidate(session=session)
+
+
+catalog = Catalog()
+
+
+def catalog_stats() -> dict:
+    stats = dict(catalog.stats)
+    stats['versions'] = {t: catalog._tables[t].version for t in Catalog.TABLES}
+    return stats
+
+
+async def list_services(session=None):
+    rows, _ = await catalog.get('services', session)
+    return list(rows)
+
+async def create_service(name, description, price, duration_minutes=30, session=None):
+    async def _op(db):
         cur = await db.execute('INSERT INTO services (name, description, price, duration_minutes) VALUES (?,?,?,?)', (name, description, price, duration_minutes))
-        await db.commit()
         return cur.lastrowid
+    service_id = await run_write(_op, session)
+    catalog.invalidate('services', session)
+    return service_id
 
-async def update_service(service_id: int, name: str = None, description: str = None, price: float = None, duration_minutes: int = None):
-    async with get_db() as db:
-        fields = []
-        params = []
-        if name is not None:
-            fields.append('name=?')
-            params.append(name)
-        if description is not None:
-            fields.append('description=?')
-            params.append(description)
-        if price is not None:
-            fields.append('price=?')
-            params.append(price)
-        if duration_minutes is not None:
-            fields.append('duration_minutes=?')
-            params.append(duration_minutes)
-        if not fields:
-            return
-        params.append(service_id)
-        sql = f"UPDATE services SET {', '.join(fields)} WHERE id=?"
+async def update_service(service_id: int, name: str = None, description: str = None, price: float = None, duration_minutes: int = None, session=None):
+    fields = []
+    params = []
+    if name is not None:
+        fields.append('name=?')
+        params.append(name)
+    if description is not None:
+        fields.append('description=?')
+        params.append(description)
+    if price is not None:
+        fields.append('price=?')
+        params.append(price)
+    if duration_minutes is not None:
+        fields.append('duration_minutes=?')
+        params.append(duration_minutes)
+    if not fields:
+        return
+    params.append(service_id)
+    sql = f"UPDATE services SET {', '.join(fields)} WHERE id=?"
+
+    async def _op(db):
         await db.execute(sql, tuple(params))
-        await db.commit()
+    await run_write(_op, session)
+    catalog.invalidate('services', session)
 
-async def delete_service(service_id: int):
-    async with get_db() as db:
+async def delete_service(service_id: int, session=None):
+    async def _op(db):
         await db.execute('DELETE FROM services WHERE id=?', (service_id,))
-        await db.commit()
+    await run_write(_op, session)
+    catalog.invalidate('services', session)
 
-async def get_service(service_id: int):
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM services WHERE id=?', (service_id,))
-        row = await cur.fetchone()
-        return row
+async def get_service(service_id: int, session=None):
+    _, by_id = await catalog.get('services', session)
+    return by_id.get(service_id)
 
-async def list_masters():
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM masters')
-        rows = await cur.fetchall()
-        return rows
+async def list_masters(session=None):
+    rows, _ = await catalog.get('masters', session)
+    return list(rows)
 
-async def get_master(master_id: int):
-    async with get_db() as db:
-        cur = await db.execute('SELECT * FROM masters WHERE id=?', (master_id,))
-        row = await cur.fetchone()
-        return row
+async def get_master(master_id: int, session=None):
+    _, by_id = await catalog.get('masters', session)
+    return by_id.get(master_id)
 
-async def create_master(name, bio=None, contact=None):
-    async with get_db() as db:
+async def create_master(name, bio=None, contact=None, session=None):
+    async def _op(db):
         cur = await db.execute('INSERT INTO masters (name, bio, contact) VALUES (?,?,?)', (name, bio, contact))
-        await db.commit()
         return cur.lastrowid
+    master_id = await run_write(_op, session)
+    catalog.invalidate('masters', session)
+    return master_id
 
-async def update_master(master_id: int, name: str = None, bio: str = None, contact: str = None):
-    async with get_db() as db:
-        # build dynamic update
-        fields = []
-        params = []
-        if name is not None:
-            fields.append('name=?')
-            params.append(name)
-        if bio is not None:
-            fields.append('bio=?')
-            params.append(bio)
-        if contact is not None:
-            fields.append('contact=?')
-            params.append(contact)
-        if not fields:
-            return
-        params.append(master_id)
-        sql = f"UPDATE masters SET {', '.join(fields)} WHERE id=?"
+async def update_master(master_id: int, name: str = None, bio: str = None, contact: str = None, session=None):
+    # build dynamic update
+    fields = []
+    params = []
+    if name is not None:
+        fields.append('name=?')
+        params.append(name)
+    if bio is not None:
+        fields.append('bio=?')
+        params.append(bio)
+    if contact is not None:
+        fields.append('contact=?')
+        params.append(contact)
+    if not fields:
+        return
+    params.append(master_id)
+    sql = f"UPDATE masters SET {', '.join(fields)} WHERE id=?"
+
+    async def _op(db):
         await db.execute(sql, tuple(params))
-        await db.commit()
+    await run_write(_op, session)
+    catalog.invalidate('masters', session)
 
-async def delete_master(master_id: int):
-    async with get_db() as db:
+async def delete_master(master_id: int, session=None):
+    async def _op(db):
         await db.execute('DELETE FROM masters WHERE id=?', (master_id,))
-        await db.commit()
+    await run_write(_op, session)
+    catalog.invalidate('masters', session)
 
-async def set_master_schedule(master_id: int, weekday: int, start_time: str, end_time: str, slot_interval_minutes: int = None):
-    async with get_db() as db:
+async def set_master_schedule(master_id: int, weekday: int, start_time: str, end_time: str, slot_interval_minutes: int = None, session=None):
+    async def _op(db):
         await db.execute('DELETE FROM master_schedule WHERE master_id=? AND weekday=?', (master_id, weekday))
         await db.execute('INSERT INTO master_schedule (master_id, weekday, start_time, end_time, slot_interval_minutes) VALUES (?,?,?,?,?)', (master_id, weekday, start_time, end_time, slot_interval_minutes))
-        await db.commit()
+    await run_write(_op, session)
+    slot_cache.invalidate(master_id, session=session)
 
-async def user_has_active_booking(user_id: int):
+async def user_has_active_booking(user_id: int, session=None):
     today = date.today().isoformat()
-    async with get_db() as db:
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute("SELECT COUNT(*) as c FROM bookings WHERE user_id=? AND status='scheduled' AND date>=?", (user_id, today))
         row = await cur.fetchone()
         return row['c'] > 0
 
-async def create_booking(user_id, service_id, master_id, date_s, time_s, name, phone):
-    async with get_db() as db:
+# A booking joined with what confirmation, scheduling and the admin message need.
+_BOOKING_DETAILS_SELECT = '''
+SELECT b.*,
+       COALESCE(s.duration_minutes, 30) AS duration_minutes,
+       s.name AS service_name,
+       m.name AS master_name,
+       u.tg_id AS user_tg_id,
+       u.name AS user_name,
+       u.phone AS user_phone,
+       EXISTS (SELECT 1 FROM reviews r WHERE r.booking_id = b.id) AS reviewed
+FROM bookings b
+LEFT JOIN services s ON s.id = b.service_id
+LEFT JOIN masters m ON m.id = b.master_id
+LEFT JOIN users u ON u.id = b.user_id
+'''
+_BOOKING_DETAILS_SQL = _BOOKING_DETAILS_SELECT + 'WHERE b.id = ?'
+
+# rows fetched per round trip by the stream_* iterators
+DEFAULT_STREAM_BATCH = 500
+
+
+async def stream_rows(sql: str, params=(), batch: int = DEFAULT_STREAM_BATCH, session=None):
+    """Yield the rows of a read-only query, `batch` at a time via fetchmany.
+
+    Peak memory stays at one batch however large the result is. The read
+    connection is held until the iterator is exhausted or closed, so consume
+    it promptly (no Telegram calls between rows) and wrap it in
+    contextlib.aclosing() when breaking out early.
+    """
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute(sql, params)
         try:
-            await db.execute('BEGIN')
-            # check user active booking
-            cur = await db.execute("SELECT COUNT(*) as c FROM bookings WHERE user_id=? AND status='scheduled' AND date>=?", (user_id, date.today().isoformat()))
-            r = await cur.fetchone()
-            if r['c'] > 0:
-                raise DoubleBooking()
-            # try to insert; unique index on (master_id,date,time) prevents duplicates from races
-            import time
-            from sqlite3 import OperationalError
-            max_attempts = 5
-            for attempt in range(max_attempts):
-                try:
-                    await db.execute('INSERT INTO bookings (user_id, service_id, master_id, date, time, status, name, phone) VALUES (?,?,?,?,?,?,?,?)', (user_id, service_id, master_id, date_s, time_s, 'scheduled', name, phone))
-                    await db.commit()
+            while True:
+                rows = await cur.fetchmany(batch)
+                if not rows:
                     break
-                except OperationalError as e:
-                    # transient DB locked — retry a few times
-                    if 'locked' in str(e).lower():
-                        if attempt < max_attempts - 1:
-                            await db.rollback()
-                            time.sleep(0.05 * (attempt + 1))
-                            continue
-                        else:
-                            await db.rollback()
-                            raise SlotTaken()
-                    raise
-                except Exception as e:
-                    err_msg = str(e).lower()
-                    if 'unique' in err_msg or 'constraint' in err_msg:
-                        await db.rollback()
-                        raise SlotTaken()
-                    await db.rollback()
-                    raise
-        except Exception:
-            await db.rollback()
-            raise
-
-async def list_bookings():
-    async with get_db() as db:
+                for row in rows:
+                    yield row
+        finally:
+            await cur.close()
+
+async def create_booking(user_id, service_id, master_id, date_s, time_s, name, phone, session=None):
+    """Insert a booking and return it as a Booking record.
+
+    The record has the booking columns plus `duration_minutes`, `service_name`,
+    `master_name`, `user_tg_id`, `user_name` and `user_phone`, read in the
+    same transaction as the insert.
+
+    Raises SlotTaken when the master's slot is already booked, DoubleBooking
+    when the user has an upcoming booking, and db.WriteLockTimeout when the
+    write lock could not be taken in time (nothing was written; retry).
+    """
+    # Runs inside the writer's BEGIN IMMEDIATE transaction, so the active
+    # booking check and the insert see the same snapshot.
+    async def _op(db):
+        # check user active booking
+        cur = await db.execute("SELECT COUNT(*) as c FROM bookings WHERE user_id=? AND status='scheduled' AND date>=?", (user_id, date.today().isoformat()))
+        r = await cur.fetchone()
+        if r['c'] > 0:
+            raise DoubleBooking()
+        # unique index on (master_id,date,time) prevents duplicates from races
+        try:
+            cur = await db.execute('INSERT INTO bookings (user_id, service_id, master_id, date, time, status, name, phone) VALUES (?,?,?,?,?,?,?,?)', (user_id, service_id, master_id, date_s, time_s, 'scheduled', name, phone))
+        except sqlite3.IntegrityError:
+            raise SlotTaken()
+        cur = await db.execute(_BOOKING_DETAILS_SQL, (cur.lastrowid,))
+        return await cur.fetchone()
+    _booking_stats['attempts'] += 1
+    try:
+        booking = await run_write(_op, session)
+    except SlotTaken:
+        _booking_stats['slot_taken'] += 1
+        # the cached day offered a slot someone else (maybe another process) has taken
+        slot_cache.invalidate(master_id, date_s)
+        occupancy.invalidate(master_id, date_s)
+        raise
+    except DoubleBooking:
+        _booking_stats['double_booking'] += 1
+        raise
+    except WriteLockTimeout:
+        _booking_stats['lock_timeouts'] += 1
+        raise
+    _booking_stats['created'] += 1
+    slot_cache.invalidate(master_id, date_s, session)
+    _update_occupancy(booking, True, session)
+    return booking
+
+
+_booking_stats = {'attempts': 0, 'created': 0, 'slot_taken': 0, 'double_booking': 0, 'lock_timeouts': 0}
+
+
+def booking_stats() -> dict:
+    """Outcome counters of create_booking calls (see also db.writer_stats() lock_* keys)."""
+    return dict(_booking_stats)
+
+async def list_bookings(session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM bookings ORDER BY date DESC, time DESC')
         rows = await cur.fetchall()
         return rows
 
 
-async def get_booking(booking_id: int):
-    async with get_db() as db:
+async def _bookings_page(where: list, params: list, cursor, backward: bool, limit: int, session):
+    """Run one keyset page of _BOOKING_DETAILS_SELECT; see list_bookings_page."""
+    where = list(where)
+    params = list(params)
+    if cursor is not None:
+        where.append('(b.date, b.time, b.id) > (?, ?, ?)' if backward else '(b.date, b.time, b.id) < (?, ?, ?)')
+        params.extend(cursor)
+    sql = _BOOKING_DETAILS_SELECT
+    if where:
+        sql += 'WHERE ' + ' AND '.join(where) + '\n'
+    order = 'ASC' if backward else 'DESC'
+    sql += f'ORDER BY b.date {order}, b.time {order}, b.id {order} LIMIT ?'
+    params.append(int(limit) + 1)
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute(sql, params)
+        rows = await cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+
+async def list_bookings_page(start: str = None, end: str = None, status: str = None, master_id: int = None,
+                             cursor: tuple = None, backward: bool = False, limit: int = 10, session=None):
+    """Return (rows, has_more): one page of bookings, newest first.
+
+    Filters run in SQL. Rows carry the same joined names as create_booking.
+    Pagination is keyset on (date, time, id): `cursor` is the key of the last
+    row of the current page to go forward (older bookings), or of its first
+    row with `backward=True` to go back. `has_more` tells whether another
+    page exists in the direction of travel.
+    """
+    where, params = _booking_filters(start=start, end=end, status=status, master_id=master_id)
+    return await _bookings_page(where, params, cursor, backward, limit, session)
+
+
+def _booking_filters(start: str = None, end: str = None, status: str = None, master_id: int = None, user_id: int = None):
+    """Return (where, params) for the booking filters shared by pages and streams."""
+    where = []
+    params = []
+    if start:
+        where.append('b.date >= ?')
+        params.append(start)
+    if end:
+        where.append('b.date <= ?')
+        params.append(end)
+    if status:
+        where.append('b.status = ?')
+        params.append(status)
+    if master_id:
+        where.append('b.master_id = ?')
+        params.append(master_id)
+    if user_id:
+        where.append('b.user_id = ?')
+        params.append(user_id)
+    return where, params
+
+
+async def stream_bookings(filters: dict = None, batch: int = DEFAULT_STREAM_BATCH, session=None):
+    """Yield bookings newest first, with the joined names of list_bookings_page.
+
+    `filters` takes the keys start, end, status, master_id and user_id.
+
+        async for b in stream_bookings({'status': 'completed'}):
+            ...
+    """
+    where, params = _booking_filters(**(filters or {}))
+    sql = _BOOKING_DETAILS_SELECT
+    if where:
+        sql += 'WHERE ' + ' AND '.join(where) + '\n'
+    sql += 'ORDER BY b.date DESC, b.time DESC, b.id DESC'
+    async with aclosing(stream_rows(sql, params, batch, session)) as rows:
+        async for row in rows:
+            yield row
+
+
+async def list_user_bookings(user_id: int, statuses=None, limit: int = 10, cursor: tuple = None,
+                             backward: bool = False, session=None):
+    """Return (rows, has_more): one user's bookings, newest first.
+
+    Same row shape and keyset cursor as list_bookings_page. Served by the
+    bookings(user_id, status, date) index, so the cost depends on the user's
+    own history only.
+    """
+    where = ['b.user_id = ?']
+    params = [user_id]
+    if statuses:
+        statuses = list(statuses)
+        where.append(f"b.status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    return await _bookings_page(where, params, cursor, backward, limit, session)
+
+
+async def get_booking(booking_id: int, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM bookings WHERE id=?', (booking_id,))
         row = await cur.fetchone()
         return row
 
 
-async def set_booking_status(booking_id: int, status: str):
-    async with get_db() as db:
+def _update_occupancy(booking, booked: bool, session=None):
+    """Apply a booking that started or stopped blocking its slot to the occupancy bitmaps."""
+    if booking['duration_minutes'] is None:
+        occupancy.invalidate(booking['master_id'], booking['date'], session)
+        return
+    start = hhmm_to_minutes(booking['time'])
+    apply = occupancy.book if booked else occupancy.release
+    apply(booking['master_id'], booking['date'], booking['id'], start, start + booking['duration_minutes'], session)
+
+
+async def set_booking_status(booking_id: int, status: str, session=None):
+    """Set a booking's status and update the slot and occupancy caches after commit.
+
+    The writer job SELECTs the booking's previous status, master, date, time
+    and duration, then UPDATEs it, so the caches know which day changed and
+    whether a slot was freed or taken.
+    """
+    async def _op(db):
+        cur = await db.execute(
+            'SELECT b.id, b.status, b.master_id, b.date, b.time, s.duration_minutes FROM bookings b '
+            'LEFT JOIN services s ON s.id = b.service_id WHERE b.id=?', (booking_id,))
+        before = await cur.fetchone()
         await db.execute('UPDATE bookings SET status=? WHERE id=?', (status, booking_id))
-        await db.commit()
+        return before
+    before = await run_write(_op, session)
+    if before is not None:
+        # only 'scheduled' bookings block slots, so any status change frees or takes one
+        slot_cache.invalidate(before['master_id'], before['date'], session)
+        if (before['status'] == 'scheduled') != (status == 'scheduled'):
+            _update_occupancy(before, status == 'scheduled', session)
 
 
-async def set_reminder_sent(booking_id: int, which: str):
+async def set_reminder_sent(booking_id: int, which: str, session=None):
     """Mark reminder as sent for booking.
 
     which: '24h' or '1h'
@@ -196,21 +535,94 @@ async def set_reminder_sent(booking_id: int, which: str):
         col = 'reminded_1'
     else:
         return
-    async with get_db() as db:
+    async def _op(db):
         await db.execute(f'UPDATE bookings SET {col}=? WHERE id=?', (1, booking_id))
-        await db.commit()
+    await run_write(_op, session)
 
-async def get_user_by_id(user_id: int):
-    async with get_db() as db:
+async def get_user_by_id(user_id: int, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM users WHERE id=?', (user_id,))
         row = await cur.fetchone()
         return row
 
 
-async def format_booking_for_display(booking) -> str:
+class EntityLoader:
+    """Per-request batching loader for users, services and masters.
+
+    Callers `prime()` the ids they are going to need (or `prime_refs()` a list
+    of bookings/reviews), then `load()` entities one by one. The first `load()`
+    of a kind resolves every pending id of that kind with a single
+    `WHERE id IN (...)` query; ids are deduplicated and results, including
+    misses, are cached for the lifetime of the loader. Services and masters
+    are resolved through `catalog` instead, so only users cost a query.
+    Create one loader per incoming update; it is not invalidated by writes.
+    """
+
+    _TABLES = {'user': 'users', 'service': 'services', 'master': 'masters'}
+    # stay well below SQLite's bound-parameter limit
+    _CHUNK = 500
+
+    def __init__(self, session=None):
+        self.session = session
+        self._cache = {kind: {} for kind in self._TABLES}
+        self._pending = {kind: set() for kind in self._TABLES}
+        self.queries = 0
+
+    def prime(self, kind: str, ids):
+        cache = self._cache[kind]
+        self._pending[kind].update(i for i in ids if i and i not in cache)
+
+    def prime_refs(self, rows):
+        """Queue the user/service/master ids referenced by booking or review rows."""
+        for kind in self._TABLES:
+            self.prime(kind, (r[f'{kind}_id'] for r in rows))
+
+    async def _flush(self, kind: str):
+        ids = list(self._pending[kind])
+        self._pending[kind].clear()
+        if not ids:
+            return
+        cache = self._cache[kind]
+        table = self._TABLES[kind]
+        if table in Catalog.TABLES:
+            _, by_id = await catalog.get(table, self.session)
+            for i in ids:
+                cache[i] = by_id.get(i)
+            return
+        async with get_db(self.session, readonly=True) as db:
+            for i in range(0, len(ids), self._CHUNK):
+                chunk = ids[i:i + self._CHUNK]
+                marks = ','.join('?' * len(chunk))
+                cur = await db.execute(f'SELECT * FROM {table} WHERE id IN ({marks})', chunk)
+                self.queries += 1
+                for row in await cur.fetchall():
+                    cache[row['id']] = row
+        for i in ids:
+            cache.setdefault(i, None)
+
+    async def load(self, kind: str, entity_id):
+        if not entity_id:
+            return None
+        self.prime(kind, (entity_id,))
+        if self._pending[kind]:
+            await self._flush(kind)
+        return self._cache[kind].get(entity_id)
+
+    async def load_many(self, kind: str, ids) -> dict:
+        ids = [i for i in ids if i]
+        self.prime(kind, ids)
+        await self._flush(kind)
+        cache = self._cache[kind]
+        return {i: cache[i] for i in ids}
+
+
+async def format_booking_for_display(booking, session=None, loader: EntityLoader = None) -> str:
     """Format booking record for admin display with real data instead of IDs.
     
-    booking can be dict or sqlite3.Row with keys: user_id, service_id, master_id, date, time
+    booking can be a dict or a Booking record with keys: user_id, service_id, master_id, date, time.
+    A booking returned by create_booking already carries the names and is
+    formatted without further queries. Pass a shared `loader` (primed with
+    `prime_refs`) when formatting many bookings.
     
     Returns formatted string like:
     📌 Новая запись
@@ -221,18 +633,22 @@ async def format_booking_for_display(booking) -> str:
     Дата: {date}
     Время: {time}
     """
-    user_id = booking['user_id']
-    service_id = booking['service_id']
-    master_id = booking['master_id']
-    
-    user = await get_user_by_id(user_id) if user_id else None
-    service = await get_service(service_id) if service_id else None
-    master = await get_master(master_id) if master_id else None
-    
-    user_name = user['name'] if user else "неизвестный"
-    user_phone = user['phone'] if user else ""
-    service_name = service['name'] if service else "неизвестная"
-    master_name = master['name'] if master else "без выбора"
+    if 'user_name' in booking.keys():
+        user_name = booking['user_name'] or "неизвестный"
+        user_phone = booking['user_phone'] or ""
+        service_name = booking['service_name'] or "неизвестная"
+        master_name = booking['master_name'] or "без выбора"
+    else:
+        loader = loader or EntityLoader(session)
+        loader.prime_refs((booking,))
+        user = await loader.load('user', booking['user_id'])
+        service = await loader.load('service', booking['service_id'])
+        master = await loader.load('master', booking['master_id'])
+
+        user_name = user['name'] if user else "неизвестный"
+        user_phone = user['phone'] if user else ""
+        service_name = service['name'] if service else "неизвестная"
+        master_name = master['name'] if master else "без выбора"
     
     text = "📌 Новая запись\n"
     text += f"Клиент: {user_name}\n"
@@ -245,8 +661,8 @@ async def format_booking_for_display(booking) -> str:
     return text
 
 
-async def add_exception(master_id: int, date_s: str, available: int = 1, start_time: str = None, end_time: str = None, note: str = None):
-    async with get_db() as db:
+async def add_exception(master_id: int, date_s: str, available: int = 1, start_time: str = None, end_time: str = None, note: str = None, session=None):
+    async def _op(db):
         # upsert
         cur = await db.execute('SELECT id FROM master_exceptions WHERE master_id=? AND date=?', (master_id, date_s))
         row = await cur.fetchone()
@@ -254,129 +670,488 @@ async def add_exception(master_id: int, date_s: str, available: int = 1, start_t
             await db.execute('UPDATE master_exceptions SET available=?, start_time=?, end_time=?, note=? WHERE id=?', (available, start_time, end_time, note, row['id']))
         else:
             await db.execute('INSERT INTO master_exceptions (master_id, date, start_time, end_time, available, note) VALUES (?,?,?,?,?,?)', (master_id, date_s, start_time, end_time, available, note))
-        await db.commit()
+    await run_write(_op, session)
+    slot_cache.invalidate(master_id, date_s, session)
 
-async def list_exceptions(master_id: int):
-    async with get_db() as db:
+async def list_exceptions(master_id: int, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM master_exceptions WHERE master_id=? ORDER BY date DESC', (master_id,))
         rows = await cur.fetchall()
         return rows
 # NOTE: advanced exception management is not part of the MVP demo UI.
 # TODO: FROZEN for MVP demo — keep implementation for future use, do not remove.
 
+# Catalog import/export: bulk services, masters, schedules and exceptions (admin)
+CATALOG_KINDS = ('services', 'masters', 'schedules', 'exceptions')
+_HHMM_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
+
+class CatalogImportError(ValueError):
+    """A catalog bundle failed validation. Nothing was written.
+
+    `errors` lists every problem found, e.g. "schedules[3]: weekday must be 0-6".
+    """
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__('; '.join(self.errors[:5]) + (f' (+{len(self.errors) - 5})' if len(self.errors) > 5 else ''))
+
+
+def _blank(v):
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+def _text(v):
+    return None if _blank(v) else str(v).strip()
+
+
+def _normalize_catalog_bundle(bundle: dict):
+    """Validate and coerce a bundle (values may be CSV strings); return (bundle, errors)."""
+    errors = []
+    out = {kind: [] for kind in CATALOG_KINDS}
+    if not isinstance(bundle, dict):
+        return out, ['bundle must be an object with ' + ', '.join(CATALOG_KINDS)]
+    unknown = set(bundle) - set(CATALOG_KINDS)
+    if unknown:
+        errors.append('unknown sections: ' + ', '.join(sorted(unknown)))
+
+    def num(where, row, key, cast, lo=None, hi=None, required=False):
+        v = row.get(key)
+        if _blank(v):
+            if required:
+                errors.append(f'{where}: {key} is required')
+            return None
+        try:
+            v = cast(v)
+        except (TypeError, ValueError):
+            errors.append(f'{where}: {key} must be a number')
+            return None
+        if not math.isfinite(v):
+            errors.append(f'{where}: {key} must be a finite number')
+            return None
+        if (lo is not None and v < lo) or (hi is not None and v > hi):
+            errors.append(f'{where}: {key} must be between {lo} and {hi}')
+            return None
+        return v
+
+    def rows(kind):
+        """Yield (index, row) of a section, reporting a section or row of the wrong type."""
+        section = bundle.get(kind)
+        if section is None:
+            return
+        if not isinstance(section, list):
+            errors.append(f'{kind}: must be a list of objects')
+            return
+        for i, row in enumerate(section):
+            if isinstance(row, dict):
+                yield i, row
+            else:
+                errors.append(f'{kind}[{i}]: must be an object')
+
+    def master_ref(where, row):
+        master_id = num(where, row, 'master_id', int)
+        name = _text(row.get('master'))
+        if master_id is None and name is None:
+            errors.append(f'{where}: master or master_id is required')
+        return master_id, name
+
+    def hours(where, row, required):
+        start, end = _text(row.get('start_time')), _text(row.get('end_time'))
+        if start is None and end is None and not required:
+            return None, None
+        for key, v in (('start_time', start), ('end_time', end)):
+            if v is None or not _HHMM_RE.match(v):
+                errors.append(f'{where}: {key} must be HH:MM')
+                return None, None
+        if start >= end:
+            errors.append(f'{where}: start_time must be before end_time')
+        return start, end
+
+    for kind in ('services', 'masters'):
+        seen = set()
+        for i, row in rows(kind):
+            where = f'{kind}[{i}]'
+            name = _text(row.get('name'))
+            if name is None:
+                errors.append(f'{where}: name is required')
+                continue
+            if name in seen:
+                errors.append(f'{where}: duplicate name {name!r}')
+            seen.add(name)
+            if kind == 'services':
+                out[kind].append({
+                    'name': name,
+                    'description': _text(row.get('description')),
+                    'price': num(where, row, 'price', float, 0.0),
+                    'duration_minutes': num(where, row, 'duration_minutes', int, 1, 24 * 60),
+                })
+            else:
+                out[kind].append({'name': name, 'bio': _text(row.get('bio')), 'contact': _text(row.get('contact'))})
+
+    for i, row in rows('schedules'):
+        where = f'schedules[{i}]'
+        master_id, master = master_ref(where, row)
+        start, end = hours(where, row, required=True)
+        out['schedules'].append({
+            'master_id': master_id, 'master': master,
+            'weekday': num(where, row, 'weekday', int, 0, 6, required=True),
+            'start_time': start, 'end_time': end,
+            'slot_interval_minutes': num(where, row, 'slot_interval_minutes', int, 1, 24 * 60),
+        })
+
+    for i, row in rows('exceptions'):
+        where = f'exceptions[{i}]'
+        master_id, master = master_ref(where, row)
+        day = _text(row.get('date'))
+        try:
+            day = date.fromisoformat(day).isoformat()
+        except (TypeError, ValueError):
+            errors.append(f'{where}: date must be YYYY-MM-DD')
+        start, end = hours(where, row, required=False)
+        # without hours an exception is a day off unless stated otherwise
+        available = num(where, row, 'available', int, 0, 1)
+        if available is None:
+            available = 1 if start else 0
+        out['exceptions'].append({'master_id': master_id, 'master': master, 'date': day, 'start_time': start,
+                                  'end_time': end, 'available': available, 'note': _text(row.get('note'))})
+    return out, errors
+
+
+async def import_catalog(bundle: dict, session=None) -> dict:
+    """Apply a bundle of services, masters, schedules and exceptions in one transaction.
+
+    `bundle` maps each of CATALOG_KINDS to a list of rows (see export_catalog
+    for the shape). Services and masters are matched by name: existing ones
+    are updated (empty fields keep their value), others are created.
+    Schedule rows replace the master's hours for that weekday; exceptions
+    replace the master's exception for that date. Schedules and exceptions
+    name their master by `master` (name, may be new in the same bundle) or
+    `master_id`.
+
+    Every row is validated first; on any problem CatalogImportError lists
+    them all and nothing is written. Returns per-kind row counts.
+    """
+    data, errors = _normalize_catalog_bundle(bundle)
+    if errors:
+        raise CatalogImportError(errors)
+
+    async def _op(db):
+        async def names(table):
+            cur = await db.execute(f'SELECT id, name FROM {table} ORDER BY id')
+            by_name = {}
+            for r in await cur.fetchall():
+                by_name.setdefault(r['name'], r['id'])
+            return by_name
+
+        counts = {}
+        services = await names('services')
+        await db.executemany(
+            'UPDATE services SET description=COALESCE(?, description), price=COALESCE(?, price), '
+            'duration_minutes=COALESCE(?, duration_minutes) WHERE id=?',
+            [(s['description'], s['price'], s['duration_minutes'], services[s['name']])
+             for s in data['services'] if s['name'] in services])
+        await db.executemany(
+            'INSERT INTO services (name, description, price, duration_minutes) VALUES (?,?,?,?)',
+            [(s['name'], s['description'], s['price'], s['duration_minutes'] or 30)
+             for s in data['services'] if s['name'] not in services])
+        counts['services'] = len(data['services'])
+
+        masters = await names('masters')
+        await db.executemany(
+            'UPDATE masters SET bio=COALESCE(?, bio), contact=COALESCE(?, contact) WHERE id=?',
+            [(m['bio'], m['contact'], masters[m['name']]) for m in data['masters'] if m['name'] in masters])
+        await db.executemany(
+            'INSERT INTO masters (name, bio, contact) VALUES (?,?,?)',
+            [(m['name'], m['bio'], m['contact']) for m in data['masters'] if m['name'] not in masters])
+        counts['masters'] = len(data['masters'])
+
+        masters = await names('masters')
+        known_ids = set(masters.values())
+        missing = []
+        for kind in ('schedules', 'exceptions'):
+            for i, row in enumerate(data[kind]):
+                if row['master_id'] is None:
+                    row['master_id'] = masters.get(row['master'])
+                    if row['master_id'] is None:
+                        missing.append(f"{kind}[{i}]: unknown master {row['master']!r}")
+                elif row['master_id'] not in known_ids:
+                    missing.append(f"{kind}[{i}]: unknown master_id {row['master_id']}")
+        # one master_schedule row per (master, weekday), as set_schedule keeps it
+        weekdays = {}
+        for i, row in enumerate(data['schedules']):
+            key = (row['master_id'], row['weekday'])
+            if row['master_id'] is not None and key in weekdays:
+                missing.append(f"schedules[{i}]: duplicate weekday {row['weekday']} for the master "
+                               f"of schedules[{weekdays[key]}]")
+            weekdays.setdefault(key, i)
+        if missing:
+            raise CatalogImportError(missing)
+
+        await db.executemany('DELETE FROM master_schedule WHERE master_id=? AND weekday=?',
+                             [(s['master_id'], s['weekday']) for s in data['schedules']])
+        await db.executemany(
+            'INSERT INTO master_schedule (master_id, weekday, start_time, end_time, slot_interval_minutes) VALUES (?,?,?,?,?)',
+            [(s['master_id'], s['weekday'], s['start_time'], s['end_time'], s['slot_interval_minutes'])
+             for s in data['schedules']])
+        counts['schedules'] = len(data['schedules'])
+        await db.executemany(
+            'INSERT INTO master_exceptions (master_id, date, start_time, end_time, available, note) VALUES (?,?,?,?,?,?) '
+            'ON CONFLICT(master_id, date) DO UPDATE SET start_time=excluded.start_time, end_time=excluded.end_time, '
+            'available=excluded.available, note=excluded.note',
+            [(e['master_id'], e['date'], e['start_time'], e['end_time'], e['available'], e['note'])
+             for e in data['exceptions']])
+        counts['exceptions'] = len(data['exceptions'])
+        return counts
+
+    counts = await run_write(_op, session)
+    catalog.invalidate(session=session)
+    return counts
+
+
+async def export_catalog(session=None) -> dict:
+    """Return the whole catalog as an import_catalog bundle (masters referenced by name)."""
+    bundle = {}
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute('SELECT name, description, price, duration_minutes FROM services ORDER BY id')
+        bundle['services'] = [r._asdict() for r in await cur.fetchall()]
+        cur = await db.execute('SELECT name, bio, contact FROM masters ORDER BY id')
+        bundle['masters'] = [r._asdict() for r in await cur.fetchall()]
+        cur = await db.execute(
+            'SELECT m.name AS master, s.weekday, s.start_time, s.end_time, s.slot_interval_minutes '
+            'FROM master_schedule s JOIN masters m ON m.id = s.master_id ORDER BY m.id, s.weekday')
+        bundle['schedules'] = [r._asdict() for r in await cur.fetchall()]
+        cur = await db.execute(
+            'SELECT m.name AS master, e.date, e.start_time, e.end_time, e.available, e.note '
+            'FROM master_exceptions e JOIN masters m ON m.id = e.master_id ORDER BY m.id, e.date')
+        bundle['exceptions'] = [r._asdict() for r in await cur.fetchall()]
+    return bundle
+
+
 # Manual request CRUD (for cases when no slots available)
 # TODO: FROZEN for MVP demo — manual request flow is secondary for demo
-async def create_manual_request(user_id: int, text: str):
-    async with get_db() as db:
+async def create_manual_request(user_id: int, text: str, session=None):
+    async def _op(db):
         cur = await db.execute('INSERT INTO manual_requests (user_id, text, processed) VALUES (?,?,0)', (user_id, text))
-        await db.commit()
         return cur.lastrowid
+    return await run_write(_op, session)
 
-async def list_manual_requests(limit: int = 100):
-    async with get_db() as db:
+async def list_manual_requests(limit: int = 100, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM manual_requests ORDER BY created_at DESC LIMIT ?', (limit,))
         rows = await cur.fetchall()
         return rows
 
-async def set_manual_request_processed(request_id: int, processed: int = 1):
-    async with get_db() as db:
+async def set_manual_request_processed(request_id: int, processed: int = 1, session=None):
+    async def _op(db):
         await db.execute('UPDATE manual_requests SET processed=? WHERE id=?', (processed, request_id))
-        await db.commit()
+    await run_write(_op, session)
 
 # Reviews CRUD and aggregation
-async def create_review(user_id: int, service_id: int = None, master_id: int = None, rating: int = 5, text: str = None):
-    async with get_db() as db:
-        # Проверяем, есть ли уже отзыв для этой записи (user_id, service_id, master_id)
-        cur = await db.execute('SELECT id FROM reviews WHERE user_id=? AND service_id IS ? AND master_id IS ?', (user_id, service_id, master_id))
+async def create_review(user_id: int, service_id: int = None, master_id: int = None, rating: int = 5, text: str = None,
+                        booking_id: int = None, session=None):
+    """Create or update a review and return its id.
+
+    With `booking_id` this is one upsert on the unique reviews(booking_id)
+    index: rating the same booking again updates its review. Reviews without
+    a booking (the /leave_review command) replace the user's earlier
+    unlinked review of the same service/master. rating_stats is kept in step
+    by triggers on reviews.
+    """
+    async def _op(db):
+        if booking_id is not None:
+            cur = await db.execute(
+                'INSERT INTO reviews (booking_id, user_id, service_id, master_id, rating, text) VALUES (?,?,?,?,?,?) '
+                'ON CONFLICT(booking_id) DO UPDATE SET rating=excluded.rating, text=excluded.text '
+                'RETURNING id',
+                (booking_id, user_id, service_id, master_id, rating, text))
+            return (await cur.fetchone())['id']
+        # Проверяем, есть ли уже отзыв без записи (user_id, service_id, master_id)
+        cur = await db.execute('SELECT id FROM reviews WHERE user_id=? AND booking_id IS NULL AND service_id IS ? AND master_id IS ?', (user_id, service_id, master_id))
         row = await cur.fetchone()
         if row:
             # Обновляем существующий отзыв
             await db.execute('UPDATE reviews SET rating=?, text=? WHERE id=?', (rating, text, row['id']))
-            await db.commit()
             return row['id']
-        else:
-            cur = await db.execute('INSERT INTO reviews (user_id, service_id, master_id, rating, text) VALUES (?,?,?,?,?)', (user_id, service_id, master_id, rating, text))
-            await db.commit()
-            return cur.lastrowid
+        cur = await db.execute('INSERT INTO reviews (user_id, service_id, master_id, rating, text) VALUES (?,?,?,?,?)', (user_id, service_id, master_id, rating, text))
+        return cur.lastrowid
+    return await run_write(_op, session)
+
+async def has_review_for_booking(booking_id: int, session=None) -> bool:
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute('SELECT 1 FROM reviews WHERE booking_id=?', (booking_id,))
+        return await cur.fetchone() is not None
+
+async def backfill_review_bookings(batch: int = 500, session=None) -> int:
+    """Link reviews created before reviews.booking_id existed to a booking.
+
+    Each unlinked review gets the latest completed booking of the same user,
+    service and master that has no review yet. Runs in batches of `batch`
+    reviews per transaction; returns how many reviews were linked.
+    """
+    async def _op(db):
+        cur = await db.execute('SELECT id, user_id, service_id, master_id FROM reviews WHERE booking_id IS NULL AND user_id IS NOT NULL AND id > ? ORDER BY id LIMIT ?', (last_id, batch))
+        rows = await cur.fetchall()
+        linked = 0
+        for r in rows:
+            cur = await db.execute(
+                "SELECT b.id FROM bookings b WHERE b.user_id=? AND b.service_id IS ? AND b.master_id IS ? AND b.status='completed' "
+                "AND NOT EXISTS (SELECT 1 FROM reviews x WHERE x.booking_id = b.id) "
+                "ORDER BY b.date DESC, b.time DESC LIMIT 1",
+                (r['user_id'], r['service_id'], r['master_id']))
+            b = await cur.fetchone()
+            if b:
+                await db.execute('UPDATE reviews SET booking_id=? WHERE id=?', (b['id'], r['id']))
+                linked += 1
+        return (rows[-1]['id'] if rows else None), linked
+
+    total = 0
+    last_id = 0
+    while True:
+        last_id, linked = await run_write(_op, session)
+        if last_id is None:
+            return total
+        total += linked
 
-async def get_review(review_id: int):
-    async with get_db() as db:
+async def get_review(review_id: int, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM reviews WHERE id=?', (review_id,))
         row = await cur.fetchone()
         return row
 
-async def delete_review(review_id: int):
-    async with await get_db() as db:
+async def delete_review(review_id: int, session=None):
+    async def _op(db):
         await db.execute('DELETE FROM reviews WHERE id=?', (review_id,))
-        await db.commit()
-
-async def list_reviews(service_id: int = None, master_id: int = None, limit: int = None):
-    async with get_db() as db:
-        sql = 'SELECT r.*, u.tg_id as user_tg_id FROM reviews r LEFT JOIN users u ON r.user_id = u.id'
-        where = []
-        params = []
-        if service_id is not None:
-            where.append('r.service_id=?')
-            params.append(service_id)
-        if master_id is not None:
-            where.append('r.master_id=?')
-            params.append(master_id)
-        if where:
-            sql += ' WHERE ' + ' AND '.join(where)
-        sql += ' ORDER BY r.created_at DESC'
-        if limit:
-            sql += f' LIMIT {int(limit)}'
-        cur = await db.execute(sql, tuple(params))
+    await run_write(_op, session)
+
+def _reviews_query(service_id: int = None, master_id: int = None, limit: int = None):
+    sql = 'SELECT r.*, u.tg_id as user_tg_id FROM reviews r LEFT JOIN users u ON r.user_id = u.id'
+    where = []
+    params = []
+    if service_id is not None:
+        where.append('r.service_id=?')
+        params.append(service_id)
+    if master_id is not None:
+        where.append('r.master_id=?')
+        params.append(master_id)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY r.created_at DESC'
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return sql, tuple(params)
+
+async def list_reviews(service_id: int = None, master_id: int = None, limit: int = None, session=None):
+    sql, params = _reviews_query(service_id, master_id, limit)
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute(sql, params)
         rows = await cur.fetchall()
         return rows
 
-async def average_rating_for_master(master_id: int):
-    async with get_db() as db:
-        cur = await db.execute('SELECT AVG(rating) as avg, COUNT(*) as cnt FROM reviews WHERE master_id=?', (master_id,))
-        row = await cur.fetchone()
-        return (row['avg'] or 0.0, row['cnt'] or 0)
+async def stream_reviews(filters: dict = None, batch: int = DEFAULT_STREAM_BATCH, session=None):
+    """Yield reviews newest first; `filters` takes service_id, master_id and limit."""
+    sql, params = _reviews_query(**(filters or {}))
+    async with aclosing(stream_rows(sql, params, batch, session)) as rows:
+        async for row in rows:
+            yield row
 
-async def average_rating_for_service(service_id: int):
-    async with get_db() as db:
-        cur = await db.execute('SELECT AVG(rating) as avg, COUNT(*) as cnt FROM reviews WHERE service_id=?', (service_id,))
+async def _average_rating(entity: str, entity_id: int, session=None):
+    # O(1) primary-key lookup in rating_stats instead of AVG over reviews
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute('SELECT rating_sum, rating_count FROM rating_stats WHERE entity=? AND entity_id=?', (entity, entity_id))
         row = await cur.fetchone()
-        return (row['avg'] or 0.0, row['cnt'] or 0)
+    if not row or not row['rating_count']:
+        return (0.0, 0)
+    return (row['rating_sum'] / row['rating_count'], row['rating_count'])
+
+async def average_rating_for_master(master_id: int, session=None):
+    return await _average_rating('master', master_id, session)
+
+async def average_rating_for_service(service_id: int, session=None):
+    return await _average_rating('service', service_id, session)
+
+async def _ratings_for(entity: str, ids, session=None) -> dict:
+    ids = list(dict.fromkeys(i for i in ids if i is not None))
+    if not ids:
+        return {}
+    ratings = {i: (0.0, 0) for i in ids}
+    async with get_db(session, readonly=True) as db:
+        cur = await db.execute(
+            f"SELECT entity_id, rating_sum, rating_count FROM rating_stats WHERE entity=? AND entity_id IN ({','.join('?' * len(ids))})",
+            (entity, *ids))
+        for row in await cur.fetchall():
+            if row['rating_count']:
+                ratings[row['entity_id']] = (row['rating_sum'] / row['rating_count'], row['rating_count'])
+    return ratings
+
+async def ratings_for_services(ids, session=None) -> dict:
+    """Return {service_id: (avg, count)} for `ids` with one query; (0.0, 0) when unrated."""
+    return await _ratings_for('service', ids, session)
+
+async def ratings_for_masters(ids, session=None) -> dict:
+    """Return {master_id: (avg, count)} for `ids` with one query; (0.0, 0) when unrated."""
+    return await _ratings_for('master', ids, session)
+
+async def rebuild_rating_stats(session=None) -> int:
+    """Recompute rating_stats from reviews in one transaction; returns rows written."""
+    async def _op(db):
+        await db.execute('DELETE FROM rating_stats')
+        await db.execute(
+            "INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count) "
+            "SELECT 'service', service_id, SUM(rating), COUNT(*) FROM reviews WHERE service_id IS NOT NULL GROUP BY service_id")
+        await db.execute(
+            "INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count) "
+            "SELECT 'master', master_id, SUM(rating), COUNT(*) FROM reviews WHERE master_id IS NOT NULL GROUP BY master_id")
+        cur = await db.execute('SELECT COUNT(*) AS c FROM rating_stats')
+        return (await cur.fetchone())['c']
+    return await run_write(_op, session)
+
 
+_BOOKINGS_EXPORT_SQL = '''
+SELECT b.id, b.date, b.time, s.name as service, m.name as master, b.name as client_name, b.phone, b.status
+FROM bookings b
+LEFT JOIN services s ON b.service_id = s.id
+LEFT JOIN masters m ON b.master_id = m.id
+ORDER BY b.date DESC, b.time DESC
+'''
 
-async def get_bookings_for_export():
+
+async def stream_bookings_for_export(batch: int = DEFAULT_STREAM_BATCH, session=None):
+    """Yield the rows of get_bookings_for_export without loading them all."""
+    async with aclosing(stream_rows(_BOOKINGS_EXPORT_SQL, (), batch, session)) as rows:
+        async for row in rows:
+            yield row
+
+
+async def get_bookings_for_export(session=None):
     """Return rows for CSV export of bookings with friendly columns.
 
     Columns: id, date, time, service, master, client_name, phone, status
     """
-    async with get_db() as db:
-        sql = '''
-        SELECT b.id, b.date, b.time, s.name as service, m.name as master, b.name as client_name, b.phone, b.status
-        FROM bookings b
-        LEFT JOIN services s ON b.service_id = s.id
-        LEFT JOIN masters m ON b.master_id = m.id
-        ORDER BY b.date DESC, b.time DESC
-        '''
-        cur = await db.execute(sql)
-        rows = await cur.fetchall()
-        return rows
+    return [row async for row in stream_bookings_for_export(session=session)]
 
     # TODO: FROZEN for MVP demo — CSV/analytics export not part of client demo. Keep for future.
 
 
-async def get_reviews_for_export():
+_REVIEWS_EXPORT_SQL = '''
+SELECT r.booking_id as booking_id, r.rating as rating, r.text as comment, r.created_at
+FROM reviews r
+ORDER BY r.created_at DESC
+'''
+
+
+async def stream_reviews_for_export(batch: int = DEFAULT_STREAM_BATCH, session=None):
+    """Yield the rows of get_reviews_for_export without loading them all."""
+    async with aclosing(stream_rows(_REVIEWS_EXPORT_SQL, (), batch, session)) as rows:
+        async for row in rows:
+            yield row
+
+
+async def get_reviews_for_export(session=None):
     """Return rows for CSV export of reviews.
 
     Columns: booking_id, rating, comment, created_at
-    Note: reviews are not linked to bookings in schema; booking_id will be NULL.
+    booking_id is NULL for reviews left without a booking (/leave_review).
     """
-    async with get_db() as db:
-        sql = '''
-        SELECT NULL as booking_id, r.rating as rating, r.text as comment, r.created_at
-        FROM reviews r
-        ORDER BY r.created_at DESC
-        '''
-        cur = await db.execute(sql)
-        rows = await cur.fetchall()
-        return rows
+    return [row async for row in stream_reviews_for_export(session=session)]
 
     # TODO: FROZEN for MVP demo — CSV/analytics export not part of client demo. Keep for future.
\ No newline at end of file
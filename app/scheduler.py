@@ -1,5 +1,8 @@
-from datetime import datetime, timedelta
-from app.db import get_db
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import os
+import time
+from app.db import get_db, run_write, active_session, after_commit, _db_path
 
 def hhmm_to_minutes(t: str) -> int:
     h, m = t.split(':')
@@ -10,14 +13,15 @@ def minutes_to_hhmm(m: int) -> str:
     mm = m % 60
     return f"{h:02d}:{mm:02d}"
 
-async def set_schedule(master_id: int, weekday: int, start_time: str, end_time: str, slot_interval_minutes: int = None):
-    async with get_db() as db:
+async def set_schedule(master_id: int, weekday: int, start_time: str, end_time: str, slot_interval_minutes: int = None, session=None):
+    async def _op(db):
         await db.execute('DELETE FROM master_schedule WHERE master_id=? AND weekday=?', (master_id, weekday))
         await db.execute('INSERT INTO master_schedule (master_id, weekday, start_time, end_time, slot_interval_minutes) VALUES (?,?,?,?,?)', (master_id, weekday, start_time, end_time, slot_interval_minutes))
-        await db.commit()
+    await run_write(_op, session)
+    slot_cache.invalidate(master_id, session=session)
 
-async def add_exception(master_id: int, date_s: str, available: int = 1, start_time: str = None, end_time: str = None, note: str = None):
-    async with get_db() as db:
+async def add_exception(master_id: int, date_s: str, available: int = 1, start_time: str = None, end_time: str = None, note: str = None, session=None):
+    async def _op(db):
         # upsert
         cur = await db.execute('SELECT id FROM master_exceptions WHERE master_id=? AND date=?', (master_id, date_s))
         row = await cur.fetchone()
@@ -25,10 +29,11 @@ async def add_exception(master_id: int, date_s: str, available: int = 1, start_t
             await db.execute('UPDATE master_exceptions SET available=?, start_time=?, end_time=?, note=? WHERE id=?', (available, start_time, end_time, note, row['id']))
         else:
             await db.execute('INSERT INTO master_exceptions (master_id, date, start_time, end_time, available, note) VALUES (?,?,?,?,?,?)', (master_id, date_s, start_time, end_time, available, note))
-        await db.commit()
+    await run_write(_op, session)
+    slot_cache.invalidate(master_id, date_s, session)
 
-async def list_exceptions(master_id: int):
-    async with get_db() as db:
+async def list_exceptions(master_id: int, session=None):
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT * FROM master_exceptions WHERE master_id=? ORDER BY date DESC', (master_id,))
         rows = await cur.fetchall()
         return rows
@@ -40,12 +45,12 @@ DEFAULT_START_TIME = "09:00"
 DEFAULT_END_TIME = "18:00"
 
 
-async def get_master_work_info(master_id: int):
+async def get_master_work_info(master_id: int, session=None):
     """Return (work_days:list[int], start_time:str, end_time:str, slot_interval:int|None)
 
     Prefer explicit entries in master_schedule. If none, fall back to defaults.
     """
-    async with get_db() as db:
+    async with get_db(session, readonly=True) as db:
         cur = await db.execute('SELECT weekday, start_time, end_time, slot_interval_minutes FROM master_schedule WHERE master_id=?', (master_id,))
         rows = await cur.fetchall()
         if rows:
@@ -80,74 +85,642 @@ async def get_master_work_info(master_id: int):
             pass
         return DEFAULT_WORK_DAYS, DEFAULT_START_TIME, DEFAULT_END_TIME, None
 
-async def generate_slots(master_id: int, date_s: str, service_duration: int, buffer_min: int = 0):
-    async with get_db() as db:
-        # check exception
-        cur = await db.execute('SELECT * FROM master_exceptions WHERE master_id=? AND date=?', (master_id, date_s))
-        exc = await cur.fetchone()
-        if exc and exc['available'] == 0:
-            return []
-        if exc and exc['start_time'] and exc['end_time']:
-            start_time, end_time = exc['start_time'], exc['end_time']
+def _day_hours(rows, exc, weekday: int, service_duration: int, buffer_min: int):
+    """Return (start, end, step) of one master's working hours on a day, or None if off.
+
+    `rows` are the master's master_schedule rows (all weekdays, in id order)
+    and `exc` its master_exceptions row for the day. Same precedence as
+    always: exception, then that weekday's schedule row, then the master-wide
+    fallback of get_master_work_info.
+    """
+    default_step = service_duration + buffer_min
+    if exc is not None:
+        if exc['available'] == 0:
+            return None
+        if exc['start_time'] and exc['end_time']:
+            return exc['start_time'], exc['end_time'], default_step
+    for r in rows:
+        if r['weekday'] == weekday:
+            if r['start_time'] and r['end_time']:
+                return r['start_time'], r['end_time'], r['slot_interval_minutes'] or default_step
+            break
+    if not rows:
+        if weekday not in DEFAULT_WORK_DAYS:
+            return None
+        return DEFAULT_START_TIME, DEFAULT_END_TIME, default_step
+    if weekday not in {r['weekday'] for r in rows}:
+        return None
+    starts = [r['start_time'] for r in rows if r['start_time']]
+    ends = [r['end_time'] for r in rows if r['end_time']]
+    ints = [r['slot_interval_minutes'] for r in rows if r['slot_interval_minutes']]
+    return (min(starts) if starts else DEFAULT_START_TIME, max(ends) if ends else DEFAULT_END_TIME,
+            ints[0] if ints else default_step)
+
+
+# Occupancy bitmaps: a master-day is one int whose bit m is set while minute m
+# (0..1439) is taken by a scheduled booking. Fitting a service, finding gaps and
+# applying a booking are then shifts, ANDs and ORs over at most 1440 bits.
+DAY_MINUTES = 24 * 60
+
+
+def interval_mask(start_min: int, end_min: int) -> int:
+    """Bitmap of minutes [start_min, end_min), clipped to the day."""
+    start_min = max(0, start_min)
+    end_min = min(DAY_MINUTES, end_min)
+    if end_min <= start_min:
+        return 0
+    return ((1 << (end_min - start_min)) - 1) << start_min
+
+
+def busy_mask(intervals) -> int:
+    """Bitmap of the union of [start, end) minute intervals."""
+    mask = 0
+    for start, end in intervals:
+        mask |= interval_mask(start, end)
+    return mask
+
+
+def fit_mask(free: int, duration: int) -> int:
+    """Bits m of `free` where minutes m..m+duration-1 are all free.
+
+    Doubles the checked run length each step, so log2(duration) AND/shifts.
+    """
+    fits = free
+    have = 1
+    while have < duration:
+        shift = min(have, duration - have)
+        fits &= fits >> shift
+        have += shift
+    return fits
+
+
+_grid_masks = {}
+
+
+def _grid_mask(start_min: int, step: int, last_min: int) -> int:
+    """Bitmap of start_min, start_min+step, ... up to last_min (memoised; few distinct grids)."""
+    key = (start_min, step, last_min)
+    mask = _grid_masks.get(key)
+    if mask is None:
+        mask = 0
+        for m in range(start_min, last_min + 1, step):
+            mask |= 1 << m
+        if len(_grid_masks) < 1024:
+            _grid_masks[key] = mask
+    return mask
+
+
+def _mask_slots(start_min: int, end_min: int, step: int, duration: int, busy: int, not_before: int = None) -> list:
+    """HH:MM starts on the `step` grid from `start_min` where `duration` free minutes fit before `end_min`."""
+    if step <= 0:
+        step = duration
+    if end_min - start_min < duration:
+        return []
+    fits = fit_mask(interval_mask(start_min, end_min) & ~busy, duration)
+    fits &= _grid_mask(start_min, step, end_min - duration)
+    if not_before is not None:
+        # slots ending at or before not_before are over
+        fits &= ~interval_mask(0, not_before - duration + 1)
+    slots = []
+    while fits:
+        low = fits & -fits
+        slots.append(minutes_to_hhmm(low.bit_length() - 1))
+        fits ^= low
+    return slots
+
+
+def _mask_gaps(start_min: int, end_min: int, busy: int, not_before: int = None) -> list:
+    """Free [start, end) minute runs of [start_min, end_min) not covered by `busy`."""
+    if not_before is not None and not_before > start_min:
+        start_min = not_before
+    free = interval_mask(start_min, end_min) & ~busy
+    gaps = []
+    while free:
+        start = (free & -free).bit_length() - 1
+        run = free >> start
+        length = (~run & (run + 1)).bit_length() - 1  # trailing ones
+        gaps.append((start, start + length))
+        free &= ~interval_mask(start, start + length)
+    return gaps
+
+
+def _merge_intervals(intervals) -> list:
+    """Return [start, end) minute intervals sorted and merged (touching ones joined)."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
         else:
-                wd = datetime.fromisoformat(date_s).weekday()
-                # try to find explicit schedule for that weekday
-                cur = await db.execute('SELECT start_time, end_time, slot_interval_minutes FROM master_schedule WHERE master_id=? AND weekday=?', (master_id, wd))
-                row = await cur.fetchone()
-                if row and row['start_time'] and row['end_time']:
-                    start_time, end_time = row['start_time'], row['end_time']
-                    slot_interval = row['slot_interval_minutes'] if row['slot_interval_minutes'] else (service_duration + buffer_min)
-                else:
-                    # fall back to master-wide work info (defaults for MVP)
-                    try:
-                        from app.scheduler import get_master_work_info
-                        days, start_time, end_time, slot_interval = await get_master_work_info(master_id)
-                        # if slot_interval is None, set it to service_duration+buffer
-                        if not slot_interval:
-                            slot_interval = service_duration + buffer_min
-                        # if weekday is not in master's work days, return empty
-                        if wd not in days:
-                            return []
-                    except Exception:
-                        return []
-        slot_interval = locals().get('slot_interval', service_duration + buffer_min)
-
-        start_min = hhmm_to_minutes(start_time)
-        end_min = hhmm_to_minutes(end_time)
-        step = slot_interval
-        duration = service_duration
-
-        # get existing bookings for that master/date
-        cur = await db.execute('SELECT b.time as time, s.duration_minutes as duration FROM bookings b LEFT JOIN services s ON s.id=b.service_id WHERE b.master_id=? AND b.date=? AND b.status="scheduled"', (master_id, date_s))
-        bookings = await cur.fetchall()
-        booked_intervals = []
-        for b in bookings:
+            merged.append([start, end])
+    return merged
+
+
+def _free_slots(start_min: int, end_min: int, step: int, duration: int, booked_intervals, not_before: int = None):
+    """Return HH:MM starts of `duration`-minute slots every `step` minutes that hit no booking.
+
+    Slots ending at or before `not_before` (minutes, used for today) are skipped.
+    Sweeps the grid and the merged bookings together: a slot that hits a
+    booking jumps to the first grid point past it, so the cost is
+    O(slots + bookings log bookings) rather than slots x bookings. Used for
+    master-days freshly loaded from bookings; days served from `occupancy`
+    already have a bitmap and use _mask_slots (see _day_slots).
+    """
+    if step <= 0:
+        step = duration
+    busy = _merge_intervals(booked_intervals)
+    slots = []
+    cur_start = start_min
+    if not_before is not None and cur_start + duration <= not_before:
+        # first grid point whose slot ends after not_before
+        cur_start += ((not_before - duration - start_min) // step + 1) * step
+    j = 0
+    while cur_start + duration <= end_min:
+        while j < len(busy) and busy[j][1] <= cur_start:
+            j += 1
+        if j < len(busy) and busy[j][0] < cur_start + duration:
+            # overlaps busy[j]: next candidate is the first grid point at or after its end
+            cur_start += -(-(busy[j][1] - cur_start) // step) * step
+            continue
+        slots.append(minutes_to_hhmm(cur_start))
+        cur_start += step
+    return slots
+
+
+def _free_gaps(start_min: int, end_min: int, booked_intervals, not_before: int = None) -> list:
+    """Return the free [start, end) minute intervals of [start_min, end_min) between bookings."""
+    if not_before is not None and not_before > start_min:
+        start_min = not_before
+    gaps = []
+    cur = start_min
+    for b_start, b_end in _merge_intervals(booked_intervals):
+        if b_end <= cur:
+            continue
+        if b_start >= end_min:
+            break
+        if b_start > cur:
+            gaps.append((cur, b_start))
+        cur = b_end
+    if cur < end_min:
+        gaps.append((cur, end_min))
+    return gaps
+
+
+def _day_slots(start_min: int, end_min: int, step: int, duration: int, day, not_before: int = None) -> list:
+    """Free slots of a master-day given as an occupancy bitmap (int) or raw booking intervals."""
+    if isinstance(day, int):
+        return _mask_slots(start_min, end_min, step, duration, day, not_before)
+    return _free_slots(start_min, end_min, step, duration, day, not_before)
+
+
+def _day_gaps(start_min: int, end_min: int, day, not_before: int = None) -> list:
+    """Free gaps of a master-day given as an occupancy bitmap (int) or raw booking intervals."""
+    if isinstance(day, int):
+        return _mask_gaps(start_min, end_min, day, not_before)
+    return _free_gaps(start_min, end_min, day, not_before)
+
+
+async def _master_ids(master_ids, session):
+    if master_ids is None:
+        from app.repo import list_masters
+        master_ids = [m['id'] for m in await list_masters(session=session)]
+    return list(dict.fromkeys(master_ids))
+
+
+async def _load_schedules(db, master_ids) -> dict:
+    """Return {master_id: [master_schedule rows in id order]} with one query."""
+    schedules = {mid: [] for mid in master_ids}
+    sql = 'SELECT master_id, weekday, start_time, end_time, slot_interval_minutes FROM master_schedule'
+    params = ()
+    if len(master_ids) <= 500:
+        # beyond that, reading the (small) schedule table whole is cheaper than a huge IN list
+        sql += f" WHERE master_id IN ({','.join('?' * len(master_ids))})"
+        params = tuple(master_ids)
+    cur = await db.execute(sql + ' ORDER BY id', params)
+    for r in await cur.fetchall():
+        if r['master_id'] in schedules:
+            schedules[r['master_id']].append(r)
+    return schedules
+
+
+async def _load_days(db, wanted, first: str, last: str, service_duration: int, session=None):
+    """Return (exceptions, busy) for dates first..last, keyed by (master_id, date).
+
+    `busy` maps master-days with bookings to their occupancy bitmap when
+    every master-day is in `occupancy`, otherwise to the list of booked
+    [start, end) intervals just read (no bitmap is built for them; see
+    _day_slots). Exceptions take one query; bookings take a second one
+    unless the cache covers the range (see Occupancy for when it is used
+    and filled).
+    """
+    exceptions = {}
+    cur = await db.execute('SELECT * FROM master_exceptions WHERE date BETWEEN ? AND ?', (first, last))
+    for r in await cur.fetchall():
+        if r['master_id'] in wanted:
+            exceptions[(r['master_id'], r['date'])] = r
+    dates = _date_range(first, last)
+    active = active_session(session)
+    busy = occupancy.lookup(wanted, dates) if active is None or active.readonly else None
+    if busy is not None:
+        return exceptions, busy
+    generation = occupancy.generation
+    intervals = {}
+    unknown = set()
+    cur = await db.execute(
+        "SELECT b.id, b.master_id, b.date, b.time, s.duration_minutes AS duration FROM bookings b "
+        "LEFT JOIN services s ON s.id=b.service_id WHERE b.date BETWEEN ? AND ? AND b.status='scheduled'", (first, last))
+    for b in await cur.fetchall():
+        if b['master_id'] in wanted:
+            key = (b['master_id'], b['date'])
+            if b['duration'] is None:
+                # service deleted: the caller's duration stands in, so the day is not cached
+                unknown.add(key)
             b_start = hhmm_to_minutes(b['time'])
-            b_dur = b['duration'] if b['duration'] else service_duration
-            booked_intervals.append((b_start, b_start + b_dur))
-
-        # Filter out past slots if date is today
-        today = datetime.now().date().isoformat()
-        now_min = hhmm_to_minutes(datetime.now().strftime('%H:%M'))
-        
-        slots = []
-        cur_start = start_min
-        while cur_start + duration <= end_min:
-            cand_start = cur_start
-            cand_end = cur_start + duration
-            
-            # Skip past slots if booking is for today
-            if date_s == today and cand_end <= now_min:
-                cur_start += step
-                continue
-            
-            overlap = False
-            for bi_start, bi_end in booked_intervals:
-                if not (cand_end <= bi_start or cand_start >= bi_end):
-                    overlap = True
-                    break
-            if not overlap:
-                slots.append(minutes_to_hhmm(cand_start))
-            cur_start += step
-
-        return slots
+            intervals.setdefault(key, {})[b['id']] = (b_start, b_start + (b['duration'] or service_duration))
+    if active is None:
+        occupancy.store(wanted, dates, intervals, unknown, generation)
+    return exceptions, {key: list(iv.values()) for key, iv in intervals.items()}
+
+
+def _date_range(first: str, last: str) -> list:
+    day = date.fromisoformat(first)
+    end = date.fromisoformat(last)
+    dates = []
+    while day <= end:
+        dates.append(day.isoformat())
+        day += timedelta(days=1)
+    return dates
+
+
+def _slots_on(date_s: str, master_ids, schedules, exceptions, booked, service_duration: int, buffer_min: int, now) -> dict:
+    """Return {master_id: [HH:MM, ...]} for one date from preloaded data (`now=None`: keep past slots)."""
+    weekday = date.fromisoformat(date_s).weekday()
+    not_before = None
+    if now is not None and date_s == now.date().isoformat():
+        not_before = hhmm_to_minutes(now.strftime('%H:%M'))
+    result = {}
+    for mid in master_ids:
+        hours = _day_hours(schedules[mid], exceptions.get((mid, date_s)), weekday, service_duration, buffer_min)
+        if hours is None:
+            result[mid] = []
+            continue
+        start_time, end_time, step = hours
+        result[mid] = _day_slots(hhmm_to_minutes(start_time), hhmm_to_minutes(end_time), step,
+                                 service_duration, booked.get((mid, date_s), 0), not_before)
+    return result
+
+
+# Slot cache: free slots of (master, date, duration, buffer) as computed from
+# the database. Every write that changes a master's slots invalidates them
+# after it commits; SLOT_CACHE_TTL_SECONDS (0 = no TTL) bounds staleness from
+# writers outside this process.
+DEFAULT_SLOT_CACHE_SIZE = 4096
+DEFAULT_SLOT_CACHE_TTL_SECONDS = 60.0
+
+
+class SlotCache:
+    """Bounded LRU of free slot lists keyed by (database path, master, date, duration, buffer).
+
+    Lists are stored without the "not in the past" filter, which is applied
+    on every read, so today's entries stay valid as the clock moves. Like the
+    catalog cache, reads inside a write unit of work bypass it, reads inside a
+    read-only unit use it but never fill it, and a computation that raced with
+    an invalidation is returned but not stored.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._by_day = {}
+        self.generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _size():
+        return max(0, int(os.getenv('SLOT_CACHE_SIZE', DEFAULT_SLOT_CACHE_SIZE)))
+
+    @staticmethod
+    def _ttl():
+        return float(os.getenv('SLOT_CACHE_TTL_SECONDS', DEFAULT_SLOT_CACHE_TTL_SECONDS))
+
+    def get(self, master_id: int, date_s: str, duration: int, buffer_min: int):
+        key = (_db_path(), master_id, date_s, duration, buffer_min)
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or time.monotonic() < entry[1]):
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+        if entry is not None:
+            self._drop(key)
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, master_id: int, date_s: str, duration: int, buffer_min: int, slots: list, generation: int):
+        """Store `slots` unless the cache was invalidated since `generation` was read."""
+        size = self._size()
+        if not size or generation != self.generation:
+            return
+        path = _db_path()
+        key = (path, master_id, date_s, duration, buffer_min)
+        ttl = self._ttl()
+        self._entries[key] = (tuple(slots), time.monotonic() + ttl if ttl > 0 else None)
+        self._entries.move_to_end(key)
+        self._by_day.setdefault((path, master_id, date_s), set()).add(key)
+        self.stats['stores'] += 1
+        while len(self._entries) > size:
+            self._drop(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        day = key[:3]
+        keys = self._by_day.get(day)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_day[day]
+
+    def invalidate(self, master_id: int = None, date_s: str = None, session=None):
+        """Drop one master's day, one master (all dates) or everything, now and once the write commits."""
+        def _drop():
+            self.generation += 1
+            self.stats['invalidations'] += 1
+            if master_id is None:
+                self._entries.clear()
+                self._by_day.clear()
+            elif date_s is not None:
+                for key in list(self._by_day.get((_db_path(), master_id, date_s), ())):
+                    self._drop(key)
+            else:
+                for key in [k for k in self._entries if k[1] == master_id]:
+                    self._drop(key)
+        _drop()
+        active = active_session(session)
+        if active is not None and not active.readonly:
+            # readers outside the unit may refill from the pre-commit state meanwhile
+            after_commit(_drop, active)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_day.clear()
+        self.generation += 1
+
+
+slot_cache = SlotCache()
+
+
+def slot_cache_stats() -> dict:
+    stats = dict(slot_cache.stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['size'] = len(slot_cache._entries)
+    return stats
+
+
+# Occupancy cache: bitmaps of master-days loaded from bookings, kept current by
+# applying each committed booking create/cancel to them instead of reloading.
+# OCCUPANCY_CACHE_TTL_SECONDS (0 = no TTL) bounds staleness from other processes.
+DEFAULT_OCCUPANCY_CACHE_SIZE = 20000
+DEFAULT_OCCUPANCY_CACHE_TTL_SECONDS = 60.0
+
+
+class Occupancy:
+    """Bounded LRU of occupancy bitmaps keyed by (database path, master, date).
+
+    A range load stores every requested master-day, including empty ones, so
+    a later lookup over the same range needs no bookings query. create_booking
+    and set_booking_status call book()/release() once their write commits;
+    the bitmap is updated in place (release rebuilds it from the day's
+    remaining intervals, which may overlap). A day's bitmap is built from
+    its intervals on the first lookup that needs it, so the load that fills
+    the cache does not pay for it. Intervals are keyed by booking
+    id, so applying a booking that a load read after the commit is a no-op
+    rather than a second copy. Loads that raced with an update
+    are not stored; reads in write units bypass the cache and reads in
+    read-only units use it without filling it, as for the other caches.
+    """
+
+    def __init__(self):
+        self._days = OrderedDict()  # key -> [busy or None (not built yet), {booking_id: (start, end)}, expires_at]
+        self.generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'days_loaded': 0, 'updates': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _size():
+        return max(0, int(os.getenv('OCCUPANCY_CACHE_SIZE', DEFAULT_OCCUPANCY_CACHE_SIZE)))
+
+    @staticmethod
+    def _ttl():
+        return float(os.getenv('OCCUPANCY_CACHE_TTL_SECONDS', DEFAULT_OCCUPANCY_CACHE_TTL_SECONDS))
+
+    def lookup(self, master_ids, dates):
+        """Return {(master_id, date): busy} (non-empty days only) if every master-day is cached, else None."""
+        path = _db_path()
+        now = time.monotonic()
+        busy = {}
+        for d in dates:
+            for mid in master_ids:
+                entry = self._days.get((path, mid, d))
+                if entry is None or (entry[2] is not None and now >= entry[2]):
+                    self.stats['misses'] += 1
+                    return None
+                if entry[0] is None:
+                    entry[0] = busy_mask(entry[1].values())
+                if entry[0]:
+                    busy[(mid, d)] = entry[0]
+        for d in dates:
+            for mid in master_ids:
+                self._days.move_to_end((path, mid, d))
+        self.stats['hits'] += 1
+        return busy
+
+    def store(self, master_ids, dates, intervals: dict, unknown, generation: int):
+        """Keep a range load unless an update or invalidation happened since `generation`."""
+        size = self._size()
+        if not size or generation != self.generation or len(master_ids) * len(dates) > size:
+            return
+        path = _db_path()
+        ttl = self._ttl()
+        expires_at = time.monotonic() + ttl if ttl > 0 else None
+        for d in dates:
+            for mid in master_ids:
+                if (mid, d) in unknown:
+                    continue
+                iv = intervals.get((mid, d), {})
+                key = (path, mid, d)
+                self._days[key] = [None if iv else 0, iv, expires_at]
+                self._days.move_to_end(key)
+        self.stats['days_loaded'] += len(master_ids) * len(dates)
+        while len(self._days) > size:
+            self._days.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _apply(self, master_id: int, date_s: str, booking_id: int, start_min: int, end_min: int, booked: bool):
+        self.generation += 1
+        self.stats['updates'] += 1
+        entry = self._days.get((_db_path(), master_id, date_s))
+        if entry is None:
+            return
+        if booked:
+            entry[1][booking_id] = (start_min, end_min)
+            if entry[0] is not None:
+                entry[0] |= interval_mask(start_min, end_min)
+        elif entry[1].pop(booking_id, None) is not None:
+            entry[0] = None
+
+    def book(self, master_id: int, date_s: str, booking_id: int, start_min: int, end_min: int, session=None):
+        """Mark booking_id's [start_min, end_min) of the master-day taken once the caller's write commits."""
+        after_commit(lambda: self._apply(master_id, date_s, booking_id, start_min, end_min, True), session)
+
+    def release(self, master_id: int, date_s: str, booking_id: int, start_min: int, end_min: int, session=None):
+        """Free booking_id's interval once the caller's write commits."""
+        after_commit(lambda: self._apply(master_id, date_s, booking_id, start_min, end_min, False), session)
+
+    def invalidate(self, master_id: int = None, date_s: str = None, session=None):
+        """Drop one master-day, or everything, now and once the write commits."""
+        def _drop():
+            self.generation += 1
+            self.stats['invalidations'] += 1
+            if master_id is None:
+                self._days.clear()
+            else:
+                self._days.pop((_db_path(), master_id, date_s), None)
+        _drop()
+        active = active_session(session)
+        if active is not None and not active.readonly:
+            after_commit(_drop, active)
+
+    def clear(self):
+        self._days.clear()
+        self.generation += 1
+
+
+occupancy = Occupancy()
+
+
+def occupancy_stats() -> dict:
+    stats = dict(occupancy.stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['size'] = len(occupancy._days)
+    return stats
+
+
+async def generate_slots_for_date(date_s: str, service_duration: int, master_ids=None, buffer_min: int = 0, session=None) -> dict:
+    """Return {master_id: [HH:MM, ...]} of free slots on `date_s` for many masters.
+
+    Schedules, exceptions and the day's bookings of all masters are read with
+    three set-based queries, so the cost of a date does not grow with one
+    round of queries per master. `master_ids=None` means every master.
+    Masters whose (date, duration) lists are in `slot_cache` are not queried.
+    """
+    master_ids = await _master_ids(master_ids, session)
+    if not master_ids:
+        return {}
+    now = datetime.now()
+    active = active_session(session)
+    cached = {}
+    if active is None or active.readonly:
+        for mid in master_ids:
+            slots = slot_cache.get(mid, date_s, service_duration, buffer_min)
+            if slots is not None:
+                cached[mid] = slots
+    missing = [mid for mid in master_ids if mid not in cached]
+    if missing:
+        generation = slot_cache.generation
+        async with get_db(session, readonly=True) as db:
+            schedules = await _load_schedules(db, missing)
+            exceptions, booked = await _load_days(db, set(missing), date_s, date_s, service_duration, session)
+        # computed without the past-slot filter so the cached list stays valid all day
+        fresh = _slots_on(date_s, missing, schedules, exceptions, booked, service_duration, buffer_min, None)
+        if active is None:
+            for mid, slots in fresh.items():
+                slot_cache.put(mid, date_s, service_duration, buffer_min, slots, generation)
+        cached.update(fresh)
+    if date_s == now.date().isoformat():
+        # only slots that have not ended yet, as _day_slots does for today
+        not_before = hhmm_to_minutes(now.strftime('%H:%M'))
+        return {mid: [t for t in cached[mid] if hhmm_to_minutes(t) + service_duration > not_before]
+                for mid in master_ids}
+    return {mid: list(cached[mid]) for mid in master_ids}
+
+
+# find_next_available reads exceptions and bookings this many days at a time
+NEXT_AVAILABLE_WINDOW_DAYS = 7
+
+
+async def find_next_available(service_duration: int, limit: int = 5, days: int = 60, master_id: int = None,
+                              start_date: str = None, buffer_min: int = 0, session=None) -> list:
+    """Return the earliest `limit` free slots as (date, time, master_id) tuples.
+
+    Searches `days` days from `start_date` (default today) for `master_id`,
+    or for every master when it is None or 0. Ordered by date, time, then
+    master. Schedules are read once; exceptions and bookings are read
+    NEXT_AVAILABLE_WINDOW_DAYS at a time, and the search stops after the
+    first day that completes the result, so a busy horizon costs a few
+    queries rather than one generate_slots call per master and day.
+    """
+    master_ids = await _master_ids([master_id] if master_id else None, session)
+    if not master_ids or limit <= 0 or days <= 0:
+        return []
+    order = {mid: i for i, mid in enumerate(master_ids)}
+    first = date.fromisoformat(start_date) if start_date else date.today()
+    last = first + timedelta(days=days - 1)
+    now = datetime.now()
+    found = []
+    async with get_db(session, readonly=True) as db:
+        schedules = await _load_schedules(db, master_ids)
+        window_start = first
+        while window_start <= last:
+            window_end = min(last, window_start + timedelta(days=NEXT_AVAILABLE_WINDOW_DAYS - 1))
+            exceptions, booked = await _load_days(db, set(master_ids), window_start.isoformat(),
+                                                  window_end.isoformat(), service_duration, session)
+            day = window_start
+            while day <= window_end:
+                date_s = day.isoformat()
+                by_master = _slots_on(date_s, master_ids, schedules, exceptions, booked, service_duration, buffer_min, now)
+                found.extend(sorted(((date_s, t, mid) for mid, slots in by_master.items() for t in slots),
+                                    key=lambda x: (x[1], order[x[2]])))
+                if len(found) >= limit:
+                    return found[:limit]
+                day += timedelta(days=1)
+            window_start = window_end + timedelta(days=1)
+    return found
+
+
+async def free_gaps_for_date(date_s: str, service_duration: int = 30, master_ids=None, session=None) -> dict:
+    """Return {master_id: [(HH:MM, HH:MM), ...]} free intervals of working hours on `date_s`.
+
+    Uses the same three queries and hours precedence as generate_slots_for_date;
+    `service_duration` only stands in for bookings whose service was deleted.
+    Today's gaps start no earlier than now.
+    """
+    master_ids = await _master_ids(master_ids, session)
+    if not master_ids:
+        return {}
+    async with get_db(session, readonly=True) as db:
+        schedules = await _load_schedules(db, master_ids)
+        exceptions, booked = await _load_days(db, set(master_ids), date_s, date_s, service_duration, session)
+    now = datetime.now()
+    not_before = hhmm_to_minutes(now.strftime('%H:%M')) if date_s == now.date().isoformat() else None
+    weekday = date.fromisoformat(date_s).weekday()
+    result = {}
+    for mid in master_ids:
+        hours = _day_hours(schedules[mid], exceptions.get((mid, date_s)), weekday, service_duration, 0)
+        if hours is None:
+            result[mid] = []
+            continue
+        gaps = _day_gaps(hhmm_to_minutes(hours[0]), hhmm_to_minutes(hours[1]), booked.get((mid, date_s), 0), not_before)
+        result[mid] = [(minutes_to_hhmm(a), minutes_to_hhmm(b)) for a, b in gaps]
+    return result
+
+
+async def free_gaps(master_id: int, date_s: str, service_duration: int = 30, session=None) -> list:
+    """Return free (HH:MM, HH:MM) intervals of one master on `date_s` (see free_gaps_for_date)."""
+    gaps = await free_gaps_for_date(date_s, service_duration, [master_id], session)
+    return gaps[master_id]
+
+
+async def generate_slots(master_id: int, date_s: str, service_duration: int, buffer_min: int = 0, session=None):
+    """Return free HH:MM slots of one master on `date_s` (see generate_slots_for_date)."""
+    slots = await generate_slots_for_date(date_s, service_duration, [master_id], buffer_min, session)
+    return slots[master_id]
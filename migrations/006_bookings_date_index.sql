@@ -0,0 +1,2 @@
+-- Keyset pagination over bookings orders by (date, time, id)
+CREATE INDEX IF NOT EXISTS idx_bookings_date_time ON bookings(date, time);
@@ -0,0 +1,2 @@
+-- Per-user booking screens filter by user and status and order by date
+CREATE INDEX IF NOT EXISTS idx_bookings_user_status_date ON bookings(user_id, status, date);
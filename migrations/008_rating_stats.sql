@@ -0,0 +1,14 @@
+-- Per-service and per-master rating totals, kept in step with reviews by app/repo.py
+CREATE TABLE IF NOT EXISTS rating_stats (
+  entity TEXT NOT NULL,
+  entity_id INTEGER NOT NULL,
+  rating_sum INTEGER NOT NULL DEFAULT 0,
+  rating_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (entity, entity_id)
+) WITHOUT ROWID;
+
+INSERT OR REPLACE INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+SELECT 'service', service_id, SUM(rating), COUNT(*) FROM reviews WHERE service_id IS NOT NULL GROUP BY service_id;
+
+INSERT OR REPLACE INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+SELECT 'master', master_id, SUM(rating), COUNT(*) FROM reviews WHERE master_id IS NOT NULL GROUP BY master_id;
@@ -0,0 +1,36 @@
+-- Link reviews to the booking they rate; one review per booking
+ALTER TABLE reviews ADD COLUMN booking_id INTEGER REFERENCES bookings(id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_booking ON reviews(booking_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews(user_id);
+
+-- rating_stats now follows reviews through triggers, so single-statement
+-- upserts (which cannot report the previous rating) keep it exact. This
+-- supersedes the header of 008_rating_stats.sql: app/repo.py no longer
+-- maintains the table, these triggers do (rebuild_rating_stats only resyncs).
+CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_insert AFTER INSERT ON reviews
+BEGIN
+  INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+    SELECT 'service', NEW.service_id, NEW.rating, 1 WHERE NEW.service_id IS NOT NULL
+    ON CONFLICT(entity, entity_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, rating_count = rating_count + 1;
+  INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+    SELECT 'master', NEW.master_id, NEW.rating, 1 WHERE NEW.master_id IS NOT NULL
+    ON CONFLICT(entity, entity_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, rating_count = rating_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_delete AFTER DELETE ON reviews
+BEGIN
+  UPDATE rating_stats SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+    WHERE (entity = 'service' AND entity_id = OLD.service_id) OR (entity = 'master' AND entity_id = OLD.master_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_update AFTER UPDATE OF rating, service_id, master_id ON reviews
+BEGIN
+  UPDATE rating_stats SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+    WHERE (entity = 'service' AND entity_id = OLD.service_id) OR (entity = 'master' AND entity_id = OLD.master_id);
+  INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+    SELECT 'service', NEW.service_id, NEW.rating, 1 WHERE NEW.service_id IS NOT NULL
+    ON CONFLICT(entity, entity_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, rating_count = rating_count + 1;
+  INSERT INTO rating_stats (entity, entity_id, rating_sum, rating_count)
+    SELECT 'master', NEW.master_id, NEW.rating, 1 WHERE NEW.master_id IS NOT NULL
+    ON CONFLICT(entity, entity_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, rating_count = rating_count + 1;
+END;
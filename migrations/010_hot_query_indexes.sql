@@ -0,0 +1,15 @@
+-- Index set for the remaining hot queries (checked by tests/test_query_plans.py).
+-- Already covered elsewhere: create_booking's active-booking check uses
+-- idx_bookings_user_status_date (007), generate_slots' master/date lookup uses
+-- idx_bookings_unique_slot (003), rating averages read rating_stats by key (008).
+
+-- /list_reviews, newest first, unfiltered or per master / per service
+CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews(created_at);
+CREATE INDEX IF NOT EXISTS idx_reviews_master_created ON reviews(master_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_reviews_service_created ON reviews(service_id, created_at);
+
+-- list_manual_requests, newest first
+CREATE INDEX IF NOT EXISTS idx_manual_requests_created ON manual_requests(created_at);
+
+-- generate_slots reads one weekday row per call; set_schedule replaces it
+CREATE INDEX IF NOT EXISTS idx_master_schedule_master_weekday ON master_schedule(master_id, weekday);
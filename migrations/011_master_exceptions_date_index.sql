@@ -0,0 +1,2 @@
+-- Date-wide availability (generate_slots_for_date) reads every master's exception for one date
+CREATE INDEX IF NOT EXISTS idx_master_exceptions_date ON master_exceptions(date);
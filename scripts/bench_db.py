@@ -0,0 +1,84 @@
+"""Compare DB_PROFILE settings under concurrent bookings and reads.
+
+Usage: python scripts/bench_db.py [--bookings 300] [--reads 2000]
+
+Each profile runs against a fresh temporary database. `baseline` is SQLite's
+own defaults (rollback journal, synchronous=FULL) for comparison.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db import init_db, close_db, DB_PROFILES
+from app.repo import create_master, create_service, get_or_create_user, create_booking, list_services, get_service, SlotTaken, DoubleBooking
+from app.scheduler import generate_slots
+
+DB_PROFILES.setdefault('baseline', {'busy_timeout': 5000, 'journal_mode': 'DELETE', 'synchronous': 'FULL'})
+
+
+async def _seed(n_users: int):
+    masters = [await create_master(f'M{i}') for i in range(5)]
+    sid = await create_service('Bench', 'desc', 10.0, 30)
+    users = [await get_or_create_user(10_000_000 + i, f'U{i}', '+37060000000') for i in range(n_users)]
+    return masters, sid, users
+
+
+async def _run_profile(profile: str, n_bookings: int, n_reads: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        os.environ['DB_PROFILE'] = profile
+        await close_db()
+        await init_db()
+        masters, sid, users = await _seed(n_bookings)
+        day = (date.today() + timedelta(days=1)).isoformat()
+
+        async def book(i, user):
+            mid = masters[i % len(masters)]
+            minute = (i // len(masters)) * 5
+            t = f"{8 + minute // 60:02d}:{minute % 60:02d}"
+            try:
+                await create_booking(user['id'], sid, mid, day, t, user['name'], user['phone'])
+            except (SlotTaken, DoubleBooking):
+                pass
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(book(i, u) for i, u in enumerate(users)))
+        t_write = time.perf_counter() - t0
+
+        async def read(i):
+            if i % 3 == 0:
+                await list_services()
+            elif i % 3 == 1:
+                await get_service(sid)
+            else:
+                await generate_slots(masters[i % len(masters)], day, 30)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(read(i) for i in range(n_reads)))
+        t_read = time.perf_counter() - t0
+        await close_db()
+        return t_write, t_read
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=300)
+    parser.add_argument('--reads', type=int, default=2000)
+    parser.add_argument('--profiles', default='baseline,durable,throughput,test')
+    args = parser.parse_args()
+
+    print(f"{'profile':<12}{'bookings/s':>14}{'reads/s':>14}")
+    for profile in args.profiles.split(','):
+        t_write, t_read = await _run_profile(profile, args.bookings, args.reads)
+        print(f"{profile:<12}{args.bookings / t_write:>14.0f}{args.reads / t_read:>14.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Micro-benchmark of slot fitting: pairwise check, interval sweep and occupancy bitmaps.
+
+Usage: python scripts/bench_slots.py [--days 2000] [--bookings 120]
+
+Each synthetic day is a long working day (06:00-24:00) on a 5-minute grid
+with dense, partly overlapping bookings. Every implementation must return the
+same slots (and gaps); the script prints days/s for each and the speed-up over
+the pairwise loop. `sweep` is _free_slots on raw intervals, which is what
+generate_slots_for_date and find_next_available use for days just read from
+the database; `bitmap` builds the day's occupancy bitmap from the intervals
+first (shown for comparison); `cached bitmap` starts from a prebuilt one, as
+when the occupancy cache is warm.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.scheduler import (_free_slots, _free_gaps, _mask_slots, _mask_gaps, busy_mask, minutes_to_hhmm,
+                           hhmm_to_minutes)
+
+
+def pairwise_free_slots(start_min, end_min, step, duration, booked_intervals, not_before=None):
+    """The previous generate_slots loop: every candidate against every booking, via HH:MM strings."""
+    slots = []
+    cur_start = start_min
+    while cur_start + duration <= end_min:
+        cand_start = hhmm_to_minutes(minutes_to_hhmm(cur_start))
+        cand_end = cand_start + duration
+        if not_before is not None and cand_end <= not_before:
+            cur_start += step
+            continue
+        overlap = False
+        for bi_start, bi_end in booked_intervals:
+            if not (cand_end <= bi_start or cand_start >= bi_end):
+                overlap = True
+                break
+        if not overlap:
+            slots.append(minutes_to_hhmm(cand_start))
+        cur_start += step
+    return slots
+
+
+def make_days(n_days: int, n_bookings: int, seed: int = 24):
+    rnd = random.Random(seed)
+    days = []
+    for _ in range(n_days):
+        booked = []
+        for _ in range(n_bookings):
+            b = rnd.randrange(6 * 60, 24 * 60, 5)
+            booked.append((b, b + rnd.choice([5, 10, 15, 30])))
+        days.append(booked)
+    return days
+
+
+def _time(fn, days, duration):
+    t0 = time.perf_counter()
+    out = [fn(6 * 60, 24 * 60, 5, duration, booked) for booked in days]
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=120)
+    parser.add_argument('--duration', type=int, default=15)
+    args = parser.parse_args()
+
+    days = make_days(args.days, args.bookings)
+    t_old, old = _time(pairwise_free_slots, days, args.duration)
+    t_sweep, sweep = _time(_free_slots, days, args.duration)
+    t_bitmap, bitmap = _time(lambda s, e, st, d, booked: _mask_slots(s, e, st, d, busy_mask(booked)), days, args.duration)
+    masks = [busy_mask(booked) for booked in days]
+    t0 = time.perf_counter()
+    cached = [_mask_slots(6 * 60, 24 * 60, 5, args.duration, busy) for busy in masks]
+    t_cached = time.perf_counter() - t0
+    assert old == sweep == bitmap == cached, 'implementations disagree'
+
+    t0 = time.perf_counter()
+    gaps = [_free_gaps(6 * 60, 24 * 60, booked) for booked in days]
+    t_gaps = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    mask_gaps = [_mask_gaps(6 * 60, 24 * 60, busy) for busy in masks]
+    t_mask_gaps = time.perf_counter() - t0
+    assert gaps == mask_gaps, 'gap implementations disagree'
+
+    print(f"{args.days} days, 06:00-24:00 every 5 min, {args.bookings} bookings/day, {args.duration}-min service")
+    print(f"{'pairwise':<16}{args.days / t_old:>12.0f} days/s")
+    for name, t in (('sweep', t_sweep), ('bitmap', t_bitmap), ('cached bitmap', t_cached)):
+        print(f"{name:<16}{args.days / t:>12.0f} days/s  ({t_old / t:.1f}x)")
+    print(f"{'gaps sweep':<16}{args.days / t_gaps:>12.0f} days/s")
+    print(f"{'gaps bitmap':<16}{args.days / t_mask_gaps:>12.0f} days/s  (prebuilt bitmaps)")
+
+
+if __name__ == '__main__':
+    main()
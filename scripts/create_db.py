@@ -1,6 +1,92 @@
-from app.db import init_db
+import argparse
 import asyncio
+import sys
+from pathlib import Path
 
-if __name__ == '__main__':
-    asyncio.run(init_db())
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiosqlite
+from app.db import init_db, close_db, MIGRATIONS_DIR, _db_path
+from app import migrations
+
+
+async def _connect_readonly():
+    """Open the database read-only, bypassing get_db's PRAGMA profile; None if it does not exist."""
+    path = Path(_db_path())
+    if not path.exists():
+        print(f'Database {path} does not exist yet; run without flags to create it')
+        return None
+    # as_uri() percent-escapes '?', '#' and '%' in the path, which a raw file: URI would misread
+    return await aiosqlite.connect(path.resolve().as_uri() + '?mode=ro', uri=True)
+
+
+async def show_status():
+    files = migrations.discover(MIGRATIONS_DIR)
+    db = await _connect_readonly()
+    if db is None:
+        return
+    try:
+        rows = await migrations.status(db, files)
+        applied = await migrations.applied_versions(db)
+    finally:
+        await db.close()
+    for m, state in rows:
+        when = applied.get(m.version, (None, None, ''))[2] or ''
+        print(f"{m.version:>4}  {state:<9} {m.path.name:<40} {when}")
+
+
+async def dry_run():
+    files = migrations.discover(MIGRATIONS_DIR)
+    db = await _connect_readonly()
+    if db is None:
+        return
+    try:
+        todo = await migrations.pending(db, files)
+    finally:
+        await db.close()
+    if not todo:
+        print('Schema is up to date, nothing to apply')
+    for m in todo:
+        print(f"-- would apply {m.path.name}")
+        for stmt in migrations.split_statements(m.path.read_text(encoding='utf-8')):
+            print(stmt + ';')
+
+
+async def rebuild_ratings():
+    from app.repo import rebuild_rating_stats
+    count = await rebuild_rating_stats()
+    await close_db()
+    print(f'rating_stats rebuilt: {count} rows')
+
+
+async def backfill_reviews():
+    from app.repo import backfill_review_bookings
+    count = await backfill_review_bookings()
+    await close_db()
+    print(f'reviews linked to bookings: {count}')
+
+
+async def apply():
+    await init_db()
+    await close_db()
     print('DB initialized')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create or migrate the bot database')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--status', action='store_true', help='list migrations and whether they are applied')
+    mode.add_argument('--dry-run', action='store_true', help='print pending migrations without applying them')
+    mode.add_argument('--rebuild-ratings', action='store_true', help='recompute rating_stats from reviews')
+    mode.add_argument('--backfill-reviews', action='store_true', help='link reviews without booking_id to their bookings')
+    args = parser.parse_args()
+    if args.status:
+        asyncio.run(show_status())
+    elif args.dry_run:
+        asyncio.run(dry_run())
+    elif args.rebuild_ratings:
+        asyncio.run(rebuild_ratings())
+    elif args.backfill_reviews:
+        asyncio.run(backfill_reviews())
+    else:
+        asyncio.run(apply())
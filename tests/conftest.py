@@ -2,6 +2,7 @@ import os
 import tempfile
 import pytest
 import asyncio
+import aiosqlite
 from app.db import init_db
 
 @pytest.fixture()
@@ -12,3 +13,39 @@ def temp_db(tmp_path, monkeypatch):
     # init db
     asyncio.run(init_db())
     return str(db_file)
+
+
+class StatementLog:
+    """SQL text of every execute/executemany on an aiosqlite connection, in order."""
+
+    def __init__(self):
+        self.sql = []
+
+    def clear(self):
+        self.sql.clear()
+
+    def starting_with(self, *verbs):
+        return [s for s in self.sql if s.lstrip().upper().startswith(verbs)]
+
+    def selects(self):
+        return self.starting_with('SELECT')
+
+    def dml(self):
+        return self.starting_with('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+    def containing(self, *fragments):
+        return [s for s in self.sql if all(f in s for f in fragments)]
+
+
+@pytest.fixture()
+def sql_log(monkeypatch):
+    """Record the statements the test runs; call `sql_log.clear()` where counting should start."""
+    log = StatementLog()
+    for name in ('execute', 'executemany'):
+        orig = getattr(aiosqlite.Connection, name)
+
+        def recording(self, sql, *args, _orig=orig):
+            log.sql.append(sql)
+            return _orig(self, sql, *args)
+        monkeypatch.setattr(aiosqlite.Connection, name, recording)
+    return log
@@ -127,3 +127,69 @@ def test_admin_export_sends_csv(temp_db):
         text = sent['data'].decode('utf-8') if isinstance(sent['data'], (bytes, bytearray)) else str(sent['data'])
         assert 'date' in text and 'service_id' in text
     __import__('asyncio').run(_run())
+
+
+def test_admin_list_bookings_keyset_pages(temp_db):
+    async def _run():
+        admin_handlers.ADMIN_IDS = [ADMIN_ID]
+        mid = await create_master('Pager', 'bio', 'contact')
+        other = await create_master('Other', 'bio', 'contact')
+        sid = await create_service('S', 'desc', 5.0, 10)
+        user = await get_or_create_user(999000111, 'P', '+37060000011')
+        # past dates: not counted as active bookings
+        for i in range(23):
+            await create_booking(user['id'], sid, mid, f'2025-01-{i // 3 + 10:02d}', f'{9 + i % 3:02d}:00', 'P', user['phone'])
+        await create_booking(user['id'], sid, other, '2025-01-11', '12:00', 'P', user['phone'])
+
+        msg = FakeMessage(ADMIN_ID, ADMIN_ID, args=f'2025-01-01|2025-01-31|scheduled|{mid}')
+        await admin_handlers.cmd_list_bookings(msg)
+        first = msg.replies[-1]
+        assert first['text'].count('ID: ') == admin_handlers.BOOKINGS_PAGE_SIZE
+        assert 'Мастер: Other' not in first['text']
+        assert len(first['text']) < 4096
+
+        class CB:
+            def __init__(self, data):
+                self.data = data
+                self.from_user = SimpleNamespace(id=ADMIN_ID)
+                self.message = self
+                self.edited = None
+            async def edit_text(self, text, reply_markup=None):
+                self.edited = (text, reply_markup)
+            async def answer(self, *args, **kwargs):
+                pass
+
+        def buttons(kb):
+            return {b.text: b.callback_data for b in kb.inline_keyboard[0]} if kb else {}
+
+        kb = first['reply_markup']
+        pages = [first['text']]
+        while '➡️ Далее' in buttons(kb):
+            data = buttons(kb)['➡️ Далее']
+            assert len(data.encode()) <= 64
+            cb = CB(data)
+            await admin_handlers.cb_list_bookings_page(cb)
+            text, kb = cb.edited
+            pages.append(text)
+        assert [p.count('ID: ') for p in pages] == [10, 10, 3]
+        ids = [line for p in pages for line in p.splitlines() if line.startswith('ID: ')]
+        assert len(set(ids)) == 23
+        # back from the last page returns the middle page
+        cb = CB(buttons(kb)['⬅️ Назад'])
+        await admin_handlers.cb_list_bookings_page(cb)
+        assert cb.edited[0] == pages[1]
+    __import__('asyncio').run(_run())
+
+
+def test_admin_list_bookings_rejects_malformed_dates(temp_db):
+    async def _run():
+        admin_handlers.ADMIN_IDS = [ADMIN_ID]
+        for args in ('2025-13-01|', '|2025/01/31', 'yesterday|2025-01-31', '2025-01-01|2025-02-30'):
+            msg = FakeMessage(ADMIN_ID, ADMIN_ID, args=args)
+            await admin_handlers.cmd_list_bookings(msg)
+            assert msg.replies[-1]['text'].startswith('Неверная дата')
+        # single-digit parts are accepted and normalized for the cursor
+        msg = FakeMessage(ADMIN_ID, ADMIN_ID, args='2025-1-1|2025-1-31')
+        await admin_handlers.cmd_list_bookings(msg)
+        assert msg.replies[-1]['text'] == 'Записей нет'
+    __import__('asyncio').run(_run())
@@ -50,7 +50,7 @@ class TestGracePeriodCalculation:
         sid = await create_service('TestService', 'desc', 100.0, service_duration)
         mid = await create_master('TestMaster', 'bio', 'contact')
         user = await get_or_create_user(999, name='TestUser', phone='+7999999999')
-        bid = await create_booking(user['id'], sid, mid, date_s, time_s, 'TestUser', '+7999999999')
+        bid = (await create_booking(user['id'], sid, mid, date_s, time_s, 'TestUser', '+7999999999'))['id']
         
         # Schedule
         schedule_auto_complete(bid, date_s, time_s, service_duration)
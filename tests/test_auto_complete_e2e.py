@@ -101,7 +101,7 @@ class TestAutoCompleteE2E:
         sid = await create_service('CancelService', 'desc', 70.0, 1)
         mid = await create_master('CancelMaster', 'bio', 'contact')
         user = await get_or_create_user(3002, name='CancelUser', phone='+73002000000')
-        bid = await create_booking(user['id'], sid, mid, date_s, time_s, 'CancelUser', '+73002000000')
+        bid = (await create_booking(user['id'], sid, mid, date_s, time_s, 'CancelUser', '+73002000000'))['id']
         
         # Schedule auto-completion
         schedule_auto_complete(bid, date_s, time_s, 1)
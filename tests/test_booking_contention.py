@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import pytest
+from app.db import close_db, writer_stats, WriteLockTimeout
+from app.repo import create_service, create_master, create_booking, booking_stats, list_bookings, SlotTaken
+
+
+def _seed_users(db_file, count):
+    con = sqlite3.connect(db_file)
+    with con:
+        con.executemany('INSERT INTO users (tg_id, name, phone) VALUES (?,?,?)',
+                        [(20000 + i, f'U{i}', f'+3706{i:07d}') for i in range(count)])
+        ids = [r[0] for r in con.execute('SELECT id FROM users ORDER BY id')]
+    con.close()
+    return ids
+
+
+def test_hundreds_of_parallel_bookings_for_one_slot(temp_db):
+    async def _run():
+        await close_db()
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        mid = await create_master('Anna')
+        users = _seed_users(temp_db, 300)
+        before = booking_stats()
+        results = await asyncio.gather(
+            *(create_booking(u, sid, mid, '2031-05-05', '10:00', 'U', '+370') for u in users),
+            return_exceptions=True)
+        won = [r for r in results if not isinstance(r, BaseException)]
+        lost = [r for r in results if isinstance(r, BaseException)]
+        assert len(won) == 1
+        assert len(lost) == 299 and all(isinstance(e, SlotTaken) for e in lost)
+        after = booking_stats()
+        assert after['attempts'] - before['attempts'] == 300
+        assert after['created'] - before['created'] == 1
+        assert after['slot_taken'] - before['slot_taken'] == 299
+        assert after['lock_timeouts'] == before['lock_timeouts']
+        assert len(await list_bookings()) == 1
+        # the writer grouped the jobs instead of taking the lock 300 times
+        assert writer_stats()['batches'] < 300
+        await close_db()
+    asyncio.run(_run())
+
+
+def _hold_write_lock(db_file):
+    con = sqlite3.connect(db_file, isolation_level=None)
+    con.execute('BEGIN IMMEDIATE')
+    return con
+
+
+def test_lock_timeout_is_not_reported_as_slot_taken(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_WRITER_LOCK_TIMEOUT_MS', '200')
+
+    async def _run():
+        await close_db()
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        mid = await create_master('Anna')
+        (user,) = _seed_users(temp_db, 1)
+        ticks = 0
+        before = booking_stats()
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        t = asyncio.create_task(ticker())
+        holder = _hold_write_lock(temp_db)
+        try:
+            with pytest.raises(WriteLockTimeout):
+                await create_booking(user, sid, mid, '2031-05-05', '10:00', 'U', '+370')
+        finally:
+            holder.execute('ROLLBACK')
+            holder.close()
+            t.cancel()
+        # the event loop kept running while the writer waited
+        assert ticks > 1
+        after = booking_stats()
+        assert after['lock_timeouts'] - before['lock_timeouts'] == 1
+        assert after['slot_taken'] == before['slot_taken']
+        # it gave up after backing off several times, not on the first failed BEGIN
+        stats = writer_stats()
+        assert stats['lock_waits'] == 1 and stats['lock_timeouts'] == 1 and stats['lock_retries'] > 1
+        # the slot is still free once the lock is gone
+        assert (await create_booking(user, sid, mid, '2031-05-05', '10:00', 'U', '+370'))['time'] == '10:00'
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_writer_backs_off_until_lock_is_released(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_WRITER_LOCK_TIMEOUT_MS', '5000')
+
+    async def _run():
+        await close_db()
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        mid = await create_master('Anna')
+        (user,) = _seed_users(temp_db, 1)
+        holder = _hold_write_lock(temp_db)
+        pending = asyncio.create_task(create_booking(user, sid, mid, '2031-05-05', '11:00', 'U', '+370'))
+        await asyncio.sleep(0.1)
+        assert not pending.done()
+        holder.execute('ROLLBACK')
+        holder.close()
+        booking = await asyncio.wait_for(pending, timeout=5)
+        assert booking['time'] == '11:00'
+        stats = writer_stats()
+        assert stats['lock_waits'] == 1 and stats['lock_timeouts'] == 0 and stats['max_lock_wait_ms'] >= 100
+        await close_db()
+    asyncio.run(_run())
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+from app.db import close_db, unit_of_work
+from app.repo import (catalog, catalog_stats, create_service, update_service, delete_service, get_service,
+                      list_services, create_master, update_master, delete_master, get_master, list_masters)
+
+
+def test_steady_state_reads_hit_memory(temp_db):
+    async def _run():
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        mid = await create_master('Anna')
+        await list_services()
+        await list_masters()
+        loads = catalog_stats()['loads']
+        hits = catalog_stats()['hits']
+        for _ in range(20):
+            assert (await get_service(sid))['name'] == 'Cut'
+            assert (await get_master(mid))['name'] == 'Anna'
+            assert len(await list_services()) == 1
+        assert catalog_stats()['loads'] == loads
+        assert catalog_stats()['hits'] == hits + 60
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_admin_writes_invalidate(temp_db):
+    async def _run():
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        mid = await create_master('Anna')
+        assert (await get_service(sid))['price'] == 10.0
+        await update_service(sid, price=12.5)
+        assert (await get_service(sid))['price'] == 12.5
+        await update_master(mid, name='Anna K')
+        assert (await get_master(mid))['name'] == 'Anna K'
+        await delete_service(sid)
+        await delete_master(mid)
+        assert await get_service(sid) is None
+        assert await list_masters() == []
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_unit_of_work_reads_own_writes_and_rollback_leaves_cache_clean(temp_db):
+    async def _run():
+        await close_db()
+        await create_master('Anna')
+        assert len(await list_masters()) == 1
+        with pytest.raises(RuntimeError):
+            async with unit_of_work() as uow:
+                await create_master('Ghost', session=uow)
+                # the unit sees its own write even though the cache was warm
+                assert len(await list_masters(session=uow)) == 2
+                raise RuntimeError('abort')
+        assert [m['name'] for m in await list_masters()] == ['Anna']
+        async with unit_of_work() as uow:
+            await create_master('Boris', session=uow)
+        assert len(await list_masters()) == 2
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_load_racing_an_invalidation_is_not_kept(temp_db):
+    async def _run():
+        await create_master('Anna')
+        version = catalog_stats()['versions']['masters']
+        catalog.invalidate('masters')
+        catalog.invalidate('masters')
+        assert catalog_stats()['versions']['masters'] == version + 2
+        orig = catalog._load
+
+        async def slow_load(table, session=None):
+            rows = await orig(table, session)
+            # an admin edit lands while the old rows are in flight
+            catalog.invalidate(table)
+            return rows
+        catalog._load = slow_load
+        try:
+            await list_masters()
+        finally:
+            catalog._load = orig
+        loads = catalog_stats()['loads']
+        await list_masters()
+        assert catalog_stats()['loads'] == loads + 1
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_ttl_expires_entries(temp_db, monkeypatch):
+    monkeypatch.setenv('CATALOG_TTL_SECONDS', '0.05')
+    async def _run():
+        await create_master('Anna')
+        await list_masters()
+        loads = catalog_stats()['loads']
+        await list_masters()
+        assert catalog_stats()['loads'] == loads
+        time.sleep(0.06)
+        await list_masters()
+        assert catalog_stats()['loads'] == loads + 1
+        await close_db()
+    asyncio.run(_run())
@@ -0,0 +1,176 @@
+import asyncio
+import importlib
+import json
+from types import SimpleNamespace
+import aiogram
+import pytest
+from app.db import close_db
+from app.export import catalog_bundle_csv_bytes, parse_catalog_bundle
+from app.repo import (import_catalog, export_catalog, CatalogImportError, create_master, list_services, list_masters,
+                      list_exceptions)
+from app.scheduler import generate_slots
+
+_orig = getattr(aiogram.Router, 'message', None)
+aiogram.Router.message = lambda *a, **k: (lambda f: f)
+admin_handlers = importlib.reload(importlib.import_module('app.handlers.admin'))
+if _orig is not None:
+    aiogram.Router.message = _orig
+
+ADMIN_ID = 424242
+
+BUNDLE = {
+    'services': [{'name': 'Cut', 'price': 15, 'duration_minutes': 30, 'description': 'short'},
+                 {'name': 'Color', 'price': '40.5', 'duration_minutes': '60'}],
+    'masters': [{'name': 'Anna', 'bio': 'senior'}, {'name': 'Boris'}],
+    'schedules': [{'master': 'Anna', 'weekday': 0, 'start_time': '09:00', 'end_time': '12:00', 'slot_interval_minutes': 30},
+                  {'master': 'Boris', 'weekday': '1', 'start_time': '10:00', 'end_time': '18:00'}],
+    'exceptions': [{'master': 'Anna', 'date': '2031-01-13', 'note': 'vacation'},
+                   {'master': 'Boris', 'date': '2031-01-14', 'start_time': '12:00', 'end_time': '14:00'}],
+}
+
+
+def test_import_applies_bundle_and_round_trips(temp_db):
+    async def _run():
+        counts = await import_catalog(BUNDLE)
+        assert counts == {'services': 2, 'masters': 2, 'schedules': 2, 'exceptions': 2}
+        # the catalog cache was invalidated
+        assert {s['name']: s['price'] for s in await list_services()} == {'Cut': 15.0, 'Color': 40.5}
+        anna, boris = [m['id'] for m in await list_masters()]
+        assert len(await generate_slots(anna, '2031-01-06', 30)) == 6
+        assert await generate_slots(anna, '2031-01-13', 30) == []
+        assert [e['available'] for e in await list_exceptions(boris)] == [1]
+
+        exported = await export_catalog()
+        assert exported['schedules'][0] == {'master': 'Anna', 'weekday': 0, 'start_time': '09:00',
+                                            'end_time': '12:00', 'slot_interval_minutes': 30}
+        # importing the export again updates in place instead of duplicating
+        await import_catalog(json.loads(json.dumps(exported)))
+        assert len(await list_services()) == 2 and len(await list_masters()) == 2
+        assert await export_catalog() == exported
+        # and the CSV form carries the same data
+        assert await import_catalog(parse_catalog_bundle(catalog_bundle_csv_bytes(exported), 'c.csv')) == counts
+        assert await export_catalog() == exported
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_invalid_bundle_writes_nothing(temp_db):
+    async def _run():
+        bad = {
+            'services': [{'name': 'Cut', 'price': -1}, {'name': ''}],
+            'schedules': [{'master': 'Anna', 'weekday': 9, 'start_time': '18:00', 'end_time': '09:00'}],
+            'exceptions': [{'date': '2031-02-30'}],
+        }
+        with pytest.raises(CatalogImportError) as e:
+            await import_catalog(bad)
+        assert len(e.value.errors) == 6
+        # references are checked inside the transaction; the services insert is rolled back
+        with pytest.raises(CatalogImportError) as e:
+            await import_catalog({'services': [{'name': 'Cut', 'price': 10}],
+                                  'schedules': [{'master': 'Ghost', 'weekday': 0, 'start_time': '09:00', 'end_time': '10:00'}]})
+        assert 'Ghost' in e.value.errors[0]
+        assert await list_services() == []
+        # wrong section/row types, non-finite numbers and repeated weekdays are reported, not raised
+        for bundle, fragment in (({'services': ['Cut']}, 'services[0]: must be an object'),
+                                 ({'services': {'name': 'Cut'}}, 'services: must be a list'),
+                                 ({'services': [{'name': 'Cut', 'price': 'nan'}]}, 'finite'),
+                                 ({'services': [{'name': 'Cut', 'price': 'inf'}]}, 'finite')):
+            with pytest.raises(CatalogImportError) as e:
+                await import_catalog(bundle)
+            assert fragment in e.value.errors[0], e.value.errors
+        mid = await create_master('Anna')
+        with pytest.raises(CatalogImportError) as e:
+            await import_catalog({'schedules': [
+                {'master': 'Anna', 'weekday': 0, 'start_time': '09:00', 'end_time': '12:00'},
+                {'master_id': mid, 'weekday': 0, 'start_time': '13:00', 'end_time': '18:00'}]})
+        assert 'duplicate weekday' in e.value.errors[0]
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_thousands_of_rows_import_in_constant_statements(temp_db, sql_log):
+    async def _run():
+        mid = await create_master('Existing')
+
+        def bundle(n):
+            return {
+                'services': [{'name': f'S{i}', 'price': i, 'duration_minutes': 30} for i in range(n * 7)],
+                'masters': [{'name': f'M{i}'} for i in range(n)],
+                'schedules': [{'master': f'M{i}', 'weekday': d, 'start_time': '09:00', 'end_time': '18:00'}
+                              for i in range(n) for d in range(7)],
+                'exceptions': [{'master_id': mid, 'date': f'2031-{1 + i // 28:02d}-{1 + i % 28:02d}'} for i in range(n)]
+                              + [{'master': f'M{i}', 'date': '2031-12-24'} for i in range(n)],
+            }
+        sql_log.clear()
+        await import_catalog(bundle(2))
+        small = len(sql_log.dml())
+        sql_log.clear()
+        counts = await import_catalog(bundle(300))
+        large = len(sql_log.dml())
+        assert sum(counts.values()) == 2100 + 300 + 2100 + 600
+        # rows go through executemany, so the statement count does not grow with the bundle
+        assert large == small and 0 < small < 20, (small, large)
+        await close_db()
+    asyncio.run(_run())
+
+
+class FakeBot:
+    def __init__(self, files):
+        self.files = files
+        self.sent = []
+
+    async def download(self, document, destination):
+        destination.write(self.files[document.file_id])
+
+    async def send_document(self, chat_id, document, filename=None, caption=None, disable_notification=False):
+        self.sent.append({'filename': filename, 'data': document.read()})
+
+
+class FakeMessage:
+    def __init__(self, bot, args='', document=None):
+        self.from_user = SimpleNamespace(id=ADMIN_ID)
+        self.chat = SimpleNamespace(id=ADMIN_ID)
+        self.bot = bot
+        self.document = document
+        self._args = args
+        self.replies = []
+
+    def get_args(self):
+        return self._args
+
+    async def answer(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def test_admin_upload_and_export(temp_db):
+    admin_handlers.ADMIN_IDS = [ADMIN_ID]
+
+    async def _run():
+        data = json.dumps(BUNDLE).encode('utf-8')
+        bot = FakeBot({'f1': data, 'f2': b'kind,name\nrobot,x\n'})
+        doc = SimpleNamespace(file_id='f1', file_name='branch.json', file_size=len(data))
+        msg = FakeMessage(bot, document=doc)
+        await admin_handlers.cmd_import_catalog(msg)
+        assert 'Импорт выполнен' in msg.replies[-1] and 'мастеров 2' in msg.replies[-1]
+
+        broken = FakeMessage(bot, document=SimpleNamespace(file_id='f2', file_name='b.csv', file_size=20))
+        await admin_handlers.cmd_import_catalog(broken)
+        assert 'robot' in broken.replies[-1]
+
+        malformed = json.dumps({'services': ['Cut']}).encode('utf-8')
+        bot.files['f3'] = malformed
+        bad_rows = FakeMessage(bot, document=SimpleNamespace(file_id='f3', file_name='b.json', file_size=len(malformed)))
+        await admin_handlers.cmd_import_catalog(bad_rows)
+        assert 'Импорт отменён' in bad_rows.replies[-1] and 'services[0]' in bad_rows.replies[-1]
+
+        usage = FakeMessage(bot)
+        await admin_handlers.cmd_import_catalog(usage)
+        assert '/import_catalog' in usage.replies[-1]
+
+        export = FakeMessage(bot, args='csv')
+        await admin_handlers.cmd_export_catalog(export)
+        sent = bot.sent[-1]
+        assert sent['filename'] == 'catalog.csv'
+        assert parse_catalog_bundle(sent['data'], sent['filename'])['masters'][1]['name'] == 'Boris'
+        await close_db()
+    asyncio.run(_run())
@@ -0,0 +1,164 @@
+import asyncio
+import sqlite3
+import pytest
+from app.db import get_db, get_pool, close_db, PoolTimeout, unit_of_work, read_pool_stats
+from app.repo import create_master, list_masters
+
+
+def test_connections_are_reused(temp_db):
+    async def _run():
+        async with get_db() as db1:
+            pass
+        async with get_db() as db2:
+            pass
+        assert db1 is db2
+        pool = await get_pool()
+        assert pool.stats['opened'] == 1
+        assert pool.stats['reused'] >= 1
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_nested_get_db_reuses_task_connection(temp_db):
+    async def _run():
+        async with get_db() as outer:
+            async with get_db() as inner:
+                assert inner is outer
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_pool_is_bounded(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '1')
+    monkeypatch.setenv('DB_POOL_TIMEOUT', '0.1')
+    async def _run():
+        await close_db()
+        held = asyncio.Event()
+        done = asyncio.Event()
+
+        async def holder():
+            async with get_db():
+                held.set()
+                await done.wait()
+
+        t = asyncio.create_task(holder())
+        await held.wait()
+
+        async def other():
+            async with get_db():
+                pass
+
+        with pytest.raises(PoolTimeout):
+            await other()
+        done.set()
+        await t
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_open_transaction_is_rolled_back_on_release(temp_db):
+    async def _run():
+        async with get_db() as db:
+            await db.execute("INSERT INTO masters (name) VALUES ('uncommitted')")
+        async with get_db() as db:
+            cur = await db.execute("SELECT COUNT(*) AS c FROM masters WHERE name='uncommitted'")
+            row = await cur.fetchone()
+            assert row['c'] == 0
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_profile_pragmas_applied(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_PROFILE', 'durable')
+    async def _run():
+        await close_db()
+        async with get_db() as db:
+            cur = await db.execute('PRAGMA journal_mode')
+            assert (await cur.fetchone())[0] == 'wal'
+            cur = await db.execute('PRAGMA synchronous')
+            assert (await cur.fetchone())[0] == 2  # FULL
+            cur = await db.execute('PRAGMA busy_timeout')
+            assert (await cur.fetchone())[0] == 10000
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_unknown_profile_rejected(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_PROFILE', 'turbo')
+    async def _run():
+        await close_db()
+        with pytest.raises(ValueError):
+            async with get_db():
+                pass
+    asyncio.run(_run())
+
+
+def test_read_lane_rejects_writes(temp_db):
+    async def _run():
+        await close_db()
+        async with get_db(readonly=True) as db:
+            cur = await db.execute('PRAGMA query_only')
+            assert (await cur.fetchone())[0] == 1
+            with pytest.raises(sqlite3.OperationalError):
+                await db.execute("INSERT INTO masters (name) VALUES ('nope')")
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_repo_reads_use_read_lane_alongside_writer(temp_db):
+    async def _run():
+        await close_db()
+        await create_master('committed')
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold_write_lock():
+            async with unit_of_work() as uow:
+                await create_master('pending', session=uow)
+                entered.set()
+                await release.wait()
+
+        writer = asyncio.create_task(hold_write_lock())
+        await entered.wait()
+        # the writer holds BEGIN IMMEDIATE; a reader still gets the last commit
+        names = await asyncio.wait_for(list_masters(), timeout=2)
+        assert [m['name'] for m in names] == ['committed']
+        assert read_pool_stats()['opened'] >= 1
+        release.set()
+        await writer
+        assert len(await list_masters()) == 2
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_in_memory_reads_do_not_fail_while_writer_holds_a_transaction(monkeypatch):
+    # CI runs with DATABASE_URL=':memory:', where every lane shares one database via the shared cache
+    monkeypatch.setenv('DATABASE_URL', ':memory:')
+    async def _run():
+        from app.db import init_db
+        await close_db()
+        await init_db()
+        await create_master('committed')
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold_write_lock():
+            async with unit_of_work() as uow:
+                await create_master('pending', session=uow)
+                entered.set()
+                await release.wait()
+
+        writer = asyncio.create_task(hold_write_lock())
+        await entered.wait()
+        try:
+            async with get_db(readonly=True) as db:
+                cur = await asyncio.wait_for(db.execute('SELECT COUNT(*) FROM masters'), timeout=2)
+                assert (await cur.fetchone())[0] >= 1
+        finally:
+            release.set()
+            await writer
+        async with get_db(readonly=True) as db:
+            cur = await db.execute('SELECT COUNT(*) FROM masters')
+            assert (await cur.fetchone())[0] == 2
+        await close_db()
+    asyncio.run(_run())
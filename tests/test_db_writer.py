@@ -0,0 +1,40 @@
+import asyncio
+from app.db import get_db, run_write, close_db, writer_stats
+from app.repo import create_master, list_masters
+
+
+def test_concurrent_writes_share_one_commit(temp_db):
+    async def _run():
+        await close_db()
+        ids = await asyncio.gather(*(create_master(f'M{i}') for i in range(20)))
+        assert len(set(ids)) == 20
+        stats = writer_stats()
+        assert stats['jobs'] == 20
+        assert stats['batches'] < 20
+        assert len(await list_masters()) == 20
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_failing_job_is_rolled_back_alone(temp_db):
+    async def _run():
+        await close_db()
+
+        async def good(db):
+            cur = await db.execute("INSERT INTO masters (name) VALUES ('kept')")
+            return cur.lastrowid
+
+        async def bad(db):
+            await db.execute("INSERT INTO masters (name) VALUES ('dropped')")
+            raise ValueError('boom')
+
+        results = await asyncio.gather(run_write(good), run_write(bad), run_write(good), return_exceptions=True)
+        assert isinstance(results[0], int)
+        assert isinstance(results[1], ValueError)
+        assert isinstance(results[2], int)
+        async with get_db() as db:
+            cur = await db.execute('SELECT name FROM masters ORDER BY id')
+            names = [r['name'] for r in await cur.fetchall()]
+        assert names == ['kept', 'kept']
+        await close_db()
+    asyncio.run(_run())
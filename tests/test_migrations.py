@@ -0,0 +1,133 @@
+import asyncio
+import sqlite3
+import aiosqlite
+import pytest
+from app.db import get_db, close_db, init_db, MIGRATIONS_DIR
+from app import migrations
+
+
+def test_ledger_records_every_migration(temp_db):
+    async def _run():
+        files = migrations.discover(MIGRATIONS_DIR)
+        async with get_db() as db:
+            done = await migrations.applied_versions(db)
+            assert sorted(done) == [m.version for m in files]
+            assert all(done[m.version][1] == m.checksum for m in files)
+            # warm start: nothing left to apply
+            assert await migrations.is_up_to_date(db, files)
+            assert await migrations.migrate(db, files) == []
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    (tmp_path / '001_ok.sql').write_text('CREATE TABLE a (id INTEGER);')
+    (tmp_path / '002_broken.sql').write_text('CREATE TABLE b (id INTEGER);\nINSERT INTO missing VALUES (1);')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'm.db'}")
+    async def _run():
+        files = migrations.discover(tmp_path)
+        async with get_db() as db:
+            with pytest.raises(migrations.MigrationError):
+                await migrations.migrate(db, files)
+            assert sorted(await migrations.applied_versions(db)) == [1]
+            cur = await db.execute("SELECT name FROM sqlite_master WHERE name='b'")
+            assert await cur.fetchone() is None
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_legacy_database_is_adopted(tmp_path, monkeypatch):
+    db_file = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(db_file)
+    for p in sorted(MIGRATIONS_DIR.glob('*.sql'))[:4]:
+        conn.executescript(p.read_text(encoding='utf-8'))
+    # 005 half-applied by the old runner
+    conn.execute('ALTER TABLE bookings ADD COLUMN reminded_24 INTEGER DEFAULT 0')
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{db_file}")
+    async def _run():
+        await init_db()
+        async with get_db() as db:
+            cur = await db.execute('PRAGMA table_info(bookings)')
+            cols = [r[1] for r in await cur.fetchall()]
+            assert 'reminded_1' in cols
+            files = migrations.discover(MIGRATIONS_DIR)
+            assert await migrations.is_up_to_date(db, files)
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_inspection_modes_do_not_touch_the_database(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+    script = Path(__file__).resolve().parent.parent / 'scripts' / 'create_db.py'
+    db_file = tmp_path / 'inspect.db'
+    env = {'DATABASE_URL': f'sqlite:///{db_file}', 'PATH': '/usr/bin:/bin'}
+
+    def run(*flags):
+        return subprocess.run([sys.executable, str(script), *flags], env=env, capture_output=True, text=True,
+                              check=True).stdout
+
+    assert 'does not exist' in run('--status')
+    assert 'does not exist' in run('--dry-run')
+    assert not db_file.exists()
+    con = sqlite3.connect(db_file)
+    con.execute('CREATE TABLE legacy (id INTEGER)')
+    con.commit()
+    con.close()
+    assert 'pending' in run('--status')
+    assert '-- would apply' in run('--dry-run')
+    con = sqlite3.connect(db_file)
+    assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert con.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall() == [('legacy',)]
+    con.close()
+
+
+def test_status_opens_paths_with_uri_special_characters(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+    script = Path(__file__).resolve().parent.parent / 'scripts' / 'create_db.py'
+    folder = tmp_path / 'odd?#%dir'
+    folder.mkdir()
+    db_file = folder / 'inspect.db'
+    env = {'DATABASE_URL': f'sqlite:///{db_file}', 'PATH': '/usr/bin:/bin'}
+
+    def run(*flags):
+        return subprocess.run([sys.executable, str(script), *flags], env=env, capture_output=True, text=True,
+                              check=True).stdout
+
+    run()
+    out = run('--status')
+    assert 'applied' in out and 'pending' not in out
+    assert 'up to date' in run('--dry-run')
+
+
+def test_concurrent_runner_skips_versions_applied_meanwhile(tmp_path, monkeypatch):
+    (tmp_path / '001_a.sql').write_text('CREATE TABLE a (id INTEGER);')
+    (tmp_path / '002_b.sql').write_text('CREATE TABLE b (id INTEGER);')
+    db_file = tmp_path / 'race.db'
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{db_file}")
+    async def _run():
+        files = migrations.discover(tmp_path)
+        async with get_db() as db:
+            await migrations.migrate(db, files)
+        # a second process that read the ledger before the first one committed
+        async def stale_up_to_date(db, ms):
+            return False
+
+        async def stale_pending(db, ms):
+            return list(ms)
+        monkeypatch.setattr(migrations, 'is_up_to_date', stale_up_to_date)
+        monkeypatch.setattr(migrations, 'pending', stale_pending)
+        con = await aiosqlite.connect(db_file)
+        try:
+            assert await migrations.migrate(con, files) == []
+        finally:
+            await con.close()
+        async with get_db() as db:
+            assert sorted(await migrations.applied_versions(db)) == [1, 2]
+        await close_db()
+    asyncio.run(_run())
@@ -0,0 +1,102 @@
+import asyncio
+import importlib
+import aiogram
+from types import SimpleNamespace
+
+# Patch decorator during import (same pattern as other tests)
+_orig = getattr(aiogram.Router, 'message', None)
+aiogram.Router.message = lambda *a, **k: (lambda f: f)
+try:
+    import aiogram.dispatcher.event.telegram as _te
+    _te.TelegramEvent.register = lambda *a, **k: None
+except Exception:
+    pass
+client_handlers = importlib.reload(importlib.import_module('app.handlers.client'))
+if _orig is not None:
+    aiogram.Router.message = _orig
+
+from app.repo import create_service, create_master, create_booking, get_or_create_user, set_booking_status, list_user_bookings
+
+
+class FakeMessage:
+    def __init__(self, user_id, text=''):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.replies = []
+        self.edited = None
+    async def answer(self, text, **kwargs):
+        self.replies.append({'text': text, **kwargs})
+    async def edit_text(self, text, **kwargs):
+        self.edited = {'text': text, **kwargs}
+
+
+class FakeCallback:
+    def __init__(self, data, user_id, message):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.message = message
+    async def answer(self, *a, **k):
+        pass
+
+
+async def _seed(tg_id, count):
+    sid = await create_service('Cut', 'd', 10.0, 30)
+    mid = await create_master('Ivan')
+    user = await get_or_create_user(tg_id, name='U', phone='+37060000000')
+    other = await get_or_create_user(tg_id + 1, name='O', phone='+37060000001')
+    await create_booking(other['id'], sid, mid, '2025-02-01', '08:00', 'O', other['phone'])
+    ids = []
+    for i in range(count):
+        b = await create_booking(user['id'], sid, mid, f'2025-01-{i + 1:02d}', '10:00', 'U', user['phone'])
+        ids.append(b['id'])
+    return user, ids
+
+
+def test_list_user_bookings_filters_and_pages(temp_db):
+    async def _run():
+        user, ids = await _seed(7100, 7)
+        await set_booking_status(ids[0], 'completed')
+        await set_booking_status(ids[3], 'completed')
+        rows, more = await list_user_bookings(user['id'], limit=5)
+        assert [r['id'] for r in rows] == ids[::-1][:5] and more
+        last = rows[-1]
+        rows2, more2 = await list_user_bookings(user['id'], limit=5, cursor=(last['date'], last['time'], last['id']))
+        assert [r['id'] for r in rows2] == ids[1::-1] and not more2
+        done, _ = await list_user_bookings(user['id'], statuses=('completed',))
+        assert [r['id'] for r in done] == [ids[3], ids[0]]
+        assert done[0]['service_name'] == 'Cut' and done[0]['master_name'] == 'Ivan'
+    asyncio.run(_run())
+
+
+def test_my_bookings_screen_pages(temp_db):
+    async def _run():
+        user, ids = await _seed(7200, client_handlers.MY_BOOKINGS_PAGE_SIZE + 2)
+        msg = FakeMessage(7200, '📅 Мои записи')
+        await client_handlers.cmd_my_booking(msg)
+        first = msg.replies[-1]
+        assert first['text'].count('Cut') == client_handlers.MY_BOOKINGS_PAGE_SIZE
+        assert '2025-02-01' not in first['text']  # someone else's booking
+        (nxt,) = first['reply_markup'].inline_keyboard[0]
+        cb = FakeCallback(nxt.callback_data, 7200, FakeMessage(7200))
+        await client_handlers.cb_my_bookings_page(cb)
+        assert cb.message.edited['text'].count('Cut') == 2
+        assert [b.text for b in cb.message.edited['reply_markup'].inline_keyboard[0]] == ['⬅️ Назад']
+
+        empty = FakeMessage(7999, '📅 Мои записи')
+        await client_handlers.cmd_my_booking(empty)
+        assert 'нет записей' in empty.replies[-1]['text']
+    asyncio.run(_run())
+
+
+def test_leave_review_lists_only_completed(temp_db):
+    async def _run():
+        user, ids = await _seed(7300, 3)
+        await set_booking_status(ids[1], 'completed')
+        msg = FakeMessage(7300, '⭐ Отзывы')
+        await client_handlers.cmd_reviews_button(msg)
+        assert 'Оставить отзыв' in str(msg.replies[-1].get('reply_markup'))
+        cb = FakeCallback('start_leave_review', 7300, FakeMessage(7300))
+        await client_handlers.cb_start_leave_review(cb)
+        assert len(cb.message.replies) == 1
+        assert '2025-01-02 10:00 — Cut (Ivan)' in cb.message.replies[0]['text']
+    asyncio.run(_run())
@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import aiogram
+from types import SimpleNamespace
+from app.db import close_db
+from app.repo import create_service, create_master, create_booking, get_or_create_user
+from app.scheduler import set_schedule, add_exception, find_next_available
+
+_orig = getattr(aiogram.Router, 'message', None)
+aiogram.Router.message = lambda *a, **k: (lambda f: f)
+booking_handlers = importlib.reload(importlib.import_module('app.handlers.booking'))
+if _orig is not None:
+    aiogram.Router.message = _orig
+
+MONDAY = '2031-03-03'
+
+
+def test_earliest_slots_across_masters_and_days(temp_db):
+    async def _run():
+        anna = await create_master('Anna')
+        boris = await create_master('Boris')
+        await set_schedule(anna, 2, '10:00', '11:30', 30)   # Wednesdays
+        await set_schedule(boris, 2, '10:00', '11:00', 30)
+        await set_schedule(boris, 4, '09:00', '10:00', 30)  # and Fridays
+        await add_exception(anna, '2031-03-05', available=0)
+        user = await get_or_create_user(7001, name='U', phone='+37060000000')
+        await create_booking(user['id'], 1, boris, '2031-03-05', '10:00', 'U', '+370')
+
+        got = await find_next_available(30, limit=4, start_date=MONDAY)
+        assert got == [('2031-03-05', '10:30', boris), ('2031-03-07', '09:00', boris),
+                       ('2031-03-07', '09:30', boris), ('2031-03-12', '10:00', anna)]
+        # ties on the same date and time follow master order
+        assert (await find_next_available(30, limit=3, start_date='2031-03-12'))[:2] == [
+            ('2031-03-12', '10:00', anna), ('2031-03-12', '10:00', boris)]
+        assert await find_next_available(30, limit=2, master_id=anna, start_date=MONDAY) == [
+            ('2031-03-12', '10:00', anna), ('2031-03-12', '10:30', anna)]
+        # the horizon bounds the search
+        assert await find_next_available(30, master_id=anna, days=7, start_date=MONDAY) == []
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_search_stops_early_and_scales(temp_db, sql_log):
+    async def _run():
+        masters = [await create_master(f'M{i}') for i in range(40)]
+        for mid in masters[:-1]:
+            await set_schedule(mid, 6, '09:00', '09:20')  # Sundays, too short for the service
+        await set_schedule(masters[-1], 6, '09:00', '10:00', 30)
+
+        sql_log.clear()
+        got = await find_next_available(30, limit=5, days=60, start_date=MONDAY)
+        early = len(sql_log.selects())
+        sql_log.clear()
+        assert await find_next_available(30, limit=5, days=60, start_date=MONDAY, master_id=masters[0]) == []
+        full = len(sql_log.selects())
+        assert got == [('2031-03-09', '09:00', masters[-1]), ('2031-03-09', '09:30', masters[-1]),
+                       ('2031-03-16', '09:00', masters[-1]), ('2031-03-16', '09:30', masters[-1]),
+                       ('2031-03-23', '09:00', masters[-1])]
+        # master list and schedules once, then exceptions and bookings per week scanned
+        assert early == 2 + 3 * 2
+        # a single master needs no master list; the first 3 weeks' bookings come from the occupancy cache
+        assert full == 1 + 9 + (9 - 3)
+        await close_db()
+    asyncio.run(_run())
+
+
+class FakeState:
+    def __init__(self, initial=None):
+        self._data = dict(initial or {})
+
+    async def update_data(self, **kwargs):
+        self._data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self._data)
+
+
+class FakeCallbackMessage:
+    def __init__(self):
+        self.chat = SimpleNamespace(id=1)
+        self.replies = []
+
+    async def answer(self, text, **kwargs):
+        self.replies.append({'text': text, **kwargs})
+
+
+class FakeCallback:
+    def __init__(self, data, message):
+        self.data = data
+        self.from_user = SimpleNamespace(id=1)
+        self.message = message
+
+    async def answer(self, text, show_alert=False):
+        pass
+
+
+def test_booking_flow_offers_next_available_buttons(temp_db):
+    async def _run():
+        sid = await create_service('Cut', 'd', 10.0, 30)
+        anna = await create_master('Anna')
+        await set_schedule(anna, 2, '10:00', '11:00', 30)
+        state = FakeState({'service_id': sid, 'booking_user_id': 1})
+        msg = FakeCallbackMessage()
+        await booking_handlers.cb_select_master(FakeCallback(f'book:master:{anna}', msg), state)
+        offer = msg.replies[-1]
+        buttons = [b for row in offer['reply_markup'].inline_keyboard for b in row]
+        assert len(buttons) == booking_handlers.NEXT_AVAILABLE_COUNT
+        assert buttons[0].text.startswith('⚡ Ср') and buttons[0].text.endswith('10:00')
+        assert all(len(b.callback_data.encode()) <= 64 for b in buttons)
+
+        # a full day offers the next free slots instead of a dead end
+        msg2 = FakeCallbackMessage()
+        msg2.from_user = SimpleNamespace(id=1)
+        msg2.text = '2031-03-03'
+        await booking_handlers.process_date(msg2, state)
+        markup = msg2.replies[-1]['reply_markup']
+        assert markup.inline_keyboard[0][0].callback_data == f'book:next:20310305:1000:{anna}'
+
+        tap = FakeCallbackMessage()
+        await booking_handlers.cb_next_available(FakeCallback(f'book:next:20310305:1030:{anna}', tap), state)
+        data = await state.get_data()
+        assert (data['date'], data['time'], data['master_id']) == ('2031-03-05', '10:30', anna)
+        assert data['_state'] == booking_handlers.BookingStates.NAME.state
+        assert 'имя' in tap.replies[-1]['text']
+        await close_db()
+    asyncio.run(_run())
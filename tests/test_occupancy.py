@@ -0,0 +1,143 @@
+import asyncio
+import random
+from app.db import close_db, unit_of_work
+from app import repo, scheduler
+from app.scheduler import (interval_mask, busy_mask, fit_mask, _mask_slots, _mask_gaps, occupancy, occupancy_stats,
+                           generate_slots_for_date, find_next_available)
+
+DAY = '2031-03-05'  # a Wednesday
+
+
+def test_bitmap_operations():
+    busy = busy_mask([(600, 630), (620, 660), (720, 750)])
+    assert busy == interval_mask(600, 660) | interval_mask(720, 750)
+    free = interval_mask(540, 780) & ~busy
+    # a 90-minute service fits only where 90 consecutive free bits start
+    fits = fit_mask(free, 90)
+    assert [m for m in range(1440) if fits >> m & 1] == []
+    assert [m for m in range(1440) if fit_mask(free, 60) >> m & 1] == [540, 660]
+    assert _mask_slots(540, 780, 30, 60, busy) == ['09:00', '11:00']
+    assert _mask_slots(540, 780, 30, 60, busy, not_before=605) == ['11:00']
+    assert _mask_gaps(540, 780, busy) == [(540, 600), (660, 720), (750, 780)]
+    assert interval_mask(1400, 1500) == interval_mask(1400, 1440) and interval_mask(50, 50) == 0
+
+
+def test_bookings_update_bitmaps_incrementally(temp_db, sql_log):
+    async def _run():
+        short = await repo.create_service('Cut', 'd', 10.0, 30)
+        long = await repo.create_service('Color', 'd', 40.0, 90)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '09:00', '13:00', 30)
+        users = [(await repo.get_or_create_user(9100 + i, name='U', phone='+370'))['id'] for i in range(3)]
+        assert (await generate_slots_for_date(DAY, 90, [anna]))[anna][0] == '09:00'
+        sql_log.clear()
+        b1 = await repo.create_booking(users[0], long, anna, DAY, '09:00', 'U', '+370')
+        b2 = await repo.create_booking(users[1], short, anna, DAY, '10:00', 'U', '+370')
+        assert await generate_slots_for_date(DAY, 90, [anna]) == {anna: ['10:30', '11:00', '11:30']}
+        # the first booking overlaps the second; cancelling it keeps 10:00-10:30 taken
+        await repo.set_booking_status(b1['id'], 'cancelled')
+        assert await generate_slots_for_date(DAY, 30, [anna]) == {
+            anna: ['09:00', '09:30', '10:30', '11:00', '11:30', '12:00', '12:30']}
+        await repo.set_booking_status(b2['id'], 'completed')
+        await repo.set_booking_status(b2['id'], 'scheduled')
+        assert (await generate_slots_for_date(DAY, 60, [anna]))[anna][:2] == ['09:00', '10:30']
+        # no range load of bookings: every change was applied to the cached bitmap
+        assert sql_log.containing('FROM bookings b', 'BETWEEN') == []
+        assert occupancy_stats()['updates'] >= 5
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_rolled_back_booking_leaves_bitmap_alone(temp_db):
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '10:00', '11:00', 30)
+        user = await repo.get_or_create_user(9200, name='U', phone='+370')
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == [
+            (DAY, '10:00', anna), (DAY, '10:30', anna)]
+        try:
+            async with unit_of_work() as uow:
+                await repo.create_booking(user['id'], sid, anna, DAY, '10:00', 'U', '+370', session=uow)
+                raise RuntimeError('rollback')
+        except RuntimeError:
+            pass
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == [
+            (DAY, '10:00', anna), (DAY, '10:30', anna)]
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_read_between_commit_and_update_is_not_counted_twice(temp_db, monkeypatch):
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '10:00', '11:00', 30)
+        user = await repo.get_or_create_user(9250, name='U', phone='+370')
+        orig = repo.run_write
+
+        async def run_write_then_read(op, session=None):
+            result = await orig(op, session)
+            # another task loads the cold day after COMMIT, before the after-commit update runs
+            occupancy.clear()
+            await find_next_available(30, master_id=anna, start_date=DAY, days=1)
+            return result
+        monkeypatch.setattr(repo, 'run_write', run_write_then_read)
+        b = await repo.create_booking(user['id'], sid, anna, DAY, '10:00', 'U', '+370')
+        monkeypatch.setattr(repo, 'run_write', orig)
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == [(DAY, '10:30', anna)]
+        await repo.set_booking_status(b['id'], 'cancelled')
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == [
+            (DAY, '10:00', anna), (DAY, '10:30', anna)]
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_incremental_bitmaps_match_a_fresh_load(temp_db):
+    async def _run():
+        rnd = random.Random(25)
+        services = [await repo.create_service(f'S{d}', 'd', 10.0, d) for d in (15, 30, 45, 90)]
+        masters = [await repo.create_master(f'M{i}') for i in range(4)]
+        users = [(await repo.get_or_create_user(9300 + i, name='U', phone='+370'))['id'] for i in range(60)]
+        days = ['2031-03-03', '2031-03-04', '2031-03-05']
+        await find_next_available(30, limit=10**6, days=3, start_date=days[0])
+        # distinct start times (a taken slot would drop the day), overlapping intervals
+        starts = rnd.sample([(m, d, f'{h:02d}:{q:02d}') for m in masters for d in days
+                             for h in range(9, 17) for q in (0, 15, 30, 45)], len(users))
+        ids = []
+        for user, (mid, day, t) in zip(users, starts):
+            b = await repo.create_booking(user, rnd.choice(services), mid, day, t, 'U', '+370')
+            ids.append(b['id'])
+            if rnd.random() < 0.3:
+                await repo.set_booking_status(rnd.choice(ids), rnd.choice(['cancelled', 'scheduled', 'completed']))
+        cached = occupancy.lookup(set(masters), days)
+        assert cached is not None
+        occupancy.clear()
+        async with scheduler.get_db(readonly=True) as db:
+            _, fresh = await scheduler._load_days(db, set(masters), days[0], days[-1], 30)
+        # a fresh load hands back raw intervals; the cache, bitmaps built from them
+        assert cached == {key: busy_mask(iv) for key, iv in fresh.items()}
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_fresh_days_use_the_sweep_and_build_bitmaps_on_reuse(temp_db, monkeypatch):
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '09:00', '11:00', 30)
+        user = await repo.get_or_create_user(9400, name='U', phone='+370')
+        await repo.create_booking(user['id'], sid, anna, DAY, '09:30', 'U', '+370')
+        occupancy.clear()
+        built = []
+        orig = scheduler.busy_mask
+        monkeypatch.setattr(scheduler, 'busy_mask', lambda iv: built.append(1) or orig(iv))
+        expected = [(DAY, '09:00', anna), (DAY, '10:00', anna), (DAY, '10:30', anna)]
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == expected
+        assert built == []  # the cold load went through _free_slots
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == expected
+        assert built == [1]  # the cached day got its bitmap on first reuse
+        assert await find_next_available(30, master_id=anna, start_date=DAY, days=1) == expected
+        assert built == [1]
+        await close_db()
+    asyncio.run(_run())
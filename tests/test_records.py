@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import pytest
+from app.db import close_db, get_db
+from app.records import Record, Booking, Service, Master, User, Review, MasterException, record_class
+from app.repo import (create_service, create_master, create_booking, get_or_create_user, get_booking, get_service,
+                      list_masters, create_review, list_reviews, list_bookings_page, add_exception,
+                      list_exceptions)
+
+
+def test_record_access():
+    cls = record_class(('id', 'name', 'price', 'name'))
+    r = cls((1, 'Cut', 10.0, 'other'))
+    assert r['name'] == r.name == r[1] == 'Cut'  # first duplicate wins, like sqlite3.Row
+    assert r['NAME'] == 'Cut'
+    assert r.get('missing') is None and r.get('price', 0) == 10.0
+    assert r.keys() == ['id', 'name', 'price', 'name']
+    assert dict(record_class(('id', 'name'))((1, 'x'))) == {'id': 1, 'name': 'x'}
+    assert tuple(r) == (1, 'Cut', 10.0, 'other')
+    with pytest.raises(KeyError):
+        r['missing']
+    assert record_class(('id', 'name', 'price', 'name')) is cls
+    assert type(r).__name__ == 'Record' and not hasattr(r, '__dict__')
+    # no per-row cursor reference: a record is as small as the bare tuple
+    assert sys.getsizeof(r) == sys.getsizeof(tuple(r))
+
+
+def test_typed_records_from_queries(temp_db):
+    async def _run():
+        sid = await create_service('Cut', None, 10.0, 30)
+        mid = await create_master('Anna')
+        user = await get_or_create_user(9100, name='U', phone='+37060000000')
+        booking = await create_booking(user['id'], sid, mid, '2025-03-01', '10:00', 'U', user['phone'])
+        assert isinstance(user, User) and user.tg_id == 9100
+        assert isinstance(booking, Booking) and booking.master_name == 'Anna' and booking.duration_minutes == 30
+        assert isinstance(await get_booking(booking.id), Booking)
+        rows, _ = await list_bookings_page()
+        assert isinstance(rows[0], Booking) and rows[0].service_name == 'Cut'
+        service = await get_service(sid)
+        assert isinstance(service, Service) and service.get('description') is None
+        assert isinstance((await list_masters())[0], Master)
+        await create_review(user['id'], sid, mid, rating=4, booking_id=booking.id)
+        review = (await list_reviews())[0]
+        assert isinstance(review, Review) and review.user_tg_id == 9100 and review.rating == 4
+        await add_exception(mid, '2025-03-02', available=0, note='off')
+        assert isinstance((await list_exceptions(mid))[0], MasterException)
+        async with get_db(readonly=True) as db:
+            cur = await db.execute('SELECT COUNT(*) AS c FROM bookings')
+            row = await cur.fetchone()
+        assert type(row).__bases__ == (Record,) and row.c == row[0] == 1
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_services_page_tolerates_missing_description(temp_db):
+    import importlib
+    import aiogram
+    _orig = getattr(aiogram.Router, 'message', None)
+    aiogram.Router.message = lambda *a, **k: (lambda f: f)
+    try:
+        services = importlib.reload(importlib.import_module('app.handlers.services'))
+    finally:
+        if _orig is not None:
+            aiogram.Router.message = _orig
+
+    async def _run():
+        await create_service('Cut', None, 10.0, 30)
+        await create_service('Color', 'long', 20.0, 60)
+        text, _ = await services._build_services_page(await services.list_services(), 0)
+        assert 'Cut — 10.0' in text and 'long' in text
+        await close_db()
+    asyncio.run(_run())
@@ -54,3 +54,88 @@ def test_concurrent_slot_booking(temp_db):
         assert r.count('ok') == 1
         assert r.count('taken') + r.count('double') == 1
     __import__('asyncio').run(_run())
+
+
+def test_create_booking_returns_hydrated_booking(temp_db):
+    async def _run():
+        from app.repo import get_booking, format_booking_for_display
+        mid = await create_master('Anna')
+        sid = await create_service('Color', 'hair color', 40.0, 90)
+        user = await get_or_create_user(300000001, 'Client', '+37060000003')
+        d = (date.today() + timedelta(days=2)).isoformat()
+        booking = await create_booking(user['id'], sid, mid, d, '15:00', 'Client', '+37060000003')
+        assert booking['id'] == (await get_booking(booking['id']))['id']
+        assert booking['status'] == 'scheduled'
+        assert booking['duration_minutes'] == 90
+        assert booking['service_name'] == 'Color'
+        assert booking['master_name'] == 'Anna'
+        assert booking['user_tg_id'] == 300000001
+        text = await format_booking_for_display(booking)
+        assert 'Клиент: Client' in text and 'Мастер: Anna' in text and 'Услуга: Color' in text
+    __import__('asyncio').run(_run())
+
+
+def test_entity_loader_batches_and_dedupes(temp_db):
+    async def _run():
+        from app.repo import EntityLoader, list_bookings, format_booking_for_display
+        mids = [await create_master(f'M{i}') for i in range(3)]
+        sid = await create_service('Batch', 'desc', 10.0, 30)
+        d = (date.today() + timedelta(days=1)).isoformat()
+        for i in range(6):
+            user = await get_or_create_user(400000000 + i, f'U{i}', f'+3706000010{i}')
+            await create_booking(user['id'], sid, mids[i % 3], d, f'1{i}:00', f'U{i}', user['phone'])
+        rows = await list_bookings()
+        loader = EntityLoader()
+        loader.prime_refs(rows)
+        texts = [await format_booking_for_display(r, loader=loader) for r in rows]
+        assert loader.queries == 1  # one IN query for users; services and masters come from the catalog
+        assert all('Услуга: Batch' in t for t in texts)
+        assert await loader.load('user', 999) is None
+        assert await loader.load('user', 999) is None
+        assert loader.queries == 2  # misses are cached too
+        assert await loader.load('master', 999) is None
+        # a fresh loader sees catalog changes as soon as they are committed
+        from app.repo import update_master
+        await update_master(mids[0], name='Renamed')
+        assert (await EntityLoader().load('master', mids[0]))['name'] == 'Renamed'
+    __import__('asyncio').run(_run())
+
+
+def test_get_or_create_user_upsert_and_cache(temp_db, monkeypatch):
+    monkeypatch.setenv('USER_CACHE_SIZE', '2')
+    async def _run():
+        from app.db import close_db, writer_stats, unit_of_work
+        from app.repo import user_cache
+        await close_db()
+        u = await get_or_create_user(500000001, 'Ann', '+37060000050')
+        jobs = writer_stats()['jobs']
+        # known user, nothing to change: served from the cache
+        assert (await get_or_create_user(500000001))['id'] == u['id']
+        assert (await get_or_create_user(500000001, 'Ann'))['id'] == u['id']
+        assert writer_stats()['jobs'] == jobs
+        # a new phone is written through and cached
+        u2 = await get_or_create_user(500000001, phone='+37060000051')
+        assert (u2['id'], u2['name'], u2['phone']) == (u['id'], 'Ann', '+37060000051')
+        assert (await get_or_create_user(500000001))['phone'] == '+37060000051'
+        # empty strings never overwrite stored values, cached or not
+        jobs = writer_stats()['jobs']
+        assert (await get_or_create_user(500000001, '', ''))['name'] == 'Ann'
+        assert writer_stats()['jobs'] == jobs
+        user_cache.clear()
+        u3 = await get_or_create_user(500000001, '', '')
+        assert (u3['name'], u3['phone']) == ('Ann', '+37060000051')
+        # a rolled-back unit leaves nothing in the cache
+        try:
+            async with unit_of_work() as uow:
+                await get_or_create_user(500000002, 'Ghost', session=uow)
+                raise RuntimeError('abort')
+        except RuntimeError:
+            pass
+        assert user_cache.get(500000002) is None
+        # bounded LRU
+        for i in range(3, 6):
+            await get_or_create_user(500000000 + i)
+        assert user_cache.get(500000001) is None
+        assert user_cache.get(500000005) is not None
+        await close_db()
+    __import__('asyncio').run(_run())
@@ -17,4 +17,71 @@ def test_create_and_list_reviews(temp_db):
         assert avg >= 4.0
         avgm, cntm = await average_rating_for_master(mid)
         assert cntm >= 1
-    asyncio.run(_run())
\ No newline at end of file
+    asyncio.run(_run())
+
+def test_rating_stats_follow_review_writes(temp_db):
+    async def _run():
+        from app.repo import delete_review, rebuild_rating_stats, get_or_create_user
+        from app.db import get_db
+        mid = await create_master('Stat')
+        sid = await create_service('Stat', 'd', 1.0, 30)
+        u1 = await get_or_create_user(810001)
+        u2 = await get_or_create_user(810002)
+        r1 = await create_review(u1['id'], sid, mid, 5, None)
+        await create_review(u2['id'], sid, mid, 2, None)
+        assert await average_rating_for_master(mid) == (3.5, 2)
+        # same user/service/master updates the existing review
+        await create_review(u2['id'], sid, mid, 4, 'better')
+        assert await average_rating_for_service(sid) == (4.5, 2)
+        await delete_review(r1)
+        assert await average_rating_for_master(mid) == (4.0, 1)
+        assert await average_rating_for_master(999) == (0.0, 0)
+        # drift is repaired by a rebuild
+        async with get_db() as db:
+            await db.execute('UPDATE rating_stats SET rating_sum = 100')
+            await db.commit()
+        assert await rebuild_rating_stats() == 2
+        assert await average_rating_for_service(sid) == (4.0, 1)
+    __import__('asyncio').run(_run())
+
+
+def test_bulk_ratings_lookup(temp_db):
+    async def _run():
+        from app.repo import ratings_for_services, ratings_for_masters
+        m1 = await create_master('A')
+        m2 = await create_master('B')
+        s1 = await create_service('S', 'd', 1.0, 30)
+        await create_review(1, s1, m1, 5, None)
+        await create_review(2, s1, m1, 3, None)
+        assert await ratings_for_masters([m1, m2, m1]) == {m1: (4.0, 2), m2: (0.0, 0)}
+        assert await ratings_for_services([s1]) == {s1: (4.0, 2)}
+        assert await ratings_for_services([]) == {}
+    __import__('asyncio').run(_run())
+
+
+def test_review_upsert_by_booking_and_backfill(temp_db):
+    async def _run():
+        from app.repo import get_or_create_user, create_booking, set_booking_status, has_review_for_booking, backfill_review_bookings, get_review
+        from app.export import export_reviews_csv_bytes
+        mid = await create_master('Rev')
+        sid = await create_service('Rev', 'd', 1.0, 30)
+        user = await get_or_create_user(820001)
+        b1 = await create_booking(user['id'], sid, mid, '2025-03-01', '10:00', 'U', '+1')
+        b2 = await create_booking(user['id'], sid, mid, '2025-03-02', '10:00', 'U', '+1')
+        await set_booking_status(b1['id'], 'completed')
+        await set_booking_status(b2['id'], 'completed')
+        r1 = await create_review(user['id'], sid, mid, 5, None, booking_id=b1['id'])
+        # rating the same booking again updates its review
+        assert await create_review(user['id'], sid, mid, 3, 'ok', booking_id=b1['id']) == r1
+        assert await has_review_for_booking(b1['id'])
+        assert not await has_review_for_booking(b2['id'])
+        assert await average_rating_for_master(mid) == (3.0, 1)
+        # an unlinked review (as left before booking_id existed) is linked by the backfill
+        r2 = await create_review(user['id'], sid, mid, 4, 'old')
+        assert await average_rating_for_service(sid) == (3.5, 2)
+        assert await backfill_review_bookings() == 1
+        assert (await get_review(r2))['booking_id'] == b2['id']
+        assert await backfill_review_bookings() == 0
+        csv_text = (await export_reviews_csv_bytes()).decode('utf-8')
+        assert f"{b1['id']},3,ok" in csv_text and f"{b2['id']},4,old" in csv_text
+    __import__('asyncio').run(_run())
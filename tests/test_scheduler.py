@@ -18,3 +18,100 @@ def test_generate_slots_and_exception(temp_db):
         slots2 = await generate_slots(mid, d, 30)
         assert slots2 == []
     __import__('asyncio').run(_run())
+
+
+def test_date_engine_matches_per_master_slots(temp_db, sql_log):
+    from app.db import close_db
+    from app.repo import create_booking, get_or_create_user
+    from app.scheduler import generate_slots_for_date
+
+    async def _run():
+        sid = await create_service('Long', 'desc', 10.0, 45)
+        day = '2031-03-05'  # a Wednesday
+        wd = 2
+        masters = [await create_master(f'M{i}') for i in range(8)]
+        await set_schedule(masters[0], wd, '09:00', '12:00', 30)
+        await set_schedule(masters[1], wd, '10:00', '13:00')
+        await set_schedule(masters[2], 0, '08:00', '20:00', 15)  # works Mondays only
+        await set_schedule(masters[3], 0, '08:00', '10:00', 20)
+        await set_schedule(masters[3], wd, '', '')              # weekday row without hours
+        await add_exception(masters[4], day, available=0)
+        await add_exception(masters[5], day, available=1, start_time='14:00', end_time='16:00')
+        await add_exception(masters[6], day, available=1)       # no hours: schedule still applies
+        # masters[7] has nothing configured: weekday defaults
+        user = await get_or_create_user(5150, name='U', phone='+37060000000')
+        await create_booking(user['id'], sid, masters[0], day, '09:30', 'U', '+370')
+        await create_booking(user['id'] + 1, sid, masters[5], day, '14:45', 'U', '+370')
+        await create_booking(user['id'] + 2, sid, masters[7], day, '09:00', 'U', '+370')
+
+        sql_log.clear()
+        got = await generate_slots_for_date(day, 45, masters)
+        small = len(sql_log.selects())  # not connection setup PRAGMAs
+        await generate_slots_for_date(day, 45, masters + list(range(10_000, 10_300)))
+        large = len(sql_log.selects())
+        assert got[masters[1]] == await generate_slots(masters[1], day, 45) == ['10:00', '10:45', '11:30', '12:15']
+        assert got[masters[3]] == ['08:00', '08:20', '08:40', '09:00']
+        assert got[masters[6]][:2] == ['09:00', '09:45'] and got[masters[7]][:2] == ['09:45', '10:30']
+        assert got[masters[0]] == ['10:30', '11:00'] and got[masters[4]] == []
+        assert got[masters[5]] == ['14:00'] and got[masters[2]] == []
+        assert small == 3 and large == 6
+        assert set(await generate_slots_for_date(day, 45)) == set(masters)
+        await close_db()
+    __import__('asyncio').run(_run())
+
+
+def _naive_free_slots(start_min, end_min, step, duration, booked, not_before=None):
+    from app.scheduler import minutes_to_hhmm
+    slots = []
+    cur = start_min
+    while cur + duration <= end_min:
+        if not (not_before is not None and cur + duration <= not_before) and all(
+                cur + duration <= b0 or cur >= b1 for b0, b1 in booked):
+            slots.append(minutes_to_hhmm(cur))
+        cur += step
+    return slots
+
+
+def test_free_slots_match_pairwise_check():
+    import random
+    from app.scheduler import _free_slots, _free_gaps, _mask_slots, _mask_gaps, busy_mask
+    rnd = random.Random(24)
+    for _ in range(2000):
+        start = rnd.randrange(0, 600, 5)
+        end = start + rnd.randrange(0, 800, 5)
+        step = rnd.choice([5, 10, 15, 20, 30, 45])
+        duration = rnd.choice([5, 15, 30, 45, 60, 90])
+        booked = []
+        for _ in range(rnd.randrange(0, 30)):
+            b = rnd.randrange(0, 1440, 5)
+            booked.append((b, b + rnd.choice([5, 15, 30, 60, 120])))
+        not_before = rnd.choice([None, rnd.randrange(0, 1440)])
+        expected = _naive_free_slots(start, end, step, duration, booked, not_before)
+        assert _free_slots(start, end, step, duration, booked, not_before) == expected
+        assert _mask_slots(start, end, step, duration, busy_mask(booked), not_before) == expected
+        assert _free_gaps(start, end, booked, not_before) == _mask_gaps(start, end, busy_mask(booked), not_before)
+
+
+def test_free_gaps(temp_db):
+    from app.repo import create_booking, get_or_create_user
+    from app.scheduler import _free_gaps, free_gaps, free_gaps_for_date
+
+    assert _free_gaps(540, 720, [(600, 630), (620, 660), (660, 690), (500, 545), (800, 900)]) == [(545, 600), (690, 720)]
+    assert _free_gaps(540, 720, []) == [(540, 720)]
+    assert _free_gaps(540, 720, [(500, 800)]) == []
+    assert _free_gaps(540, 720, [(600, 630)], not_before=610) == [(630, 720)]
+
+    async def _run():
+        sid = await create_service('Long', 'desc', 10.0, 45)
+        day = '2031-03-05'
+        anna = await create_master('Anna')
+        boris = await create_master('Boris')
+        await set_schedule(anna, 2, '09:00', '13:00', 15)
+        await add_exception(boris, day, available=0)
+        user = await get_or_create_user(5151, name='U', phone='+37060000000')
+        await create_booking(user['id'], sid, anna, day, '10:00', 'U', '+370')
+        await create_booking(user['id'] + 1, sid, anna, day, '12:15', 'U', '+370')
+        assert await free_gaps(anna, day) == [('09:00', '10:00'), ('10:45', '12:15')]
+        assert await free_gaps_for_date(day, 45, [anna, boris]) == {
+            anna: [('09:00', '10:00'), ('10:45', '12:15')], boris: []}
+    __import__('asyncio').run(_run())
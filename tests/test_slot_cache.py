@@ -0,0 +1,110 @@
+import asyncio
+import sqlite3
+from app.db import close_db, unit_of_work
+from app import repo, scheduler
+from app.scheduler import generate_slots, generate_slots_for_date, slot_cache, slot_cache_stats
+
+DAY = '2031-03-05'  # a Wednesday
+
+
+def test_repeated_dates_are_served_from_cache(temp_db, sql_log):
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        boris = await repo.create_master('Boris')
+        await scheduler.set_schedule(anna, 2, '10:00', '12:00', 30)
+        before = slot_cache_stats()
+        first = await generate_slots_for_date(DAY, 30, [anna, boris])
+        sql_log.clear()
+        # cb_master_choose re-asks for the date process_date just computed
+        assert await generate_slots(anna, DAY, 30) == first[anna] == ['10:00', '10:30', '11:00', '11:30']
+        assert await generate_slots_for_date(DAY, 30, [anna, boris]) == first
+        assert sql_log.selects() == []
+        # a different duration is a different entry
+        assert await generate_slots(anna, DAY, 60) == ['10:00', '10:30', '11:00']
+        stats = slot_cache_stats()
+        assert stats['hits'] - before['hits'] == 3
+        assert stats['misses'] - before['misses'] == 3
+        assert 0 < stats['hit_ratio'] < 1 and stats['size'] >= 3
+
+        # every write that changes the day is visible on the next read
+        user = await repo.get_or_create_user(8001, name='U', phone='+37060000000')
+        b = await repo.create_booking(user['id'], sid, anna, DAY, '10:00', 'U', '+370')
+        assert await generate_slots(anna, DAY, 30) == ['10:30', '11:00', '11:30']
+        assert await generate_slots(anna, DAY, 60) == ['10:30', '11:00']
+        # other masters' days stay cached
+        assert slot_cache.get(boris, DAY, 30, 0) is not None
+        await repo.set_booking_status(b['id'], 'cancelled')
+        assert await generate_slots(anna, DAY, 30) == ['10:00', '10:30', '11:00', '11:30']
+        await scheduler.add_exception(anna, DAY, available=1, start_time='11:00', end_time='12:00')
+        assert await generate_slots(anna, DAY, 30) == ['11:00', '11:30']
+        await repo.add_exception(anna, DAY, available=0)
+        assert await generate_slots(anna, DAY, 30) == []
+        await scheduler.add_exception(anna, DAY, available=1)
+        await scheduler.set_schedule(anna, 2, '15:00', '16:00', 30)
+        assert await generate_slots(anna, DAY, 30) == ['15:00', '15:30']
+        await repo.set_master_schedule(anna, 2, '16:00', '17:00', 30)
+        assert await generate_slots(anna, DAY, 30) == ['16:00', '16:30']
+        await repo.import_catalog({'schedules': [{'master': 'Anna', 'weekday': 2, 'start_time': '08:00',
+                                                  'end_time': '09:00', 'slot_interval_minutes': 30}]})
+        assert await generate_slots(anna, DAY, 30) == ['08:00', '08:30']
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_uncommitted_writes_never_reach_the_cache(temp_db):
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '10:00', '11:00', 30)
+        user = await repo.get_or_create_user(8002, name='U', phone='+37060000000')
+        assert await generate_slots(anna, DAY, 30) == ['10:00', '10:30']
+        try:
+            async with unit_of_work() as uow:
+                await repo.create_booking(user['id'], sid, anna, DAY, '10:00', 'U', '+370', session=uow)
+                # the unit sees its own booking; the cache is bypassed inside it
+                assert await generate_slots(anna, DAY, 30, session=uow) == ['10:30']
+                raise RuntimeError('rollback')
+        except RuntimeError:
+            pass
+        assert await generate_slots(anna, DAY, 30) == ['10:00', '10:30']
+
+        async with unit_of_work() as uow:
+            await repo.create_booking(user['id'], sid, anna, DAY, '10:30', 'U', '+370', session=uow)
+            # a reader in another task refills from the pre-commit state ...
+            assert await asyncio.create_task(generate_slots(anna, DAY, 30)) == ['10:00', '10:30']
+        # ... and the commit drops it again
+        assert await generate_slots(anna, DAY, 30) == ['10:00']
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_cache_is_bounded_and_recovers_from_outside_writes(temp_db, monkeypatch):
+    monkeypatch.setenv('SLOT_CACHE_SIZE', '5')
+
+    async def _run():
+        sid = await repo.create_service('Cut', 'd', 10.0, 30)
+        anna = await repo.create_master('Anna')
+        await scheduler.set_schedule(anna, 2, '10:00', '11:00', 30)
+        evictions = slot_cache_stats()['evictions']
+        for day in ('2031-03-05', '2031-03-12', '2031-03-19', '2031-03-26',
+                    '2031-04-02', '2031-04-09', '2031-04-16', '2031-04-23'):
+            await generate_slots(anna, day, 30)
+        assert slot_cache_stats()['size'] <= 5
+        assert slot_cache_stats()['evictions'] - evictions == 3
+
+        # another process books the slot the cache still offers
+        user = await repo.get_or_create_user(8003, name='U', phone='+37060000000')
+        con = sqlite3.connect(temp_db)
+        with con:
+            con.execute("INSERT INTO bookings (user_id, service_id, master_id, date, time, status) "
+                        "VALUES (?,?,?,?,?, 'scheduled')", (user['id'], sid, anna, '2031-04-23', '10:00'))
+        con.close()
+        assert await generate_slots(anna, '2031-04-23', 30) == ['10:00', '10:30']
+        try:
+            await repo.create_booking(user['id'] + 1, sid, anna, '2031-04-23', '10:00', 'U', '+370')
+        except repo.SlotTaken:
+            pass
+        assert await generate_slots(anna, '2031-04-23', 30) == ['10:30']
+        await close_db()
+    asyncio.run(_run())
@@ -0,0 +1,120 @@
+import asyncio
+import sqlite3
+from contextlib import aclosing
+from types import SimpleNamespace
+import aiosqlite
+from app.db import close_db
+from app.repo import (create_service, create_master, get_or_create_user, list_bookings_page, stream_bookings,
+                      stream_reviews, get_bookings_for_export)
+
+
+async def _seed_bookings(db_file, count):
+    sid = await create_service('Cut', 'd', 10.0, 30)
+    mid = await create_master('Ivan')
+    other = await create_master('Olga')
+    user = await get_or_create_user(8100, name='U', phone='+37060000000')
+    con = sqlite3.connect(db_file)
+    with con:
+        con.executemany(
+            'INSERT INTO bookings (user_id, service_id, master_id, date, time, name, phone, status) VALUES (?,?,?,?,?,?,?,?)',
+            [(user['id'], sid, mid if i % 3 else other, f'2025-{1 + i // 560:02d}-{1 + i % 28:02d}',
+              f'{8 + (i // 28) % 20:02d}:00', 'U', user['phone'], 'completed' if i % 2 else 'new')
+             for i in range(count)])
+    con.close()
+    return sid, mid
+
+
+def test_stream_bookings_fetches_in_batches(temp_db, monkeypatch):
+    sizes = []
+    orig = aiosqlite.Cursor.fetchmany
+
+    async def fetchmany(self, size=None):
+        rows = await orig(self, size)
+        sizes.append(len(rows))
+        return rows
+    monkeypatch.setattr(aiosqlite.Cursor, 'fetchmany', fetchmany)
+
+    async def _run():
+        await _seed_bookings(temp_db, 1203)
+        ids = [b['id'] async for b in stream_bookings(batch=500)]
+        assert len(ids) == len(set(ids)) == 1203
+        assert sizes == [500, 500, 203, 0]
+        assert len(await get_bookings_for_export()) == 1203
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_stream_bookings_matches_paged_listing(temp_db):
+    async def _run():
+        sid, mid = await _seed_bookings(temp_db, 300)
+        filters = {'start': '2025-01-05', 'status': 'completed', 'master_id': mid}
+        streamed = [b async for b in stream_bookings(filters, batch=7)]
+        assert streamed and all(b['status'] == 'completed' and b['master_id'] == mid for b in streamed)
+        assert streamed[0]['master_name'] == 'Ivan' and streamed[0]['service_name'] == 'Cut'
+        paged, cursor, more = [], None, True
+        while more:
+            rows, more = await list_bookings_page(start='2025-01-05', status='completed', master_id=mid,
+                                                  cursor=cursor, limit=40)
+            paged += rows
+            cursor = (rows[-1]['date'], rows[-1]['time'], rows[-1]['id']) if rows else None
+        assert [b['id'] for b in streamed] == [b['id'] for b in paged]
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_abandoned_stream_returns_its_connection(temp_db, monkeypatch):
+    monkeypatch.setenv('DB_READ_POOL_SIZE', '1')
+    async def _run():
+        await close_db()
+        await _seed_bookings(temp_db, 50)
+        async with aclosing(stream_bookings(batch=10)) as rows:
+            async for _ in rows:
+                break
+        # the single read connection is free again
+        assert len(await asyncio.wait_for(_collect(), timeout=5)) == 50
+        await close_db()
+
+    async def _collect():
+        return [b async for b in stream_bookings()]
+    asyncio.run(_run())
+
+
+def test_list_reviews_splits_long_output(temp_db):
+    import importlib
+    import aiogram
+    _orig = getattr(aiogram.Router, 'message', None)
+    aiogram.Router.message = lambda *a, **k: (lambda f: f)
+    try:
+        rev_handlers = importlib.reload(importlib.import_module('app.handlers.reviews'))
+    finally:
+        if _orig is not None:
+            aiogram.Router.message = _orig
+
+    class FakeMessage:
+        def __init__(self):
+            self.from_user = SimpleNamespace(id=1)
+            self.chat = SimpleNamespace(id=1)
+            self.text = '/list_reviews'
+            self.replies = []
+
+        def get_args(self):
+            return ''
+
+        async def answer(self, text, **kwargs):
+            self.replies.append(text)
+
+    async def _run():
+        sid, mid = await _seed_bookings(temp_db, 1)
+        con = sqlite3.connect(temp_db)
+        with con:
+            con.executemany('INSERT INTO reviews (user_id, service_id, master_id, rating, text) VALUES (1,?,?,4,?)',
+                            [(sid, mid, 'x' * 100)] * 250)
+        con.close()
+        assert len([r async for r in stream_reviews({'master_id': mid, 'limit': 30})]) == 30
+        msg = FakeMessage()
+        await rev_handlers.cmd_list_reviews(msg)
+        assert len(msg.replies) > 1
+        assert all(len(t) <= rev_handlers.REVIEWS_MESSAGE_LIMIT for t in msg.replies)
+        assert sum(t.count('ID: ') for t in msg.replies) == rev_handlers.REVIEWS_LIST_LIMIT
+        await close_db()
+    asyncio.run(_run())
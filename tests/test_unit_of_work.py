@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from app.db import close_db, unit_of_work, writer_stats
+from app.repo import create_master, list_masters, get_master, create_service, get_or_create_user, create_booking, list_bookings
+
+
+def test_unit_commits_on_exit(temp_db):
+    async def _run():
+        await close_db()
+        async with unit_of_work() as uow:
+            sid = await create_service('S', 'd', 10.0, 30, session=uow)
+            mid = await create_master('M', session=uow)
+            user = await get_or_create_user(4242, name='U', phone='+79990000000', session=uow)
+            await create_booking(user['id'], sid, mid, '2026-03-01', '10:00', 'U', '+79990000000', session=uow)
+            # reads inside the unit see its own uncommitted writes
+            assert (await get_master(mid, session=uow))['name'] == 'M'
+        # the whole unit ran as a single writer job
+        assert writer_stats()['jobs'] == 1
+        assert len(await list_bookings()) == 1
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_unit_rolls_back_on_error(temp_db):
+    async def _run():
+        await close_db()
+        with pytest.raises(ValueError):
+            async with unit_of_work() as uow:
+                await create_master('dropped', session=uow)
+                raise ValueError('boom')
+        assert await list_masters() == []
+        # the writer is still usable afterwards
+        await create_master('kept')
+        assert [m['name'] for m in await list_masters()] == ['kept']
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_nested_calls_join_the_unit(temp_db):
+    async def _run():
+        await close_db()
+        async def body():
+            async with unit_of_work():
+                # no session passed: same task, so the call must not queue behind the unit
+                mid = await create_master('inner')
+                assert (await get_master(mid))['name'] == 'inner'
+        await asyncio.wait_for(body(), timeout=5)
+        assert [m['name'] for m in await list_masters()] == ['inner']
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_readonly_unit_sees_one_snapshot(temp_db):
+    async def _run():
+        await close_db()
+        await create_master('first')
+        async with unit_of_work(readonly=True) as uow:
+            before = await list_masters(session=uow)
+            await asyncio.create_task(create_master('second'))
+            assert await list_masters(session=uow) == before
+        assert len(await list_masters()) == 2
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_nested_write_unit_joins_the_outer_one(temp_db):
+    async def _run():
+        await close_db()
+        async def body():
+            async with unit_of_work() as outer:
+                await create_master('outer')
+                async with unit_of_work() as inner:
+                    assert inner is outer
+                    await create_master('inner')
+                with pytest.raises(ValueError):
+                    async with unit_of_work():
+                        await create_master('rolled back')
+                        raise ValueError('boom')
+                async with unit_of_work(readonly=True) as reader:
+                    # a nested read-only unit reads the outer unit's uncommitted writes
+                    assert reader is outer
+                    assert [m['name'] for m in await list_masters(session=reader)] == ['outer', 'inner']
+        await asyncio.wait_for(body(), timeout=5)
+        assert [m['name'] for m in await list_masters()] == ['outer', 'inner']
+        assert writer_stats()['jobs'] == 1
+        await close_db()
+    asyncio.run(_run())
+
+
+def test_writes_that_would_wait_on_the_open_unit_raise(temp_db):
+    async def _run():
+        await close_db()
+        async def body():
+            async with unit_of_work():
+                await create_master('kept')
+                # another task's write would queue behind this unit while the unit awaits it
+                with pytest.raises(RuntimeError, match='another task'):
+                    await asyncio.gather(create_master('other task'))
+            async with unit_of_work(readonly=True):
+                with pytest.raises(RuntimeError, match='read-only'):
+                    async with unit_of_work():
+                        pass
+        await asyncio.wait_for(body(), timeout=5)
+        assert [m['name'] for m in await list_masters()] == ['kept']
+        # the writer is still free for everyone else
+        await create_master('after')
+        assert len(await list_masters()) == 2
+        await close_db()
+    asyncio.run(_run())